@@ -0,0 +1,266 @@
+"""
+Timings of the application's hot paths at realistic clinic scale.
+
+A database with the requested number of patients, doctors, users and
+consultations is generated once by database.create_db.generate (seeded, so
+the same sizes always give the same data) and reused by later runs. Each hot path is then measured:
+
+- cold:  the first call after switching to the database, i.e. with new
+         connections, an empty SQLite page cache and the schema registry,
+         search indexes and availability engine not loaded yet
+- warm:  --repeat further calls with varied arguments (min/median/p95/max)
+- peak:  Python memory allocated at the peak of a cold call (tracemalloc,
+         measured in a separate call so it does not slow down the timings)
+- SQL:   statements run per warm call (see database/instrumentation.py)
+
+The hot paths are the ones behind the UI: the dashboard (Menu.load_appointments),
+the admin grids and their searches (AdminMenu.load_data / search_items), the
+doctor and patient pickers, utils.get_id, utils.build_query, login and the
+double-booking check. Results are written as JSON; --compare prints the change
+against an earlier results file and exits with status 1 if a warm median got
+slower by more than --threshold (and by more than MIN_REGRESSION_MS, so timer
+noise on microsecond paths is not reported).
+
+Usage (from the project root):
+    python -m benchmarks.bench_hot_paths [--patients 200000] [--consultations 1000000]
+        [--repeat 20] [--output hot_paths.json] [--compare previous.json]
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+
+try:
+    import resource  # Not available on Windows
+except ImportError:
+    resource = None
+
+from constants import DOCTORS_COLUMNS_IN_DB, SPECIALIZATIONS_COLUMNS_IN_DB, USERS_COLUMNS_IN_DB
+from database import connection, instrumentation
+from database.create_db import FIRST_NAMES, LAST_NAMES, SPECIALIZATIONS, generate, user_credentials
+from database.migrations import migrate
+
+PATIENT_COLUMNS = ("id", "name", "email", "phone")
+
+# Smallest slowdown of a warm median reported as a regression, whatever the ratio
+MIN_REGRESSION_MS = 0.05
+
+
+def hot_paths(sizes: dict, rng) -> dict:
+    """
+    Build the hot paths to measure.
+
+    Returns:
+        dict: name -> callable taking the iteration number (so warm calls can vary their arguments)
+    """
+    from classes.table import ConsultationTable
+    from services import get_services
+    from utils import build_query, get_id
+
+    services = get_services()
+    patient_emails = [
+        services.patients.get(1 + rng.randrange(sizes["patients"])).email for _ in range(64)
+    ]
+    # Few logins: each costs a full password hash. Log them in once here so the generated
+    # users' cheap hashes are upgraded to the configured cost before timing.
+    logins = [user_credentials(rng.randrange(sizes["users"])) for _ in range(8)]
+    for email, password in logins:
+        services.auth.authenticate(email, password)
+    terms = [name.lower()[:length] for name in FIRST_NAMES + LAST_NAMES for length in (3, 5)]
+    days = [(date.today() + timedelta(days=rng.randrange(365))).isoformat() for _ in range(64)]
+    # Users are searched by email, specializations by name
+    user_terms = [user_credentials(rng.randrange(sizes["users"]))[0].split("@")[0] for _ in range(64)]
+    specialization_terms = [name.lower()[:length] for name, _ in SPECIALIZATIONS for length in (3, 5)]
+
+    def dashboard_scroll(_):
+        # Scroll 20 pages down the dashboard, like dragging the scrollbar
+        after = None
+        for _ in range(20):
+            page = ConsultationTable.fetch_page(after, 100)
+            if not page:
+                break
+            after = page[-1]
+
+    def login(i):
+        session = services.auth.authenticate(*logins[i % len(logins)])
+        return session is not None and session.is_admin
+
+    def check_booking(i):
+        return services.consultations.conflicts(
+            1 + i % sizes["doctors"], 1 + i % sizes["patients"], days[i % len(days)], "10:00"
+        )
+
+    paths = {
+        "dashboard.first_page": lambda i: ConsultationTable.fetch_page(None, 100),
+        "dashboard.scroll_20_pages": dashboard_scroll,
+        "admin.load_data.users": lambda i: services.users.pager(USERS_COLUMNS_IN_DB)(None, 100),
+        "admin.load_data.doctor": lambda i: services.doctors.pager(DOCTORS_COLUMNS_IN_DB)(None, 100),
+        "admin.load_data.specialization":
+            lambda i: services.specializations.pager(SPECIALIZATIONS_COLUMNS_IN_DB)(None, 100),
+        "admin.load_data.patient": lambda i: services.patients.pager(PATIENT_COLUMNS)(None, 100),
+        "admin.search.users":
+            lambda i: services.users.pager(USERS_COLUMNS_IN_DB, user_terms[i % len(user_terms)])(None, 100),
+        "admin.search.specialization": lambda i: services.specializations.pager(
+            SPECIALIZATIONS_COLUMNS_IN_DB, specialization_terms[i % len(specialization_terms)]
+        )(None, 100),
+        "admin.search.doctor": lambda i: services.doctors.pager(DOCTORS_COLUMNS_IN_DB, terms[i % len(terms)])(None, 100),
+        "admin.search.patient": lambda i: services.patients.pager(PATIENT_COLUMNS, terms[i % len(terms)])(None, 100),
+        "picker.patient": lambda i: services.patients.typeahead(terms[i % len(terms)], 50),
+        "picker.doctor": lambda i: services.doctors.typeahead(terms[i % len(terms)], 50),
+        "utils.get_id": lambda i: get_id(patient_emails[i % len(patient_emails)], "email", "patient"),
+        "utils.build_query": lambda i: build_query("consultations", ("id", "patient", "doctor", "date", "time")),
+        "login": login,
+        "booking.check_availability": check_booking,
+    }
+    return paths
+
+
+def percentile(values: list, fraction: float) -> float:
+    """Return the nearest-rank percentile of a list of numbers."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def measure(path: str, func, repeat: int) -> dict:
+    """Time one hot path cold and warm, and record its peak memory on a cold call."""
+    connection.set_database_path(path)  # Closes connections and drops every in-memory cache
+    start = time.perf_counter()
+    func(0)
+    cold_ms = (time.perf_counter() - start) * 1000
+
+    warm = []
+    instrumentation.reset_query_stats()
+    for i in range(1, repeat + 1):
+        start = time.perf_counter()
+        func(i)
+        warm.append((time.perf_counter() - start) * 1000)
+    statements = sum(stat["count"] for stat in instrumentation.query_stats())
+
+    connection.set_database_path(path)
+    tracemalloc.start()
+    func(0)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "cold_ms": round(cold_ms, 3),
+        "warm_ms": {
+            "min": round(min(warm), 3),
+            "median": round(statistics.median(warm), 3),
+            "p95": round(percentile(warm, 0.95), 3),
+            "max": round(max(warm), 3),
+        },
+        "peak_kib": round(peak / 1024, 1),
+        "statements_per_call": round(statements / repeat, 2),
+    }
+
+
+def git_commit() -> str:
+    """Return the current commit hash, or None outside a git checkout."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: dict, baseline_path: str, threshold: float) -> bool:
+    """Print the change of every hot path against a previous results file; return True if any regressed."""
+    with open(baseline_path, encoding="utf-8") as file:
+        baseline = json.load(file)["results"]
+    regressed = False
+    print(f"\n{'vs ' + os.path.basename(baseline_path):<34}{'cold':>12}{'warm median':>14}")
+    for name, result in results.items():
+        old = baseline.get(name)
+        if old is None:
+            continue
+        cold = result["cold_ms"] / old["cold_ms"] if old["cold_ms"] else float("inf")
+        warm = result["warm_ms"]["median"] / old["warm_ms"]["median"] if old["warm_ms"]["median"] else float("inf")
+        slower_ms = result["warm_ms"]["median"] - old["warm_ms"]["median"]
+        flag = "  REGRESSION" if warm > 1 + threshold and slower_ms > MIN_REGRESSION_MS else ""
+        regressed = regressed or bool(flag)
+        print(f"{name:<34}{cold:>11.2f}x{warm:>13.2f}x{flag}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--patients", type=int, default=200000)
+    parser.add_argument("--doctors", type=int, default=400)
+    parser.add_argument("--specializations", type=int, default=25)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--consultations", type=int, default=1000000)
+    parser.add_argument("--seed", type=int, default=42, help="seed of the generated data")
+    parser.add_argument("--db", help="database to use (default: a cached file in the temp directory)")
+    parser.add_argument("--fresh", action="store_true", help="regenerate the database even if it exists")
+    parser.add_argument("--repeat", type=int, default=20, help="warm calls per hot path")
+    parser.add_argument("--paths", nargs="*", help="only run the hot paths starting with these names")
+    parser.add_argument("--output", default="hot_paths.json", help="results file to write")
+    parser.add_argument("--compare", help="earlier results file to compare with")
+    parser.add_argument("--threshold", type=float, default=0.2, help="slowdown reported as a regression")
+    args = parser.parse_args()
+
+    sizes = {key: getattr(args, key) for key in ("patients", "doctors", "specializations", "users", "consultations")}
+    path = args.db or os.path.join(
+        tempfile.gettempdir(), "clinic_bench_" + "_".join(str(sizes[key]) for key in sorted(sizes)) + f"_{args.seed}.db"
+    )
+    if args.fresh and os.path.exists(path):
+        os.remove(path)
+    if not os.path.exists(path):
+        start = time.perf_counter()
+        connection.set_database_path(path)
+        generate(**sizes, seed=args.seed, report=None)
+        connection.close_all_connections()
+        print(f"Generated {path} in {time.perf_counter() - start:.1f}s")
+
+    connection.set_database_path(path)
+    migrate()  # A database cached by an earlier version may be behind the schema, like on application start
+    paths = hot_paths(sizes, random.Random(args.seed))
+    if args.paths:
+        paths = {name: func for name, func in paths.items() if name.startswith(tuple(args.paths))}
+
+    results = {}
+    print(f"{'hot path':<34}{'cold ms':>10}{'median ms':>11}{'p95 ms':>10}{'peak KiB':>11}{'SQL/call':>10}")
+    for name, func in paths.items():
+        result = measure(path, func, args.repeat)
+        results[name] = result
+        warm = result["warm_ms"]
+        print(f"{name:<34}{result['cold_ms']:>10.2f}{warm['median']:>11.3f}{warm['p95']:>10.3f}"
+              f"{result['peak_kib']:>11.0f}{result['statements_per_call']:>10.1f}")
+    connection.close_all_connections()
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "sizes": sizes,
+            "seed": args.seed,
+            "repeat": args.repeat,
+            "max_rss_kib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else None,
+        },
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.compare and compare(results, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
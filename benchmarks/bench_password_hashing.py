@@ -0,0 +1,115 @@
+"""
+Cost of the password hashers, to pick the strongest one that keeps logins fast.
+
+For PBKDF2 a range of iteration counts and for scrypt a range of n values are
+timed on this machine (median of --repeat verifications each). The strongest
+cost whose median stays within --target-ms is recommended, with the
+[passwords] lines for database/clinic.ini, and a whole login
+(services.auth.authenticate on an in-memory service) is timed with it.
+Run it on the slowest workstation of the clinic: every login pays this cost
+once, on a worker thread, while the login button waits.
+
+Usage (from the project root):
+    python -m benchmarks.bench_password_hashing [--target-ms 500] [--repeat 5] [--algorithms pbkdf2_sha256 scrypt]
+"""
+import argparse
+import statistics
+import time
+
+from services.passwords import DEFAULT_SETTINGS, HASHERS, PBKDF2Hasher, ScryptHasher, set_hasher
+
+# Costs tried per algorithm, weakest first
+PBKDF2_ITERATIONS = (100000, 200000, 300000, 400000, 600000, 800000, 1000000, 1500000, 2000000)
+SCRYPT_N = tuple(2 ** power for power in range(12, 19))
+
+# Minimums recommended by OWASP (2023); weaker costs are flagged
+MINIMUM = {"pbkdf2_sha256": (600000,), "scrypt": (2 ** 17, 8, 1)}
+
+
+def hashers(algorithm: str):
+    """Return the hashers to time for an algorithm, weakest first."""
+    if algorithm == "scrypt":
+        return [ScryptHasher(n, DEFAULT_SETTINGS["scrypt_r"], DEFAULT_SETTINGS["scrypt_p"]) for n in SCRYPT_N]
+    return [PBKDF2Hasher(iterations) for iterations in PBKDF2_ITERATIONS]
+
+
+def time_verify(hasher, repeat: int) -> float:
+    """Return the median time in ms to verify a password against a hash made by `hasher`."""
+    encoded = hasher.hash("correct horse battery staple")
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        hasher.verify("correct horse battery staple", encoded)
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+
+def strong_enough(hasher) -> bool:
+    """Tell whether a hasher's cost is at least the OWASP minimum (same r and p assumed for scrypt)."""
+    minimum = MINIMUM[hasher.algorithm]
+    if hasher.algorithm == "scrypt":
+        # Work grows with n * p, so n = 2^15 with p = 4 is as strong as n = 2^17 with p = 1
+        return hasher.n * hasher.r * hasher.p >= minimum[0] * minimum[1] * minimum[2]
+    return hasher.params >= minimum
+
+
+def config_lines(hasher) -> list:
+    """Return the clinic.ini lines selecting a hasher."""
+    lines = ["[passwords]", f"algorithm = {hasher.algorithm}"]
+    if hasher.algorithm == "scrypt":
+        lines += [f"scrypt_n = {hasher.n}", f"scrypt_r = {hasher.r}", f"scrypt_p = {hasher.p}"]
+    else:
+        lines.append(f"iterations = {hasher.iterations}")
+    return lines
+
+
+def time_login(hasher, repeat: int) -> float:
+    """Return the median time in ms of a whole login with a hasher, on in-memory services."""
+    from services import create_memory_services
+    set_hasher(hasher)
+    try:
+        services = create_memory_services()
+        services.users.add({"email": "bench@clinic.pt", "password": "secret", "is_admin": 0})
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            services.auth.authenticate("bench@clinic.pt", "secret")
+            times.append((time.perf_counter() - start) * 1000)
+        return statistics.median(times)
+    finally:
+        set_hasher(None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--target-ms", type=float, default=500.0, help="longest acceptable password check")
+    parser.add_argument("--repeat", type=int, default=5, help="verifications timed per cost")
+    parser.add_argument("--algorithms", nargs="*", default=list(HASHERS), choices=list(HASHERS))
+    args = parser.parse_args()
+
+    for algorithm in args.algorithms:
+        print(f"\n{algorithm:<16}{'cost':>24}{'verify ms':>12}")
+        chosen = None
+        for hasher in hashers(algorithm):
+            ms = time_verify(hasher, args.repeat)
+            cost = ", ".join(str(value) for value in hasher.params)
+            flags = ("" if strong_enough(hasher) else "  below OWASP minimum") + \
+                ("  over target" if ms > args.target_ms else "")
+            print(f"{'':<16}{cost:>24}{ms:>12.1f}{flags}")
+            if ms <= args.target_ms:
+                chosen = hasher
+            else:
+                break  # Costs only grow from here
+
+        if chosen is None:
+            print(f"No {algorithm} cost checks a password within {args.target_ms:.0f} ms on this machine")
+            continue
+        print(f"Recommended for {args.target_ms:.0f} ms (login takes {time_login(chosen, args.repeat):.1f} ms):")
+        for line in config_lines(chosen):
+            print("    " + line)
+        if not strong_enough(chosen):
+            print("    Below the OWASP minimum: raise the target if the workstations allow it")
+
+
+if __name__ == "__main__":
+    main()
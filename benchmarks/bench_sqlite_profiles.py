@@ -0,0 +1,139 @@
+"""
+Read/write throughput of clinic.db under each SQLite tuning preset.
+
+For every preset in database.tuning.PRESETS a throwaway database is created and
+seeded, then three workloads are timed:
+
+- writes: single-row autocommit INSERTs, like Menu.add_consultation
+- reads:  a dashboard page from the read model, like Menu.load_appointments
+- mixed:  one writer thread inserting while reader threads refresh the dashboard
+
+Usage (from the project root):
+    python -m benchmarks.bench_sqlite_profiles [--rows 20000] [--seconds 2] [--readers 3]
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+
+from database import connection
+from database.connection import execute, executemany, fetchall, transaction
+from database.create_db import create_tables
+from database.migrations import migrate
+from database.tuning import PRESETS, set_profile
+
+DASHBOARD_QUERY = """
+    SELECT id, doctor, specialization, patient, start
+    FROM upcoming_consultations
+    WHERE date >= ?
+    ORDER BY date, time, id
+    LIMIT 200
+"""
+
+INSERT_CONSULTATION = "INSERT INTO consultations (patient, doctor, date, time) VALUES (?, ?, ?, ?)"
+
+
+def random_consultation(rng, patients, doctors):
+    """Return a random (patient, doctor, date, time) tuple in 2024-2026."""
+    return (
+        rng.randint(1, patients),
+        rng.randint(1, doctors),
+        f"{rng.randint(2024, 2026)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        f"{rng.randint(8, 18):02d}:{rng.choice(('00', '30'))}",
+    )
+
+
+def seed(rows: int, patients: int = 2000, doctors: int = 50):
+    """Create the schema in the current database and fill it with random rows."""
+    rng = random.Random(42)
+    with transaction() as cursor:
+        create_tables(cursor)
+    migrate()
+    with transaction():
+        executemany("INSERT INTO specialization (name) VALUES (?)", [(f"Specialization {i}",) for i in range(10)])
+        executemany(
+            "INSERT INTO doctor (name, email, specialization_id) VALUES (?, ?, ?)",
+            [(f"Doctor {i}", f"doctor{i}@clinic.com", i % 10 + 1) for i in range(doctors)],
+        )
+        executemany(
+            "INSERT INTO patient (name, email) VALUES (?, ?)",
+            [(f"Patient {i}", f"patient{i}@mail.com") for i in range(patients)],
+        )
+        executemany(INSERT_CONSULTATION, (random_consultation(rng, patients, doctors) for _ in range(rows)))
+
+
+def timed_loop(seconds: float, action) -> int:
+    """Run action repeatedly for the given duration and return how many times it ran."""
+    count = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        action()
+        count += 1
+    return count
+
+
+def bench_preset(name: str, rows: int, seconds: float, readers: int) -> dict:
+    """Seed a fresh database with the given preset and time every workload."""
+    with tempfile.TemporaryDirectory() as tmp:
+        connection.set_database_path(os.path.join(tmp, "bench.db"))
+        set_profile(name)
+        try:
+            seed(rows)
+            rng = random.Random(7)
+
+            writes = timed_loop(seconds, lambda: execute(INSERT_CONSULTATION, random_consultation(rng, 2000, 50)))
+            reads = timed_loop(seconds, lambda: fetchall(DASHBOARD_QUERY, ("2025-01-01",)))
+
+            # Mixed workload: every thread uses its own connection from the manager
+            counts = {"reads": 0, "writes": 0}
+            lock = threading.Lock()
+
+            def writer():
+                writer_rng = random.Random(11)
+                n = timed_loop(seconds, lambda: execute(INSERT_CONSULTATION, random_consultation(writer_rng, 2000, 50)))
+                with lock:
+                    counts["writes"] += n
+                connection.close_connection()
+
+            def reader():
+                n = timed_loop(seconds, lambda: fetchall(DASHBOARD_QUERY, ("2025-01-01",)))
+                with lock:
+                    counts["reads"] += n
+                connection.close_connection()
+
+            threads = [threading.Thread(target=writer)] + [threading.Thread(target=reader) for _ in range(readers)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            connection.close_all_connections()
+            set_profile(None)
+
+    return {
+        "writes/s": writes / seconds,
+        "reads/s": reads / seconds,
+        "mixed writes/s": counts["writes"] / seconds,
+        "mixed reads/s": counts["reads"] / seconds,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=20000, help="consultations seeded per database")
+    parser.add_argument("--seconds", type=float, default=2.0, help="duration of each workload")
+    parser.add_argument("--readers", type=int, default=3, help="reader threads in the mixed workload")
+    parser.add_argument("--presets", nargs="*", default=list(PRESETS), help="presets to compare")
+    args = parser.parse_args()
+
+    columns = ("writes/s", "reads/s", "mixed writes/s", "mixed reads/s")
+    print(f"{'preset':<12}" + "".join(f"{col:>16}" for col in columns))
+    for name in args.presets:
+        result = bench_preset(name, args.rows, args.seconds, args.readers)
+        print(f"{name:<12}" + "".join(f"{result[col]:>16.0f}" for col in columns))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+Cold-start time of the application: imports, first frame and background warm-up.
+
+Every run starts a fresh interpreter, so nothing is imported or cached yet,
+and follows main.start() step by step:
+
+- interpreter:  from launching the process to the first line of the probe
+- import:       main and the modules of the first window
+- migrate:      database.migrations.migrate
+- first frame:  creating the root window and FirstWindow until Tk has drawn them
+- login frame:  pressing Login until the login window is drawn
+- warm-up:      each step of services.warmup (on its own thread, started after the first frame)
+
+The first frame is the moment the user can click; it is reported as
+"to first frame", from the launch of the process. The probe also lists the
+application modules imported by then, and fails the run if the Menu or the
+AdminMenu are among them. Frames need a display: without one (no $DISPLAY)
+they are skipped, so run it under xvfb-run to time them on a server.
+
+Usage (from the project root):
+    python -m benchmarks.bench_startup [--db clinic.db] [--repeat 5] [--output startup.json]
+
+The database is migrated like on a real start, so by default the run uses a
+copy of database/clinic.db. Pass the database generated by bench_hot_paths
+to see the warm-up at clinic scale.
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that must not be imported before the first frame
+LAZY_MODULES = ("gui.menu", "gui.menu_admin", "classes.table", "services")
+
+# Run in a new interpreter with the database path as argument; prints one JSON line
+PROBE = r"""
+import sys, time
+started = time.time()
+clock = time.perf_counter
+t = clock()
+timings = {}
+
+import tkinter as tk
+import main
+from gui.first_window import FirstWindow
+timings["import"] = clock() - t
+
+from database import connection
+connection.set_database_path(sys.argv[1])
+t = clock()
+from database.migrations import migrate
+migrate()
+timings["migrate"] = clock() - t
+
+root = None
+try:
+    t = clock()
+    root = tk.Tk()
+    window = FirstWindow(root)
+    root.update()
+    timings["first frame"] = clock() - t
+except tk.TclError as error:
+    frame_error = str(error)
+else:
+    frame_error = None
+to_first_frame = time.time() - started
+modules = sorted(name for name in sys.modules if name.split(".")[0] in ("gui", "classes", "services", "database", "utils", "constants"))
+
+t = clock()
+main.after_first_frame()
+if root is not None and frame_error is None:
+    t = clock()
+    window.open_login()
+    root.update()
+    timings["login frame"] = clock() - t
+
+from services.warmup import start_warmup
+warmup = start_warmup()
+warmup.wait()
+for step, seconds in warmup.timings.items():
+    timings["warm-up " + step] = seconds
+
+from classes.metrics import stop_exporter
+stop_exporter()
+if root is not None:
+    root.destroy()
+
+import json
+print(json.dumps({
+    "started": started, "to_first_frame": to_first_frame, "timings": timings,
+    "modules": modules, "frame_error": frame_error,
+}))
+"""
+
+
+def probe(db: str) -> dict:
+    """Start the application in a new interpreter and return the timings it reports (in seconds)."""
+    env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    launched = time.time()
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE, db], cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result["timings"] = {"interpreter": result["started"] - launched, **result["timings"]}
+    result["to_first_frame"] += result["started"] - launched
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--db", help="database to start with (default: a copy of database/clinic.db)")
+    parser.add_argument("--repeat", type=int, default=5, help="cold starts to time")
+    parser.add_argument("--output", help="results file to write (JSON)")
+    args = parser.parse_args()
+
+    db = args.db
+    if db is None:
+        from constants import PATH_TO_DB
+        db = os.path.join(tempfile.mkdtemp(prefix="clinic_startup_"), "clinic.db")
+        shutil.copyfile(PATH_TO_DB, db)
+
+    runs = [probe(db) for _ in range(args.repeat)]
+    first = runs[0]
+    if first["frame_error"]:
+        print(f"No frames timed ({first['frame_error']}); run under xvfb-run to time them")
+
+    results = {}
+    print(f"{'phase':<34}{'median ms':>11}{'max ms':>10}")
+    for phase in first["timings"]:
+        values = [run["timings"][phase] * 1000 for run in runs if phase in run["timings"]]
+        results[phase] = {"median_ms": statistics.median(values), "max_ms": max(values)}
+        print(f"{phase:<34}{results[phase]['median_ms']:>11.1f}{results[phase]['max_ms']:>10.1f}")
+    to_first_frame = [run["to_first_frame"] * 1000 for run in runs]
+    results["to first frame"] = {"median_ms": statistics.median(to_first_frame), "max_ms": max(to_first_frame)}
+    print(f"{'to first frame':<34}{results['to first frame']['median_ms']:>11.1f}{max(to_first_frame):>10.1f}")
+
+    eager = [name for name in LAZY_MODULES if name in first["modules"]]
+    print(f"{len(first['modules'])} application modules imported before the first frame")
+    if eager:
+        print("Imported before the first frame, should be lazy: " + ", ".join(eager))
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({"db": db, "repeat": args.repeat, "results": results, "modules": first["modules"]}, file, indent=2)
+        print(f"Results written to {args.output}")
+    sys.exit(1 if eager else 0)
+
+
+if __name__ == "__main__":
+    main()
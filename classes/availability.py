@@ -0,0 +1,331 @@
+"""
+Availability engine: which doctors and patients are busy when.
+
+Every consultation lasts CONSULTATION_DURATION_MINUTES. For each doctor and
+each patient the engine keeps the start times of their consultations in a
+sorted list, so "is this slot free?" and "what overlaps this range?" are
+answered with a binary search instead of a query. The shared engine is loaded
+from the consultations table on first use and kept current by the code that
+writes consultations (see refresh_consultations) and by the change log that
+triggers fill on every workstation (see sync_availability). It is a fast
+first check; the booking itself is checked again against the table inside
+the write transaction (see ConsultationService.check).
+"""
+import bisect
+import threading
+from datetime import date as Date
+from constants import CONSULTATION_DURATION_MINUTES
+
+MINUTES_PER_DAY = 24 * 60
+
+
+def slot_start(date: str, time: str) -> int:
+    """
+    Convert a consultation's date and time to minutes since 0001-01-01.
+
+    Args:
+        date (str): Date as YYYY-MM-DD
+        time (str): Time as HH:MM
+
+    Returns:
+        int: Start of the slot in minutes
+
+    Raises:
+        ValueError: If the date or time is not valid
+    """
+    hours, minutes = time.split(":")[:2]
+    hours, minutes = int(hours), int(minutes)
+    if not (0 <= hours < 24 and 0 <= minutes < 60):
+        raise ValueError(f"Invalid time: {time}")
+    return Date.fromisoformat(date).toordinal() * MINUTES_PER_DAY + hours * 60 + minutes
+
+
+def overlap_ranges(date: str, time: str, duration: int = CONSULTATION_DURATION_MINUTES) -> list:
+    """
+    Get the start times a consultation needs to have to overlap the one starting at a date and time.
+
+    A consultation starting at `s` overlaps [start, start + duration) when
+    start - duration < s < start + duration, which near midnight reaches into
+    the day before or after. The ranges are meant for an indexed lookup on
+    consultations(doctor or patient, date, time).
+
+    Args:
+        date (str): Date as YYYY-MM-DD
+        time (str): Time as HH:MM
+        duration (int): Length of every consultation in minutes
+
+    Returns:
+        list: (date, after, before) with exclusive "HH:MM" bounds ("" and "24:00" leave a side open)
+
+    Raises:
+        ValueError: If the date or time is not valid
+    """
+    start = slot_start(date, time)
+    day = Date.fromordinal(start // MINUTES_PER_DAY)
+    low, high = start % MINUTES_PER_DAY - duration, start % MINUTES_PER_DAY + duration
+
+    def clock(minutes):
+        return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+    ranges = [(day.isoformat(), clock(low) if low >= 0 else "", clock(high) if high < MINUTES_PER_DAY else "24:00")]
+    if low < 0:
+        ranges.append((Date.fromordinal(day.toordinal() - 1).isoformat(), clock(low + MINUTES_PER_DAY), "24:00"))
+    if high > MINUTES_PER_DAY:
+        ranges.append((Date.fromordinal(day.toordinal() + 1).isoformat(), "", clock(high - MINUTES_PER_DAY)))
+    return ranges
+
+
+class Availability:
+    """
+    Sorted consultation start times per doctor and per patient.
+
+    Owners are keyed as ("doctor", id) or ("patient", id). Since every
+    consultation has the same duration, a consultation starting at `s` overlaps
+    the range [start, end) exactly when start - duration < s < end, which is a
+    single bisect on the owner's sorted starts.
+
+    Args:
+        duration (int): Length of every consultation in minutes
+    """
+
+    def __init__(self, duration=CONSULTATION_DURATION_MINUTES):
+        self.duration = duration
+        self._lock = threading.Lock()
+        self._schedules = {}      # (kind, id) -> sorted list of (start, consultation id)
+        self._consultations = {}  # consultation id -> (doctor, patient, start)
+        self._listeners = []      # Called with (doctor, start) after a change, (None, None) after load
+
+    def __len__(self):
+        return len(self._consultations)
+
+    def subscribe(self, listener):
+        """
+        Get told about every change, e.g. to keep a derived structure up to date.
+
+        Args:
+            listener (callable): Called with (doctor, start) for every consultation added or
+                removed, and with (None, None) when everything was reloaded
+        """
+        self._listeners.append(listener)
+
+    def _notify(self, changes):
+        for listener in self._listeners:
+            for doctor, start in changes:
+                listener(doctor, start)
+
+    def load(self, rows):
+        """
+        Replace everything with the given consultations.
+
+        Rows whose date or time cannot be parsed are skipped.
+
+        Args:
+            rows (iterable): (id, doctor, patient, date, time) tuples
+        """
+        with self._lock:
+            self._schedules, self._consultations = {}, {}
+            for id, doctor, patient, date, time in rows:
+                try:
+                    start = slot_start(date, time)
+                except (AttributeError, ValueError):
+                    continue
+                self._consultations[id] = (doctor, patient, start)
+                self._schedules.setdefault(("doctor", doctor), []).append((start, id))
+                self._schedules.setdefault(("patient", patient), []).append((start, id))
+            for schedule in self._schedules.values():
+                schedule.sort()
+        self._notify([(None, None)])
+
+    def add(self, id, doctor, patient, date, time):
+        """Add a consultation, replacing the one with the same id if there is one."""
+        start = slot_start(date, time)
+        changes = [(doctor, start)]
+        with self._lock:
+            if id in self._consultations:
+                changes.append(self._remove(id))
+            self._consultations[id] = (doctor, patient, start)
+            bisect.insort(self._schedules.setdefault(("doctor", doctor), []), (start, id))
+            bisect.insort(self._schedules.setdefault(("patient", patient), []), (start, id))
+        self._notify(changes)
+
+    def remove(self, id):
+        """Remove a consultation, if present."""
+        with self._lock:
+            if id not in self._consultations:
+                return
+            change = self._remove(id)
+        self._notify([change])
+
+    def _remove(self, id):
+        """Remove a consultation and return its (doctor, start)."""
+        doctor, patient, start = self._consultations.pop(id)
+        for owner in (("doctor", doctor), ("patient", patient)):
+            schedule = self._schedules[owner]
+            index = bisect.bisect_left(schedule, (start, id))
+            if index < len(schedule) and schedule[index] == (start, id):
+                del schedule[index]
+            if not schedule:
+                del self._schedules[owner]
+        return doctor, start
+
+    def overlapping(self, kind: str, owner_id, start: int, end: int) -> list:
+        """
+        Find the consultations of a doctor or patient that overlap a range.
+
+        Args:
+            kind (str): "doctor" or "patient"
+            owner_id (int): ID of the doctor or patient
+            start (int): Start of the range in minutes (see slot_start)
+            end (int): End of the range in minutes (exclusive)
+
+        Returns:
+            list: (start, consultation id) tuples, in start order
+        """
+        with self._lock:
+            schedule = self._schedules.get((kind, owner_id), [])
+            # Consultations starting after start - duration still run into the range
+            low = bisect.bisect_right(schedule, (start - self.duration, float("inf")))
+            high = bisect.bisect_left(schedule, (end, float("-inf")))
+            return schedule[low:high]
+
+    def is_free(self, kind: str, owner_id, start: int, ignore=None) -> bool:
+        """
+        Check whether a doctor or patient can take a consultation starting at `start`.
+
+        Args:
+            kind (str): "doctor" or "patient"
+            owner_id (int): ID of the doctor or patient
+            start (int): Start of the slot in minutes (see slot_start)
+            ignore (int): ID of a consultation to leave out (the one being edited)
+
+        Returns:
+            bool: True if nothing else overlaps the slot
+        """
+        overlaps = self.overlapping(kind, owner_id, start, start + self.duration)
+        return all(id == ignore for _, id in overlaps)
+
+    def conflicts(self, doctor, patient, date: str, time: str, ignore=None) -> list:
+        """
+        Find what keeps a consultation from being booked.
+
+        Args:
+            doctor (int): ID of the doctor
+            patient (int): ID of the patient
+            date (str): Date as YYYY-MM-DD
+            time (str): Time as HH:MM
+            ignore (int): ID of a consultation to leave out (the one being edited)
+
+        Returns:
+            list: ("doctor" or "patient", consultation id) for every clash; empty if the slot is free
+
+        Raises:
+            ValueError: If the date or time is not valid
+        """
+        start = slot_start(date, time)
+        end = start + self.duration
+        found = []
+        for kind, owner_id in (("doctor", doctor), ("patient", patient)):
+            found.extend((kind, id) for _, id in self.overlapping(kind, owner_id, start, end) if id != ignore)
+        return found
+
+
+_availability = None
+_availability_lock = threading.Lock()
+_synced = 0  # Last entry of the consultation change log applied to the shared engine
+
+
+def get_availability() -> Availability:
+    """
+    Get the shared availability engine, loading it from the consultations table on first use.
+
+    Every call first applies what other workstations (and this one) wrote
+    since the last call (see sync_availability), so the engine never misses a
+    booking made on another machine for longer than it takes to ask for it.
+
+    Returns:
+        Availability: The application's availability engine
+    """
+    global _availability, _synced
+    availability = _availability
+    if availability is None:
+        from database.connection import fetchall, fetchone
+        with _availability_lock:
+            if _availability is None:
+                # The log position is read first: changes made while loading are applied again, which is harmless
+                _synced = fetchone("SELECT COALESCE(MAX(seq), 0) FROM consultation_changes")[0]
+                availability = Availability()
+                availability.load(fetchall("SELECT id, doctor, patient, date, time FROM consultations"))
+                _availability = availability
+                return availability
+            availability = _availability
+    sync_availability()
+    return availability
+
+
+def sync_availability():
+    """
+    Apply the consultations written since the shared engine last looked at the change log.
+
+    The log (consultation_changes, migration 7) is filled by triggers on every
+    connection, so it includes bookings made on other workstations sharing
+    clinic.db. A single indexed query finds nothing in the common case. If the
+    engine fell behind by more than the log keeps, it is reloaded.
+
+    Inside a transaction the log may hold this connection's own uncommitted
+    entries, whose positions are reused if it rolls back: they are applied but
+    the engine only moves past them once a sync runs outside a transaction.
+    """
+    global _synced
+    availability = _availability
+    if availability is None:
+        return
+    from database.connection import fetchall, get_connection
+    with _availability_lock:
+        changes = fetchall(
+            "SELECT seq, consultation_id FROM consultation_changes WHERE seq > ? ORDER BY seq", (_synced,)
+        )
+        if not changes:
+            return
+        if changes[0][0] != _synced + 1:
+            # Entries this engine never applied were pruned: read everything again
+            from database.connection import fetchone
+            latest = fetchone("SELECT COALESCE(MAX(seq), 0) FROM consultation_changes")[0]
+            availability.load(fetchall("SELECT id, doctor, patient, date, time FROM consultations"))
+            if not get_connection().in_transaction:
+                _synced = latest
+            return
+        refresh_consultations({id for _, id in changes})
+        if not get_connection().in_transaction:
+            _synced = changes[-1][0]
+
+
+def refresh_consultations(ids):
+    """
+    Bring the shared engine up to date after consultations were inserted, edited or deleted.
+
+    Does nothing if the engine was not loaded yet (it will be read fresh on first use).
+
+    Args:
+        ids (iterable): IDs of the consultations that changed
+    """
+    availability = _availability
+    if availability is None:
+        return
+    from database.connection import fetchone
+    for id in ids:
+        row = fetchone("SELECT id, doctor, patient, date, time FROM consultations WHERE id = ?", (id,))
+        if row is None:
+            availability.remove(id)
+        else:
+            try:
+                availability.add(*row)
+            except ValueError:
+                availability.remove(id)
+
+
+def reset_availability():
+    """Drop the shared engine so it is reloaded on next use (e.g. after switching databases)."""
+    global _availability, _synced
+    with _availability_lock:
+        _availability = None
+        _synced = 0
@@ -6,29 +6,42 @@ class Doctor(Person):
     Doctor class that represents a medical professional.
     Inherits from Person class and adds specialty-specific functionality.
     """
+    __slots__ = ("__specialization_id", "__specialty")
+    table_name = "doctor"
 
-    def __init__(self, name, email, specialty):
+    def __init__(self, name, email, specialization_id, specialty=None):
         """
         Initialize a Doctor instance.
 
         Args:
             name (str): The doctor's full name
             email (str): The doctor's email address
-            specialty (str): The doctor's medical specialty
+            specialization_id (int): ID of the doctor's medical specialty
+            specialty (str): Name of the specialty, for display (optional)
         """
         # Initialize parent class (Person) with name and email
         super().__init__(name, email)
-        # Store specialty as private attribute
+        # Store the specialty as its ID, like the doctor table does
+        self.__specialization_id = specialization_id
         self.__specialty = specialty
-        self.table_name = "doctor"
-    
+
+    @property
+    def specialization_id(self):
+        """
+        Get the ID of the doctor's specialty.
+
+        Returns:
+            int: ID of the row in the specialization table
+        """
+        return self.__specialization_id
+
     @property
     def specialty(self):
         """
         Get the doctor's specialty.
 
         Returns:
-            str: The medical specialty of the doctor
+            str: The medical specialty of the doctor, or None if only its ID is known
         """
         return self.__specialty
 
@@ -39,11 +52,9 @@ class Doctor(Person):
         Returns:
             str: Formatted string with doctor's name and specialty
         """
-        return f"{self.name} - {self.specialty}"
-    
-    
+        return f"{self.name} - {self.specialty}" if self.specialty else self.name
+
     def get_db_values(self):
-        from utils import get_id
         columns = "name, email, specialization_id"
-        values = (self.name, self.email, get_id(self.specialty, "name", "specialization"))
+        values = (self.name, self.email, self.specialization_id)
         return columns, values
@@ -0,0 +1,261 @@
+"""
+Free-slot search: "who is the first Cardiology doctor free after Tuesday 10:00?"
+
+The day is cut into slots of CONSULTATION_DURATION_MINUTES. Each doctor's
+weekly working hours (doctor_schedule, or DEFAULT_WORKING_HOURS) become one
+bitmask of working slots per weekday, and each doctor-day's booked slots one
+bitmask stored in an array of 64-bit words. The free slots of a doctor-day are
+`working & ~booked`; OR-ing them across every doctor of a specialization tells
+at once whether anyone is free that day and at which slots.
+
+Booked masks are computed from the availability engine the first time a day
+is looked at and recomputed only for the doctor-day a write touched.
+"""
+import threading
+from array import array
+from datetime import date as Date, datetime
+from constants import CONSULTATION_DURATION_MINUTES, DEFAULT_WORKING_HOURS
+
+MINUTES_PER_DAY = 24 * 60
+WORD_BITS = 64
+
+
+def _minutes(time: str) -> int:
+    hours, minutes = time.split(":")[:2]
+    return int(hours) * 60 + int(minutes)
+
+
+class SlotMap:
+    """
+    Working and booked slot bitmaps of every doctor.
+
+    Bit `i` of a day's mask is the slot starting `i * slot_minutes` after
+    midnight. Booked masks live in one `array('Q')` per doctor, `words_per_day`
+    words per day counted from `base` (the first day the map covers); a
+    parallel bytearray records which days are up to date.
+
+    Args:
+        availability (Availability): Engine the booked slots are read from
+        slot_minutes (int): Length of a slot
+        base (date): First day covered (defaults to today)
+    """
+
+    def __init__(self, availability, slot_minutes=CONSULTATION_DURATION_MINUTES, base=None):
+        self.availability = availability
+        self.slot_minutes = slot_minutes
+        self.slots_per_day = MINUTES_PER_DAY // slot_minutes
+        self.words_per_day = -(-self.slots_per_day // WORD_BITS)
+        self.base = (base or Date.today()).toordinal()
+        self._lock = threading.RLock()
+        self._booked = {}   # doctor -> array('Q') of booked masks, words_per_day words per day
+        self._valid = {}    # doctor -> bytearray, 1 where the day's mask is up to date
+        self._working = None  # doctor -> 7 working masks (Monday first); None until loaded
+        availability.subscribe(self._on_change)
+
+    # Working hours
+
+    def _hours_mask(self, hours) -> int:
+        """Mask of the slots lying entirely within the given (start, end) ranges."""
+        mask = 0
+        for start, end in hours:
+            first = -(-_minutes(start) // self.slot_minutes)
+            last = (_minutes(end) - self.slot_minutes) // self.slot_minutes
+            for slot in range(first, last + 1):
+                mask |= 1 << slot
+        return mask
+
+    def _load_working(self):
+        from database.connection import fetchall
+        hours = {}
+        for doctor, weekday, start, end in fetchall(
+                "SELECT doctor, weekday, start_time, end_time FROM doctor_schedule"):
+            hours.setdefault(doctor, [[] for _ in range(7)])[weekday].append((start, end))
+        default = [[] for _ in range(7)]
+        for weekday, start, end in DEFAULT_WORKING_HOURS:
+            default[weekday].append((start, end))
+        self._default_working = [self._hours_mask(day) for day in default]
+        self._working = {doctor: [self._hours_mask(day) for day in week] for doctor, week in hours.items()}
+
+    def working_mask(self, doctor, weekday: int) -> int:
+        """Mask of the slots a doctor works on a weekday (Monday is 0)."""
+        with self._lock:
+            if self._working is None:
+                self._load_working()
+            return self._working.get(doctor, self._default_working)[weekday]
+
+    def invalidate_working_hours(self):
+        """Reload the working hours on next use (after doctor_schedule changed)."""
+        with self._lock:
+            self._working = None
+
+    # Booked slots
+
+    def _on_change(self, doctor, start):
+        """Availability listener: mark the doctor-day a write touched as out of date."""
+        with self._lock:
+            if doctor is None:
+                self._valid = {doctor: bytearray(len(valid)) for doctor, valid in self._valid.items()}
+                return
+            valid = self._valid.get(doctor)
+            if valid is None:
+                return
+            # A consultation can run past midnight into the next day
+            first_day = start // MINUTES_PER_DAY - self.base
+            last_day = (start + self.availability.duration - 1) // MINUTES_PER_DAY - self.base
+            for day in range(max(first_day, 0), min(last_day, len(valid) - 1) + 1):
+                valid[day] = 0
+
+    def _compute_booked(self, doctor, ordinal: int) -> int:
+        """Mask of the slots of a doctor-day overlapped by a consultation, read from the availability engine."""
+        day_start = ordinal * MINUTES_PER_DAY
+        mask = 0
+        for start, _ in self.availability.overlapping("doctor", doctor, day_start, day_start + MINUTES_PER_DAY):
+            first = max(start - day_start, 0) // self.slot_minutes
+            last = min(start - day_start + self.availability.duration - 1, MINUTES_PER_DAY - 1) // self.slot_minutes
+            mask |= ((1 << (last - first + 1)) - 1) << first
+        return mask
+
+    def booked_mask(self, doctor, ordinal: int) -> int:
+        """Mask of the booked slots of a doctor on a day (given as a date ordinal)."""
+        day = ordinal - self.base
+        if day < 0:
+            return self._compute_booked(doctor, ordinal)
+        with self._lock:
+            booked, valid = self._booked.get(doctor), self._valid.get(doctor)
+            if booked is None:
+                booked, valid = array("Q"), bytearray()
+                self._booked[doctor], self._valid[doctor] = booked, valid
+            if day >= len(valid):
+                # Grow to cover the day (plus some room) in one step
+                grow = day + 1 - len(valid) + 31
+                booked.extend([0] * (grow * self.words_per_day))
+                valid.extend(bytes(grow))
+            offset = day * self.words_per_day
+            if not valid[day]:
+                mask = self._compute_booked(doctor, ordinal)
+                for word in range(self.words_per_day):
+                    booked[offset + word] = (mask >> (word * WORD_BITS)) & 0xFFFFFFFFFFFFFFFF
+                valid[day] = 1
+                return mask
+            mask = 0
+            for word in range(self.words_per_day):
+                mask |= booked[offset + word] << (word * WORD_BITS)
+            return mask
+
+    def free_mask(self, doctor, ordinal: int) -> int:
+        """Mask of the slots a doctor works and has free on a day."""
+        weekday = Date.fromordinal(ordinal).weekday()
+        working = self.working_mask(doctor, weekday)
+        if not working:
+            return 0
+        return working & ~self.booked_mask(doctor, ordinal)
+
+    # Queries
+
+    def next_available(self, doctors, after: datetime, limit=5, within_days=90) -> list:
+        """
+        Find the earliest free slots among some doctors.
+
+        For every day from `after` on, the free masks of all doctors are OR-ed;
+        days on which nobody is free are skipped with one check, and the set bits
+        of the combined mask are walked in time order.
+
+        Args:
+            doctors (iterable): IDs of the doctors to consider
+            after (datetime): Slots must start at or after this moment
+            limit (int): Maximum number of options
+            within_days (int): How many days ahead to look
+
+        Returns:
+            list: (datetime of the slot, doctor ID) tuples, earliest first
+        """
+        doctors = list(doctors)
+        options = []
+        first_ordinal = after.date().toordinal()
+        # Slots of the first day that start before `after` are not wanted
+        first_slot = -(-(after.hour * 60 + after.minute) // self.slot_minutes)
+        for ordinal in range(first_ordinal, first_ordinal + within_days):
+            not_before = ~((1 << first_slot) - 1) if ordinal == first_ordinal else -1
+            free = {doctor: self.free_mask(doctor, ordinal) & not_before for doctor in doctors}
+            anyone = 0
+            for mask in free.values():
+                anyone |= mask
+            while anyone:
+                slot = (anyone & -anyone).bit_length() - 1
+                anyone &= anyone - 1
+                start = datetime.fromordinal(ordinal).replace(hour=slot * self.slot_minutes // 60,
+                                                              minute=slot * self.slot_minutes % 60)
+                for doctor in doctors:
+                    if free[doctor] >> slot & 1:
+                        options.append((start, doctor))
+                        if len(options) >= limit:
+                            return options
+        return options
+
+
+_slot_map = None
+_slot_map_lock = threading.Lock()
+
+
+def get_slot_map() -> SlotMap:
+    """
+    Get the shared slot map, created on first use on top of the shared availability engine.
+
+    The engine is synced first, so bookings made on other workstations are
+    out of the bitmaps before they are searched.
+    """
+    global _slot_map
+    from classes.availability import get_availability
+    availability = get_availability()
+    slot_map = _slot_map
+    if slot_map is None:
+        with _slot_map_lock:
+            if _slot_map is None:
+                _slot_map = SlotMap(availability)
+            slot_map = _slot_map
+    return slot_map
+
+
+def reset_slot_map():
+    """Drop the shared slot map so it is rebuilt on next use (e.g. after switching databases)."""
+    global _slot_map
+    with _slot_map_lock:
+        _slot_map = None
+
+
+def next_available_by_specialization(specialization_id, after=None, limit=5) -> list:
+    """
+    Find the first free slots of any doctor of a specialization.
+
+    Args:
+        specialization_id (int): ID of the specialization
+        after (datetime): Slots must start at or after this moment (defaults to now)
+        limit (int): Maximum number of options
+
+    Returns:
+        list: (datetime of the slot, doctor ID, doctor name) tuples, earliest first
+    """
+    from database.connection import fetchall
+    doctors = dict(fetchall("SELECT id, name FROM doctor WHERE specialization_id = ?", (specialization_id,)))
+    options = get_slot_map().next_available(doctors, after or datetime.now(), limit)
+    return [(start, doctor, doctors[doctor]) for start, doctor in options]
+
+
+def set_working_hours(doctor, hours):
+    """
+    Replace a doctor's weekly working hours.
+
+    Args:
+        doctor (int): ID of the doctor
+        hours (iterable): (weekday, start, end) tuples, Monday is 0, times as HH:MM;
+            empty to fall back to DEFAULT_WORKING_HOURS
+    """
+    from database.connection import transaction
+    with transaction() as cursor:
+        cursor.execute("DELETE FROM doctor_schedule WHERE doctor = ?", (doctor,))
+        cursor.executemany(
+            "INSERT INTO doctor_schedule (doctor, weekday, start_time, end_time) VALUES (?, ?, ?, ?)",
+            [(doctor, weekday, start, end) for weekday, start, end in hours]
+        )
+    if _slot_map is not None:
+        _slot_map.invalidate_working_hours()
@@ -0,0 +1,426 @@
+"""
+In-process metrics: counters and latency histograms of the UI's actions.
+
+Metrics are declared once, at import time, in the module that updates them:
+
+    >>> registry = Registry()
+    >>> LOGINS = registry.histogram("clinic_login_seconds", "Time to check credentials", ("outcome",))
+    >>> LOGINS.labels("success").observe(0.012)
+    >>> print(registry.to_prometheus().splitlines()[0])
+    # HELP clinic_login_seconds Time to check credentials
+
+Updating a metric is a bucket lookup and an increment under a lock, cheap
+enough for every key press. The application's registry (get_registry()) is
+written to a file every few seconds by a MetricsExporter, in the Prometheus
+text format (for node_exporter's textfile collector) or as a JSON snapshot.
+The file, format and interval come from the [metrics] section of
+constants.PATH_TO_DB_CONFIG or CLINIC_METRICS_<KEY> environment variables.
+"""
+import abc
+import os
+import threading
+import time
+from bisect import bisect_left
+
+# Upper bounds in seconds of the latency buckets, from a key press to a slow report
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+DEFAULT_SETTINGS = {
+    # Kept on the workstation, as clinic.db may live on a share used by several of them.
+    # None is DEFAULT_FILE_NAME in the temp directory, resolved by load_settings.
+    "file": None,
+    "format": "prometheus",
+    "interval_seconds": 15.0,
+}
+FORMATS = ("prometheus", "json")
+
+DEFAULT_FILE_NAME = "clinic_metrics.prom"
+
+ENV_PREFIX = "CLINIC_METRICS_"
+
+
+class _CounterChild:
+    """The value of a counter for one combination of label values."""
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        """Add `amount` (1 by default) to the counter."""
+        with self._lock:
+            self.value += amount
+
+
+class _HistogramChild:
+    """The buckets, count and sum of a histogram for one combination of label values."""
+    __slots__ = ("bounds", "counts", "sum", "_lock")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # Per bucket (not cumulative); the last one is +Inf
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        """Record one value (a duration in seconds)."""
+        index = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def time(self):
+        """
+        Time a block and observe its duration.
+
+        Example:
+            with SAVES.labels("book").time():
+                services.consultations.book(patient, doctor, date, time)
+        """
+        return _Timer(self)
+
+
+class _Timer:
+    """Context manager observing the time spent in its block."""
+    __slots__ = ("_child", "_start")
+
+    def __init__(self, child):
+        self._child = child
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._child.observe(time.perf_counter() - self._start)
+        return False
+
+
+class Metric(abc.ABC):
+    """
+    A named metric with optional labels; each combination of label values has its own child.
+
+    Args:
+        name (str): Metric name, e.g. "clinic_login_seconds"
+        help (str): One-line description
+        labelnames (tuple): Names of the labels (empty for a single series)
+    """
+    type = None
+
+    def __init__(self, name: str, help: str, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._children[()] = self._new_child()
+
+    def labels(self, *values):
+        """
+        Get the child for some label values, creating it on first use.
+
+        Args:
+            *values: One value per label name, in order
+
+        Returns:
+            The child to update (inc for counters, observe/time for histograms)
+        """
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            key = tuple(str(value) for value in values)
+            with self._lock:
+                child = self._children.get(key)
+                if child is None:
+                    child = self._children[key] = self._new_child()
+        return child
+
+    def children(self) -> list:
+        """Return (label values, child) for every combination seen so far."""
+        with self._lock:
+            return sorted(self._children.items(), key=lambda item: item[0])
+
+    @abc.abstractmethod
+    def _new_child(self):
+        """Create the child holding the value of one combination of label values."""
+
+
+class Counter(Metric):
+    """A value that only goes up, e.g. the number of rejected bookings."""
+    type = "counter"
+
+    def inc(self, amount: float = 1):
+        """Add to a counter without labels."""
+        self._children[()].inc(amount)
+
+    def _new_child(self):
+        return _CounterChild()
+
+
+class Histogram(Metric):
+    """
+    A distribution of durations in seconds.
+
+    Args:
+        buckets (tuple): Sorted upper bounds of the buckets (+Inf is added)
+    """
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help, labelnames)
+
+    def observe(self, value: float):
+        """Record a value in a histogram without labels."""
+        self._children[()].observe(value)
+
+    def time(self):
+        """Time a block with a histogram without labels."""
+        return self._children[()].time()
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+
+def _escape(value: str) -> str:
+    """Escape a label value for the Prometheus text format."""
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra=None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Registry:
+    """The set of metrics written to one file."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help: str, labelnames=()) -> Counter:
+        """Get a counter, declaring it on first use."""
+        return self._get(Counter, name, help, labelnames)
+
+    def histogram(self, name: str, help: str, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        """Get a histogram, declaring it on first use."""
+        return self._get(Histogram, name, help, labelnames, buckets=buckets)
+
+    def _get(self, cls, name, help, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help, labelnames, **kwargs)
+            elif type(metric) is not cls or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"Metric {name} is already declared as a {metric.type} with labels {metric.labelnames}")
+            return metric
+
+    def metrics(self) -> list:
+        """Return every metric, sorted by name."""
+        with self._lock:
+            return [self._metrics[name] for name in sorted(self._metrics)]
+
+    def snapshot(self) -> dict:
+        """
+        Get the current value of every metric.
+
+        Returns:
+            dict: name -> {"type", "help", "samples"}; a counter sample has
+                "labels" and "value", a histogram sample has "labels", "count",
+                "sum" and "buckets" (upper bound -> cumulative count)
+        """
+        result = {}
+        for metric in self.metrics():
+            samples = []
+            for values, child in metric.children():
+                labels = dict(zip(metric.labelnames, values))
+                if metric.type == "counter":
+                    samples.append({"labels": labels, "value": child.value})
+                    continue
+                with child._lock:
+                    counts, total = list(child.counts), child.sum
+                cumulative, buckets = 0, {}
+                for bound, count in zip(child.bounds + (float("inf"),), counts):
+                    cumulative += count
+                    buckets["+Inf" if bound == float("inf") else repr(bound)] = cumulative
+                samples.append({"labels": labels, "count": cumulative, "sum": total, "buckets": buckets})
+            result[metric.name] = {"type": metric.type, "help": metric.help, "samples": samples}
+        return result
+
+    def to_prometheus(self) -> str:
+        """Render every metric in the Prometheus text exposition format."""
+        lines = []
+        for name, metric in self.snapshot().items():
+            lines.append(f"# HELP {name} {metric['help']}")
+            lines.append(f"# TYPE {name} {metric['type']}")
+            for sample in metric["samples"]:
+                names, values = tuple(sample["labels"]), tuple(sample["labels"].values())
+                if metric["type"] == "counter":
+                    lines.append(f"{name}{_format_labels(names, values)} {_format_number(sample['value'])}")
+                    continue
+                for bound, count in sample["buckets"].items():
+                    lines.append(f"{name}_bucket{_format_labels(names, values, ('le', bound))} {count}")
+                lines.append(f"{name}_sum{_format_labels(names, values)} {_format_number(sample['sum'])}")
+                lines.append(f"{name}_count{_format_labels(names, values)} {sample['count']}")
+        return "\n".join(lines) + "\n"
+
+    def to_json(self) -> str:
+        """Render every metric as a JSON snapshot with the time it was taken."""
+        import json
+        return json.dumps({"timestamp": time.time(), "metrics": self.snapshot()}, indent=2)
+
+    def write(self, path: str, format: str = "prometheus"):
+        """
+        Write the metrics to a file, atomically, so a collector never reads half a file.
+
+        Args:
+            path (str): File to write
+            format (str): "prometheus" or "json"
+        """
+        content = self.to_json() if format == "json" else self.to_prometheus()
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "w", encoding="utf-8") as file:
+            file.write(content)
+        os.replace(temporary, path)
+
+
+def load_settings(config_path: str = None, environ=None) -> dict:
+    """
+    Read where and how often metrics are written, from the config file and the environment.
+
+    Args:
+        config_path (str): Path to the INI file (defaults to constants.PATH_TO_DB_CONFIG)
+        environ (dict): Environment to read overrides from (defaults to os.environ)
+
+    Returns:
+        dict: file (empty to write nothing), format and interval_seconds
+
+    Raises:
+        ValueError: If a setting is unknown or has an invalid value
+    """
+    if config_path is None:
+        from constants import PATH_TO_DB_CONFIG
+        config_path = PATH_TO_DB_CONFIG
+    if environ is None:
+        environ = os.environ
+
+    import configparser
+    values = {}
+    parser = configparser.ConfigParser()
+    if parser.read(config_path) and parser.has_section("metrics"):
+        values.update(parser.items("metrics"))
+    for key in DEFAULT_SETTINGS:
+        env_value = environ.get(ENV_PREFIX + key.upper())
+        if env_value is not None:
+            values[key] = env_value
+
+    unknown = set(values) - set(DEFAULT_SETTINGS)
+    if unknown:
+        raise ValueError(f"Unknown metrics setting(s): {', '.join(sorted(unknown))}")
+
+    settings = dict(DEFAULT_SETTINGS)
+    for key, value in values.items():
+        settings[key] = float(value) if key == "interval_seconds" else str(value).strip()
+    settings["format"] = settings["format"].lower()
+    if settings["format"] not in FORMATS:
+        raise ValueError(f"Invalid format: {settings['format']!r} (expected one of {', '.join(FORMATS)})")
+    if settings["interval_seconds"] <= 0:
+        raise ValueError(f"Invalid interval_seconds: {settings['interval_seconds']} (expected more than 0)")
+    if settings["file"] is None:
+        import tempfile
+        settings["file"] = os.path.join(tempfile.gettempdir(), DEFAULT_FILE_NAME)
+    elif settings["file"]:
+        settings["file"] = os.path.join(os.path.dirname(os.path.abspath(config_path)), settings["file"])
+    return settings
+
+
+class MetricsExporter:
+    """
+    Writes a registry to a file every `interval` seconds on a daemon thread.
+
+    Args:
+        registry (Registry): Metrics to write
+        path (str): File to write
+        format (str): "prometheus" or "json"
+        interval (float): Seconds between writes
+    """
+
+    def __init__(self, registry, path: str, format: str = "prometheus", interval: float = 15.0):
+        self.registry = registry
+        self.path = path
+        self.format = format
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start writing in the background."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="metrics-exporter", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the background thread and write the final values."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def flush(self):
+        """Write the metrics now; a failed write is logged and retried on the next interval."""
+        try:
+            self.registry.write(self.path, self.format)
+        except OSError:
+            import logging
+            logging.getLogger(__name__).warning("Could not write metrics to %s", self.path, exc_info=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.flush()
+
+
+_registry = Registry()
+_exporter = None
+
+
+def get_registry() -> Registry:
+    """Get the application's metrics registry."""
+    return _registry
+
+
+def start_exporter(settings: dict = None):
+    """
+    Start writing the application's metrics to the configured file.
+
+    Args:
+        settings (dict): Settings as returned by load_settings (loaded if None)
+
+    Returns:
+        MetricsExporter: The exporter, or None if no file is configured
+    """
+    global _exporter
+    if settings is None:
+        settings = load_settings()
+    if _exporter is None and settings["file"]:
+        _exporter = MetricsExporter(_registry, settings["file"], settings["format"], settings["interval_seconds"])
+        _exporter.start()
+    return _exporter
+
+
+def stop_exporter():
+    """Stop the exporter started by start_exporter, writing the final values."""
+    global _exporter
+    if _exporter is not None:
+        _exporter.stop()
+        _exporter = None
@@ -5,6 +5,8 @@ class Patient(Person):
     Patient class that represents a person seeking medical care.
     Inherits from Person class and adds patient-specific information.
     """
+    __slots__ = ("__adress", "__phone", "__birth_date")
+    table_name = "patient"
 
     def __init__(self, name, adress, birth_date, phone, email):
         """
@@ -22,7 +24,6 @@ class Patient(Person):
         self.__adress = adress
         self.__phone = phone
         self.__birth_date = birth_date
-        self.table_name = "patient"
     
     
 
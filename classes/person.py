@@ -1,12 +1,16 @@
-from constants import PATH_TO_DB
 import sqlite3
+from database.connection import execute, fetchall, fetchone
 
 
 class Person:
     """
     Base Person class that serves as a parent class for Doctor and Patient.
     Contains common attributes and methods for all person types in the system.
+    People are read-only and slotted (no per-instance __dict__); subclasses set
+    `table_name` and declare their own __slots__.
     """
+    __slots__ = ("__name", "__email")
+    table_name = None
 
     def __init__(self, name, email):
         """
@@ -53,32 +57,27 @@ class Person:
         """
         Check if the person exists in the database.
         """
-        import sqlite3
-        #from constants import PATH_TO_DB
-        with sqlite3.connect(PATH_TO_DB) as conn:
-            cursor = conn.cursor()
-            cursor.execute(f"SELECT COUNT(*) FROM {self.table_name} WHERE email = ?", (self.email,))
-            return cursor.fetchone()[0] > 0
+        result = fetchone(f"SELECT COUNT(*) FROM {self.table_name} WHERE email = ?", (self.email,))
+        return result[0] > 0
     
     def delete_from_db(self):
         """
         Delete the person from the database.
         """
-        import sqlite3
-        with sqlite3.connect(PATH_TO_DB) as conn:
-            cursor = conn.cursor()
-            cursor.execute(f"DELETE FROM {self.table_name} WHERE email = ?", (self.email,))
-            conn.commit()
+        from classes.search_index import refresh_rows
+        ids = [row[0] for row in fetchall(f"SELECT id FROM {self.table_name} WHERE email = ?", (self.email,))]
+        execute(f"DELETE FROM {self.table_name} WHERE email = ?", (self.email,))
+        refresh_rows(self.table_name, ids)
     
     def add_to_database(self):
         """Generic database insertion for any Person subclass"""
         try:
-            with sqlite3.connect(PATH_TO_DB) as conn:
-                cursor = conn.cursor()
-                columns, values = self.get_db_values()
-                placeholders = ','.join(['?' for _ in values])
-                query = f"INSERT INTO {self.table_name} ({columns}) VALUES ({placeholders})"
-                cursor.execute(query, values)
-                return True
+            columns, values = self.get_db_values()
+            placeholders = ','.join(['?' for _ in values])
+            query = f"INSERT INTO {self.table_name} ({columns}) VALUES ({placeholders})"
+            cursor = execute(query, values)
+            from classes.search_index import refresh_rows
+            refresh_rows(self.table_name, [cursor.lastrowid])
+            return True
         except sqlite3.Error:
             return False
@@ -0,0 +1,178 @@
+"""
+Immutable record types for the rows of every table, and the sqlite3 row
+factories that build them.
+
+Records are NamedTuples: they have no per-instance __dict__ (a record takes
+the memory of a plain tuple, a fraction of a dict with the same keys), cannot
+be changed after they are made, and still unpack and compare like the tuples
+the code used to pass around. Foreign keys are kept as IDs; the joined rows
+of the dashboard carry the display names instead.
+
+Display strings repeat across many rows (the same doctor, specialization or
+date on thousands of consultations), so the fields named in INTERNED_FIELDS
+are interned as rows are built and every copy shares one string. Queries
+build records directly with a row factory, e.g.
+
+    fetchall("SELECT id, name FROM specialization", row_factory=row_factory(SpecializationRecord))
+"""
+import sys
+from typing import NamedTuple, Optional
+
+
+class UserRecord(NamedTuple):
+    """A row of the users table (password is the stored hash, see services.passwords)."""
+    id: int
+    email: str
+    password: str
+    is_admin: int
+
+
+class SpecializationRecord(NamedTuple):
+    """A row of the specialization table."""
+    id: int
+    name: str
+
+
+class DoctorRecord(NamedTuple):
+    """A row of the doctor table."""
+    id: int
+    name: str
+    email: str
+    specialization_id: int
+
+
+class PatientRecord(NamedTuple):
+    """A row of the patient table."""
+    id: int
+    name: str
+    address: Optional[str]
+    birth_date: Optional[str]
+    phone: Optional[str]
+    email: str
+
+
+class ConsultationRecord(NamedTuple):
+    """A row of the consultations table (patient and doctor are IDs)."""
+    id: int
+    patient: int
+    doctor: int
+    date: str
+    time: str
+    series_id: Optional[int]
+
+
+class ConsultationSeriesRecord(NamedTuple):
+    """A row of the consultation_series table (see classes.series)."""
+    id: int
+    patient: int
+    doctor: int
+    start_date: str
+    time: str
+    interval: int
+    unit: str
+    until: Optional[str]
+    count: Optional[int]
+
+
+class DoctorScheduleRecord(NamedTuple):
+    """A row of the doctor_schedule table (keyed by doctor, weekday and start_time): working hours on a weekday."""
+    doctor: int
+    weekday: int
+    start_time: str
+    end_time: str
+
+
+class UpcomingConsultation(NamedTuple):
+    """A row of the dashboard: a consultation joined with the names of its doctor, specialization and patient."""
+    id: int
+    doctor: str
+    specialization: str
+    patient: str
+    start: str  # "YYYY-MM-DD HH:MM"
+
+
+class PersonEntry(NamedTuple):
+    """A doctor or patient as shown by the typeahead pickers."""
+    id: int
+    name: str
+    email: str
+
+
+# Record type of each table, with the fields in the column order of services.storage.TABLE_COLUMNS
+RECORDS = {
+    "users": UserRecord,
+    "specialization": SpecializationRecord,
+    "doctor": DoctorRecord,
+    "patient": PatientRecord,
+    "consultations": ConsultationRecord,
+    "consultation_series": ConsultationSeriesRecord,
+    "doctor_schedule": DoctorScheduleRecord,
+}
+
+# Fields holding strings shared by many rows; only string values are interned
+INTERNED_FIELDS = frozenset({"name", "doctor", "specialization", "patient", "date", "time", "start_date", "unit"})
+
+_interned_positions = {}
+
+
+def interned_positions(record) -> tuple:
+    """Return the positions of the fields of a record type whose strings are interned."""
+    positions = _interned_positions.get(record)
+    if positions is None:
+        positions = tuple(i for i, field in enumerate(record._fields) if field in INTERNED_FIELDS)
+        _interned_positions[record] = positions
+    return positions
+
+
+def make(record, values):
+    """
+    Build a record from a sequence of values in field order, interning its display strings.
+
+    Args:
+        record (type): A record type of this module
+        values (iterable): One value per field
+
+    Returns:
+        The new record
+    """
+    values = list(values)
+    intern = sys.intern
+    for i in interned_positions(record):
+        if type(values[i]) is str:
+            values[i] = intern(values[i])
+    return record._make(values)
+
+
+def from_dict(record, values: dict):
+    """Build a record from a column -> value dict; missing columns are None."""
+    return make(record, [values.get(field) for field in record._fields])
+
+
+def row_factory(record):
+    """
+    Get a sqlite3 row factory building records of a type straight from the fetched rows.
+
+    The query must select the record's fields in order. Set it on a cursor
+    (``cursor.row_factory = row_factory(DoctorRecord)``) or pass it to
+    database.connection.fetchone/fetchall.
+
+    Args:
+        record (type): A record type of this module
+
+    Returns:
+        callable: ``factory(cursor, row)`` returning a record
+    """
+    positions = interned_positions(record)
+    new = tuple.__new__
+    if not positions:
+        return lambda cursor, row: new(record, row)
+
+    intern = sys.intern
+
+    def factory(cursor, row):
+        values = list(row)
+        for i in positions:
+            if type(values[i]) is str:
+                values[i] = intern(values[i])
+        return new(record, values)
+    return factory
@@ -0,0 +1,109 @@
+"""
+Batch scheduling: book many consultations at once.
+
+schedule_batch takes any number of (patient, doctor, start) requests. It
+resolves the patients and doctors with one query per chunk of keys, checks
+every request against the stored consultations with a single query (the
+batch in a temporary table joined against consultations) and against the
+other requests of the batch, and writes the accepted ones in the same
+write-locked transaction (see ConsultationService.book_many in the service
+layer). It
+returns one report entry per request saying whether it was booked and, if
+not, why.
+
+The admin menu's "Import Consultations" action feeds it from a CSV file (see
+read_requests and write_report).
+"""
+import csv
+
+from services.consultations import ACCEPTED, REJECTED, split_start
+
+
+def resolve_ids(table: str, keys, by_name=False) -> dict:
+    """
+    Map patient or doctor references to their IDs in bulk.
+
+    See services.records.RecordService.resolve.
+
+    Args:
+        table (str): "patient" or "doctor"
+        keys (iterable): The references to resolve (IDs or emails)
+        by_name (bool): Also match references against the name column
+
+    Returns:
+        dict: reference -> ID, for every reference that was found
+    """
+    from services import get_services
+    return get_services().records(table).resolve(keys, by_name=by_name)
+
+
+def schedule_batch(requests, series_id=None) -> list:
+    """
+    Book a batch of consultations in one transaction.
+
+    See services.consultations.ConsultationService.book_many.
+
+    Args:
+        requests (iterable): (patient, doctor, start) tuples, where patient and
+            doctor are IDs or emails (doctors may also be given by name) and
+            start is accepted by split_start
+        series_id (int): Series the booked consultations belong to (see classes.series)
+
+    Returns:
+        list: One dict per request, in order, with "row", "status" (ACCEPTED
+            or REJECTED), "reason" and "id"
+
+    Example:
+        >>> schedule_batch([("ana@email.com", "Dr. Carlos Oliveira", "2027-01-04 09:00")])
+        [{'row': 0, 'status': 'accepted', 'reason': None, 'id': 33}]
+    """
+    from services import get_services
+    return get_services().consultations.book_many(requests, series_id=series_id)
+
+
+def read_requests(path: str) -> list:
+    """
+    Read scheduling requests from a CSV file.
+
+    The file needs a header row with "patient" and "doctor" columns and either
+    a "start" column ("YYYY-MM-DD HH:MM") or "date" and "time" columns.
+
+    Args:
+        path (str): Path to the CSV file
+
+    Returns:
+        list: (patient, doctor, start) tuples for schedule_batch
+
+    Raises:
+        ValueError: If the header lacks the required columns
+    """
+    with open(path, newline="", encoding="utf-8-sig") as file:
+        reader = csv.DictReader(file)
+        columns = {name.strip().lower(): name for name in reader.fieldnames or ()}
+        if not {"patient", "doctor"} <= columns.keys() or not (
+                "start" in columns or {"date", "time"} <= columns.keys()):
+            raise ValueError("The file needs patient, doctor and start (or date and time) columns")
+        requests = []
+        for line in reader:
+            if "start" in columns:
+                start = line[columns["start"]] or ""
+            else:
+                start = f"{line[columns['date']] or ''} {line[columns['time']] or ''}"
+            requests.append((line[columns["patient"]], line[columns["doctor"]], start))
+        return requests
+
+
+def write_report(path: str, requests: list, report: list):
+    """
+    Write the outcome of schedule_batch next to the requests it was given, as CSV.
+
+    Args:
+        path (str): Path of the CSV file to write
+        requests (list): The requests passed to schedule_batch
+        report (list): The report schedule_batch returned
+    """
+    with open(path, "w", newline="", encoding="utf-8") as file:
+        writer = csv.writer(file)
+        writer.writerow(["row", "patient", "doctor", "start", "status", "consultation_id", "reason"])
+        for (patient, doctor, start), entry in zip(requests, report):
+            writer.writerow([entry["row"], patient, doctor, start, entry["status"], entry["id"] or "", entry["reason"] or ""])
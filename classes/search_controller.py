@@ -0,0 +1,124 @@
+"""
+Debounced, cancellable search-as-you-type.
+
+Binding a query straight to ``<KeyRelease>`` runs one query per key press,
+and with a background executor the results can come back out of order. A
+SearchController waits until the user pauses typing, runs only the newest
+search, and drops every result that belongs to older input.
+"""
+import math
+import time
+from collections import deque
+from constants import SEARCH_DEBOUNCE_MS
+
+
+class SearchController:
+    """
+    Runs a search a short while after the user stops typing and applies only the newest result.
+
+    Every call to `schedule` starts a new input generation. The search runs
+    `debounce_ms` after the last call (on the executor's worker thread if one is
+    given, superseding any search still in flight) and its result is passed to
+    `apply` on the Tk thread only if no newer input arrived meanwhile.
+
+    Args:
+        widget (tk.Misc): Widget used to schedule the debounce timer
+        search (callable): `search(term)` returning the results; runs on the worker thread with an executor
+        apply (callable): `apply(results)` showing the results; always runs on the Tk thread
+        executor (DatabaseExecutor): Optional executor to run searches off the Tk thread
+        debounce_ms (int): Quiet time after the last key press before searching
+        history (int): Number of recent latencies kept for `stats`
+        latency (classes.metrics histogram child): Optional histogram every latency is also observed in
+    """
+
+    def __init__(self, widget, search, apply, executor=None, debounce_ms=SEARCH_DEBOUNCE_MS, history=100,
+                 latency=None):
+        self.widget = widget
+        self.search = search
+        self.apply = apply
+        self.executor = executor
+        self.debounce_ms = debounce_ms
+        self.latencies = deque(maxlen=history)  # Seconds from running a search to applying its result
+        self.latency = latency
+        self._pending = None   # Debounce timer of the next search
+        self._generation = 0   # Bumped on every input; results of older generations are dropped
+        self._term = None      # Newest term searched or scheduled
+
+    def bind(self, entry, sequence="<KeyRelease>"):
+        """
+        Search with the contents of an entry whenever `sequence` fires on it.
+
+        The controller is cancelled when the entry is destroyed, so no result is
+        applied to a closed window.
+        """
+        entry.bind(sequence, lambda event: self.schedule(entry.get()))
+        entry.bind("<Destroy>", lambda event: self.cancel(), add="+")
+
+    def schedule(self, term):
+        """Search for `term` once no new input arrives for `debounce_ms`."""
+        if term == self._term:
+            return  # e.g. arrow keys or Shift: the text did not change
+        self._term = term
+        self._generation += 1
+        if self._pending is not None:
+            self.widget.after_cancel(self._pending)
+        self._pending = self.widget.after(self.debounce_ms, self._run, term, self._generation)
+
+    def run_now(self, term):
+        """Search for `term` immediately (e.g. on Enter or to fill a list when a window opens)."""
+        self._term = term
+        self._generation += 1
+        if self._pending is not None:
+            self.widget.after_cancel(self._pending)
+            self._pending = None
+        self._run(term, self._generation)
+
+    def cancel(self):
+        """Cancel the pending search and drop the result of the one in flight."""
+        self._term = None
+        self._generation += 1
+        if self._pending is not None:
+            self.widget.after_cancel(self._pending)
+            self._pending = None
+        if self.executor is not None:
+            self.executor.cancel(self)
+
+    def stats(self) -> dict:
+        """
+        Summarize the latency of recent searches.
+
+        Returns:
+            dict: count, mean_ms, p95_ms and max_ms over the last `history` searches
+        """
+        if not self.latencies:
+            return {"count": 0, "mean_ms": 0.0, "p95_ms": 0.0, "max_ms": 0.0}
+        latencies = sorted(self.latencies)
+        return {
+            "count": len(latencies),
+            "mean_ms": sum(latencies) / len(latencies) * 1000,
+            "p95_ms": latencies[math.ceil(0.95 * len(latencies)) - 1] * 1000,
+            "max_ms": latencies[-1] * 1000,
+        }
+
+    def _run(self, term, generation):
+        self._pending = None
+        if generation != self._generation:
+            return
+        started = time.perf_counter()
+        if self.executor is None:
+            self._deliver(self.search(term), generation, started)
+        else:
+            self.executor.submit(
+                self.search, term,
+                callback=lambda results: self._deliver(results, generation, started),
+                key=self
+            )
+
+    def _deliver(self, results, generation, started):
+        if generation != self._generation:
+            return  # The user typed something else while this search ran
+        self.apply(results)
+        elapsed = time.perf_counter() - started
+        self.latencies.append(elapsed)
+        if self.latency is not None:
+            self.latency.observe(elapsed)
@@ -0,0 +1,288 @@
+"""
+In-memory typeahead index for the doctor and patient pickers.
+
+The consultation dialogs used to run ``LOWER(name) LIKE '%term%'`` on every
+key press, a full table scan that no index can help with. Instead, the names
+and emails of each table are loaded once into a SearchIndex and kept current
+by the code that inserts, edits and deletes doctors and patients (see
+refresh_rows), so each key press is answered from memory.
+"""
+import bisect
+import sys
+import threading
+import unicodedata
+
+from classes.records import PersonEntry, row_factory
+
+
+def fold(text) -> str:
+    """
+    Normalize text for matching: case-folded and without accents ("João" -> "joao").
+
+    Args:
+        text (str): Text to normalize (None is treated as empty)
+
+    Returns:
+        str: The folded text
+    """
+    if not text:
+        return ""
+    if text.isascii():
+        return text.lower()
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+
+
+class SearchIndex:
+    """
+    In-memory typeahead index over the names and emails of one table (doctors or patients).
+
+    Results are ranked in three tiers:
+    1. The full name starts with the search term
+    2. A word of the name, or the email, starts with the term
+    3. Every word of the term appears inside some word of the name
+
+    Prefix tiers are answered with binary search over sorted keys. Substring
+    matches go through the distinct name words (a few thousand even for 100k+
+    people, since names repeat), so a search takes about a millisecond.
+    Every search stops once `limit` results are found, which also caps what is
+    pushed into a Listbox. Names and name words are interned, so the many
+    people sharing a first or last name share its strings.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}   # id -> PersonEntry
+        self._folded = {}    # id -> folded name
+        self._by_email = {}  # folded email -> set of ids
+        self._names = []     # sorted (folded full name, id)
+        self._tokens = []    # sorted (folded word or email, id)
+        self._words = {}     # folded name word -> set of ids
+        self._word_haystack = None  # Distinct words joined by newlines, rebuilt lazily when words appear/disappear
+        self._word_starts = []
+        self._word_list = []
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _index_entry(self, id, name, email):
+        """Add an entry to the id, email and word maps and return its (name key, word/email keys)."""
+        intern = sys.intern
+        folded_name = intern(fold(name))
+        folded_email = fold(email)
+        self._entries[id] = PersonEntry(id, intern(name) if name else name, email)
+        self._folded[id] = folded_name
+        self._by_email.setdefault(folded_email, set()).add(id)
+        words = {intern(word) for word in folded_name.split()}
+        for word in words:
+            ids = self._words.get(word)
+            if ids is None:
+                self._words[word] = ids = set()
+                self._word_haystack = None
+            ids.add(id)
+        tokens = [(word, id) for word in words]
+        if folded_email:
+            tokens.append((folded_email, id))
+        return (folded_name, id), tokens
+
+    def load(self, rows):
+        """
+        Replace the whole index with new rows.
+
+        Args:
+            rows (iterable): (id, name, email) tuples
+        """
+        with self._lock:
+            self._entries, self._folded, self._by_email, self._words = {}, {}, {}, {}
+            names, tokens = [], []
+            for id, name, email in rows:
+                name_key, token_keys = self._index_entry(id, name, email)
+                names.append(name_key)
+                tokens.extend(token_keys)
+            names.sort()
+            tokens.sort()
+            self._names, self._tokens = names, tokens
+            self._word_haystack = None
+
+    def add(self, id, name, email):
+        """Add an entry, replacing the entry with the same id if there is one."""
+        with self._lock:
+            if id in self._entries:
+                self._remove(id)
+            name_key, token_keys = self._index_entry(id, name, email)
+            bisect.insort(self._names, name_key)
+            for key in token_keys:
+                bisect.insort(self._tokens, key)
+
+    def remove(self, id):
+        """Remove the entry with the given id, if present."""
+        with self._lock:
+            if id in self._entries:
+                self._remove(id)
+
+    def ids_for_email(self, email) -> set:
+        """Return the ids of the entries with the given email."""
+        with self._lock:
+            return set(self._by_email.get(fold(email), ()))
+
+    def _remove(self, id):
+        _, name, email = self._entries.pop(id)
+        folded_name = self._folded.pop(id)
+        folded_email = fold(email)
+        ids = self._by_email.get(folded_email)
+        if ids is not None:
+            ids.discard(id)
+            if not ids:
+                del self._by_email[folded_email]
+
+        words = set(folded_name.split())
+        for word in words:
+            ids = self._words.get(word)
+            if ids is not None:
+                ids.discard(id)
+                if not ids:
+                    del self._words[word]
+                    self._word_haystack = None
+
+        keys_to_remove = [(self._names, (folded_name, id))] + [(self._tokens, (word, id)) for word in words]
+        if folded_email:
+            keys_to_remove.append((self._tokens, (folded_email, id)))
+        for keys, key in keys_to_remove:
+            index = bisect.bisect_left(keys, key)
+            if index < len(keys) and keys[index] == key:
+                del keys[index]
+
+    def _words_containing(self, term):
+        """Yield the distinct name words that contain `term`, in alphabetical order."""
+        if self._word_haystack is None:
+            self._word_list = sorted(self._words)
+            self._word_starts = []
+            position = 0
+            for word in self._word_list:
+                self._word_starts.append(position)
+                position += len(word) + 1
+            self._word_haystack = "\n".join(self._word_list)
+
+        haystack, starts, words = self._word_haystack, self._word_starts, self._word_list
+        position = haystack.find(term)
+        while position != -1:
+            line = bisect.bisect_right(starts, position) - 1
+            yield words[line]
+            # Continue with the next word so each word is reported once
+            next_word = starts[line + 1] if line + 1 < len(starts) else len(haystack)
+            position = haystack.find(term, next_word)
+
+    def search(self, term, limit=50) -> list:
+        """
+        Find the entries matching a search term, best matches first.
+
+        Args:
+            term (str): What the user typed
+            limit (int): Maximum number of results
+
+        Returns:
+            list: PersonEntry (id, name, email) tuples
+        """
+        term = fold(term).strip()
+        with self._lock:
+            found = {}  # id -> None, keeps insertion order as rank order
+
+            # Tier 1: full name starts with the term (for an empty term, everyone by name)
+            index = bisect.bisect_left(self._names, (term,))
+            while index < len(self._names) and len(found) < limit:
+                key, id = self._names[index]
+                if not key.startswith(term):
+                    break
+                found[id] = None
+                index += 1
+
+            # Tier 2: a word of the name or the email starts with the term
+            index = bisect.bisect_left(self._tokens, (term,))
+            while index < len(self._tokens) and len(found) < limit:
+                key, id = self._tokens[index]
+                if not key.startswith(term):
+                    break
+                found.setdefault(id, None)
+                index += 1
+
+            # Tier 3: every word of the term appears inside the name. The words containing
+            # the longest term (usually the most selective) are walked lazily, so the
+            # scan stops as soon as enough results are found.
+            terms = sorted(term.split(), key=len, reverse=True)
+            if terms and len(found) < limit:
+                others = terms[1:]
+                for word in self._words_containing(terms[0]):
+                    for id in self._words[word]:
+                        if id in found:
+                            continue
+                        folded_name = self._folded[id]
+                        if all(t in folded_name for t in others):
+                            found[id] = None
+                            if len(found) >= limit:
+                                break
+                    if len(found) >= limit:
+                        break
+
+            return [self._entries[id] for id in found]
+
+
+# Shared indexes, loaded on first use
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+# Tables that can be indexed, with the query loading them
+INDEXED_TABLES = {
+    "patient": "SELECT id, name, email FROM patient",
+    "doctor": "SELECT id, name, email FROM doctor",
+}
+
+
+def get_index(table: str) -> SearchIndex:
+    """
+    Get the shared search index of a table, loading it from the database on first use.
+
+    Args:
+        table (str): "patient" or "doctor"
+
+    Returns:
+        SearchIndex: The table's index
+    """
+    index = _indexes.get(table)
+    if index is None:
+        from database.connection import fetchall
+        with _indexes_lock:
+            index = _indexes.get(table)
+            if index is None:
+                index = SearchIndex()
+                index.load(fetchall(INDEXED_TABLES[table], row_factory=row_factory(PersonEntry)))
+                _indexes[table] = index
+    return index
+
+
+def refresh_rows(table: str, ids):
+    """
+    Bring a shared index up to date after rows of its table were inserted, edited or deleted.
+
+    Does nothing if the table is not indexed or its index was not loaded yet
+    (it will be read fresh on first use).
+
+    Args:
+        table (str): Name of the table that changed
+        ids (iterable): IDs of the rows that changed
+    """
+    index = _indexes.get(table)
+    if index is None:
+        return
+    from database.connection import fetchone
+    for id in ids:
+        row = fetchone(INDEXED_TABLES[table] + " WHERE id = ?", (id,), row_factory=row_factory(PersonEntry))
+        if row is None:
+            index.remove(id)
+        else:
+            index.add(*row)
+
+
+def reset_indexes():
+    """Drop every shared index so it is reloaded on next use (e.g. after switching databases)."""
+    with _indexes_lock:
+        _indexes.clear()
@@ -0,0 +1,270 @@
+"""
+Recurring consultation series for patients who need regular follow-ups.
+
+A series stores a recurrence rule (every N days or weeks, until a date and/or
+for K occurrences) in consultation_series. Its occurrences are expanded
+lazily from the rule and booked in one batch through
+classes.scheduling.schedule_batch, so each one is checked for conflicts and
+all are inserted in one transaction. Every consultation of the series
+carries its series_id, so changing or cancelling the occurrences from a given
+date on is a single UPDATE or DELETE.
+"""
+from datetime import date as Date, timedelta
+
+# Upper bound on the occurrences of one series, so a typo in the end date cannot book decades ahead
+MAX_OCCURRENCES = 520
+
+
+def _to_date(value):
+    """Accept a date or a YYYY-MM-DD string (None stays None)."""
+    if value is None or isinstance(value, Date):
+        return value
+    return Date.fromisoformat(str(value).strip())
+
+
+class RecurrenceRule:
+    """
+    Repeats every `interval` days or weeks from `start`, until `until` and/or for `count` occurrences.
+
+    Args:
+        start (date | str): Date of the first occurrence
+        interval (int): Number of units between occurrences
+        unit (str): "days" or "weeks"
+        until (date | str): Last date an occurrence may fall on (inclusive)
+        count (int): Number of occurrences
+
+    Raises:
+        ValueError: If the rule is invalid or has no end
+    """
+    UNITS = {"days": 1, "weeks": 7}
+
+    def __init__(self, start, interval=1, unit="weeks", until=None, count=None):
+        self.start = _to_date(start)
+        self.interval = int(interval)
+        self.unit = unit
+        self.until = _to_date(until)
+        self.count = None if count is None else int(count)
+        if self.interval < 1:
+            raise ValueError("The interval must be at least 1")
+        if self.unit not in self.UNITS:
+            raise ValueError(f"The unit must be one of: {', '.join(self.UNITS)}")
+        if self.until is None and self.count is None:
+            raise ValueError("A series needs an end date or a number of occurrences")
+        if self.count is not None and self.count < 1:
+            raise ValueError("The number of occurrences must be at least 1")
+        if self.until is not None and self.until < self.start:
+            raise ValueError("The end date is before the first occurrence")
+
+    def occurrences(self):
+        """
+        Yield the dates of the occurrences in order, computing each one only when asked for.
+
+        Yields:
+            date: The date of the next occurrence (at most MAX_OCCURRENCES in total)
+        """
+        step = timedelta(days=self.interval * self.UNITS[self.unit])
+        day = self.start
+        limit = MAX_OCCURRENCES if self.count is None else min(self.count, MAX_OCCURRENCES)
+        for _ in range(limit):
+            if self.until is not None and day > self.until:
+                return
+            yield day
+            day += step
+
+
+def create_series(patient, doctor, time: str, rule: RecurrenceRule):
+    """
+    Create a series and book all of its occurrences in one transaction.
+
+    Occurrences that clash with existing consultations are skipped and
+    reported; if none can be booked, the series is not created.
+
+    Args:
+        patient (int | str): Patient ID or email
+        doctor (int | str): Doctor ID, email or name
+        time (str): Time of every occurrence, as HH:MM
+        rule (RecurrenceRule): When the occurrences fall
+
+    Returns:
+        tuple: (series ID or None, report of schedule_batch with one entry per occurrence)
+
+    Raises:
+        ValueError: If the time is invalid or the patient or doctor does not exist
+    """
+    from classes.availability import slot_start
+    from classes.scheduling import ACCEPTED, resolve_ids, schedule_batch
+    from database.connection import transaction
+
+    slot_start(rule.start.isoformat(), time)  # Validates the time
+    patient_id = resolve_ids("patient", [patient]).get(patient)
+    doctor_id = resolve_ids("doctor", [doctor], by_name=True).get(doctor)
+    if patient_id is None:
+        raise ValueError(f"Unknown patient: {patient}")
+    if doctor_id is None:
+        raise ValueError(f"Unknown or ambiguous doctor: {doctor}")
+
+    with transaction(immediate=True) as cursor:
+        cursor.execute("""
+            INSERT INTO consultation_series (patient, doctor, start_date, time, interval, unit, until, count)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, (
+            patient_id, doctor_id, rule.start.isoformat(), time, rule.interval, rule.unit,
+            rule.until.isoformat() if rule.until else None, rule.count
+        ))
+        series_id = cursor.lastrowid
+        report = schedule_batch(
+            ((patient_id, doctor_id, f"{day.isoformat()} {time}") for day in rule.occurrences()),
+            series_id=series_id
+        )
+        if not any(entry["status"] == ACCEPTED for entry in report):
+            cursor.execute("DELETE FROM consultation_series WHERE id = ?", (series_id,))
+            series_id = None
+    return series_id, report
+
+
+def get_series_id(consultation_id):
+    """Return the ID of the series a consultation belongs to, or None."""
+    from database.connection import fetchone
+    row = fetchone("SELECT series_id FROM consultations WHERE id = ?", (consultation_id,))
+    return row[0] if row else None
+
+
+def update_series(series_id, from_date, time=None, doctor=None, edited=None) -> list:
+    """
+    Move the occurrences of a series from a date on to another time and/or doctor.
+
+    All of them are checked first, with the write lock held; if any would
+    clash with a consultation outside the series, nothing is changed.
+    Otherwise they are updated with a single UPDATE in the same immediate
+    transaction, which joins the caller's transaction if there is one.
+
+    Args:
+        series_id (int): ID of the series
+        from_date (date | str): First date affected (inclusive)
+        time (str): New time as HH:MM (None keeps each occurrence's time)
+        doctor (int): New doctor ID (None keeps each occurrence's doctor)
+        edited (tuple): (id, doctor, patient, date, time) of a consultation the caller moves in the same
+            transaction, e.g. the occurrence the user edited; it is checked against the occurrences' new
+            times and everything else, so the whole edit is checked before anything is written
+
+    Returns:
+        list: (date, "doctor" or "patient", consultation ID) for every clash; empty if the series was updated
+
+    Raises:
+        ValueError: If a date or time is not valid
+    """
+    from classes.availability import Availability, get_availability
+    from database.connection import transaction
+    from services import get_services
+
+    from_date = _to_date(from_date).isoformat()
+    with transaction(immediate=True) as cursor:  # Nobody else can book until the occurrences are moved
+        availability = get_availability()
+        cursor.execute(
+            "SELECT id, doctor, patient, date, time FROM consultations WHERE series_id = ? AND date >= ?",
+            (series_id, from_date)
+        )
+        rows = cursor.fetchall()
+        moved = [
+            (id, doctor or current_doctor, patient, date, time or current_time)
+            for id, current_doctor, patient, date, current_time in rows
+        ]
+        own = {row[0] for row in rows}
+        if edited is not None:
+            own.add(edited[0])
+        clashes = []
+        for id, new_doctor, patient, date, new_time in moved:
+            for kind, other in availability.conflicts(new_doctor, patient, date, new_time):
+                if other not in own:
+                    clashes.append((date, kind, other))
+        if edited is not None:
+            edited_id, edited_doctor, edited_patient, edited_date, edited_time = edited
+            for kind, other in availability.conflicts(edited_doctor, edited_patient, edited_date, edited_time):
+                if other not in own:
+                    clashes.append((edited_date, kind, other))
+            # Against the occurrences where they are going, not where they are now
+            planned = Availability(availability.duration)
+            planned.load(moved)
+            clashes.extend(
+                (edited_date, kind, other)
+                for kind, other in planned.conflicts(edited_doctor, edited_patient, edited_date, edited_time)
+            )
+        if not clashes:
+            # The stored consultations, in case the engine missed another workstation's booking
+            slots = [(new_doctor, patient, date, new_time) for _, new_doctor, patient, date, new_time in moved]
+            if edited is not None:
+                slots.append(edited[1:])
+            clashes = [
+                (slots[position][2], kind, other)
+                for position, kind, other in get_services().storage.conflicts(
+                    slots, ignore=own, duration=availability.duration
+                )
+            ]
+        if clashes:
+            return clashes
+
+        cursor.execute("""
+            UPDATE consultations SET doctor = COALESCE(?, doctor), time = COALESCE(?, time)
+            WHERE series_id = ? AND date >= ?
+            RETURNING id, doctor, patient, date, time
+        """, (doctor, time, series_id, from_date))
+        updated = cursor.fetchall()
+        cursor.execute(
+            "UPDATE consultation_series SET doctor = COALESCE(?, doctor), time = COALESCE(?, time) WHERE id = ?",
+            (doctor, time, series_id)
+        )
+    for row in updated:
+        availability.add(*row)
+    return []
+
+
+def refresh_series(series_id, from_date):
+    """
+    Bring the availability engine back in line with the stored occurrences of a series from a date on.
+
+    update_series updates the engine as soon as its UPDATE ran; call this when
+    the caller's transaction around it was rolled back.
+
+    Args:
+        series_id (int): ID of the series
+        from_date (date | str): First date affected (inclusive)
+    """
+    from classes.availability import refresh_consultations
+    from database.connection import fetchall
+    rows = fetchall(
+        "SELECT id FROM consultations WHERE series_id = ? AND date >= ?", (series_id, _to_date(from_date).isoformat())
+    )
+    refresh_consultations(row[0] for row in rows)
+
+
+def cancel_series(series_id, from_date) -> int:
+    """
+    Cancel the occurrences of a series from a date on with a single DELETE.
+
+    The series now ends the day before `from_date`.
+
+    Args:
+        series_id (int): ID of the series
+        from_date (date | str): First date cancelled (inclusive)
+
+    Returns:
+        int: Number of consultations cancelled
+    """
+    from classes.availability import get_availability
+    from database.connection import transaction
+
+    from_date = _to_date(from_date)
+    with transaction() as cursor:
+        cursor.execute(
+            "DELETE FROM consultations WHERE series_id = ? AND date >= ? RETURNING id",
+            (series_id, from_date.isoformat())
+        )
+        cancelled = [row[0] for row in cursor.fetchall()]
+        cursor.execute(
+            "UPDATE consultation_series SET until = ? WHERE id = ?",
+            ((from_date - timedelta(days=1)).isoformat(), series_id)
+        )
+    availability = get_availability()
+    for id in cancelled:
+        availability.remove(id)
+    return len(cancelled)
@@ -1,84 +1,363 @@
+import logging
 import tkinter as tk
 from tkinter import ttk
-import sqlite3
-from constants import PATH_TO_DB
-from datetime import datetime
+from constants import CONSULTATIONS_COLUMNS
 
-class ConsultationTable:
+logger = logging.getLogger(__name__)
+
+
+class DataGrid:
     """
-    The `ConsultationTable` class is responsible for creating and managing a table-like UI component to display a list of consultations. It uses the Tkinter library to create the GUI elements and the SQLite database to fetch the consultation data.
+    The `DataGrid` class is a reusable, virtualized table built on a ttk.Treeview. Instead of inserting every row of a
+    query at once, it only materializes the pages of rows in and near the viewport and fetches more as the user scrolls.
 
     The class has the following main responsibilities:
-    - Create a LabelFrame to hold the table UI components
-    - Create a Treeview widget to display the consultation data
-    - Configure the column headings and widths of the Treeview
-    - Add a vertical scrollbar to the Treeview
-    - Load the consultation data from the SQLite database and populate the Treeview
+    - Create a Frame holding the Treeview and its scrollbars
+    - Fetch rows one page at a time from a `fetch_page(after, limit)` callable
+    - Load the next (or previous) page when the view gets close to the bottom (or top) of the loaded rows
+    - Drop pages that scrolled far away so at most `max_pages` pages live in Tk at any time
+    - Keep the rows it shows so callers get the original values of the selected rows back
+    - Refresh in place after edits, touching only the rows that were added, changed or removed
+    - When given a DatabaseExecutor, run every fetch on its worker thread and show a loading indicator meanwhile
+
+    `fetch_page(after, limit)` receives the last row of the previous page (None for the first page) and must return
+    up to `limit` rows in a stable order. The first value of every row is its unique ID, used as the Treeview item ID.
     """
-    def __init__(self, parent):
+    # Fraction of the loaded rows left above/below the viewport that triggers fetching the next page
+    PREFETCH_MARGIN = 0.15
+
+    def __init__(self, parent, columns, fetch_page, page_size=100, max_pages=4, column_width=None, executor=None):
         self.parent = parent
-        # Create LabelFrame
+        self.columns = columns
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self.executor = executor
+        self._fetch_page = fetch_page
+
         self.frame = ttk.Frame(self.parent)
-        self.frame.grid(row=0, column=0, sticky="nsew")
-        
         self.frame.columnconfigure(0, weight=1)
         self.frame.rowconfigure(0, weight=1)
 
         # Create treeview
-        self.table = ttk.Treeview(self.frame, columns=("Doctor", "Specialization", "Patient", "Date and Time"), show="headings")
-        self.table.heading("Doctor", text="Doctor")
-        self.table.heading("Specialization", text="Specialization")
-        self.table.heading("Patient", text="Patient")
-        self.table.heading("Date and Time", text="Date and Time")
-        
+        self.tree = ttk.Treeview(self.frame, columns=columns, show="headings")
+        for col in columns:
+            self.tree.heading(col, text=col)
+            if column_width:
+                self.tree.column(col, width=column_width)
+
         # Scrollbars for the table
-        scrollbar_y = ttk.Scrollbar(
-            self.frame, 
-            orient="vertical", 
-            command=self.table.yview
-            )
-        scrollbar_x = ttk.Scrollbar(
-            self.frame, 
-            orient="horizontal", 
-            command=self.table.xview
-            )
-        self.table.configure(yscroll=scrollbar_y.set, xscroll=scrollbar_x.set)
+        self.scrollbar_y = ttk.Scrollbar(self.frame, orient="vertical", command=self.tree.yview)
+        self.scrollbar_x = ttk.Scrollbar(self.frame, orient="horizontal", command=self.tree.xview)
+        self.tree.configure(yscrollcommand=self._on_yscroll, xscrollcommand=self.scrollbar_x.set)
 
         # Layout for the table and scrollbars
-        self.table.grid(row=0, column=0, sticky="nsew")
-        scrollbar_y.grid(row=0, column=1, sticky="ns")
-        scrollbar_x.grid(row=1, column=0, sticky="ew")
-        
-        # Load data
-        self.load_appointments()
-
-    
-    def load_appointments(self):
-        try:
-            with sqlite3.connect(PATH_TO_DB) as conn:
-                cursor = conn.cursor()
-                # This query fetches all consultations sorted by date and time
-                query = """
-                    SELECT c.id, d.name, s.name, p.name, c.date || ' ' || c.time
-                    FROM consultations c
-                    JOIN doctor d ON c.id = d.id
-                    JOIN specialization s ON d.specialization_id = s.id
-                    JOIN patient p ON c.id = p.id
-                    ORDER BY c.date, c.time
-                """
-                #print("Executing query:", query)
-                cursor.execute(query)
-                rows = cursor.fetchall()
-                #print("Retrieved rows:", rows)
-                
-                # Clear existing items
-                for item in self.tree.get_children():
-                    self.table.delete(item)
-                    
-                # Insert new data
-                for row in rows:
-                    self.table.insert('', 'end', values=row)
-                    #print("Inserted row:", row)
-                    
-        except sqlite3.Error as e:
-            print("Database error:", e)
\ No newline at end of file
+        self.tree.grid(row=0, column=0, sticky="nsew")
+        self.scrollbar_y.grid(row=0, column=1, sticky="ns")
+        self.scrollbar_x.grid(row=1, column=0, sticky="ew")
+
+        # Shown over the table while a page is being fetched in the background
+        self.loading_label = ttk.Label(self.frame, text="Loading...")
+
+        self._rows = {}        # Item ID -> row, for every materialized row
+        self._pages = []       # Item IDs of each materialized page, top to bottom
+        self._cursors = [None]  # _cursors[k] is the row page k starts after
+        self._first_page = 0   # Index of the first materialized page
+        self._exhausted = False  # True once the last page of the source is materialized
+        self._pending = None   # Scheduled page load, so scroll events do not pile them up
+        self._loading = False  # True while a page is being fetched or inserted; no other page load starts meanwhile
+        self._generation = 0   # Bumped on reload so results fetched for older contents are dropped
+        self._destroyed = False  # True once the window holding the grid is closed
+
+        self.frame.bind("<Destroy>", self._on_destroy)
+
+    def grid(self, **kwargs):
+        """Place the grid's frame in its parent using the grid geometry manager."""
+        self.frame.grid(**kwargs)
+
+    def _on_destroy(self, event):
+        """Drop the fetch in flight and the scheduled page load once the grid's window is closed."""
+        if event.widget is not self.frame:
+            return
+        self._destroyed = True
+        if self._pending is not None:
+            self.tree.after_cancel(self._pending)
+            self._pending = None
+        if self.executor is not None:
+            self.executor.cancel(self)
+
+    def set_source(self, fetch_page, first_page=None):
+        """
+        Replace the function rows are fetched from and reload from the top.
+
+        Args:
+            fetch_page (callable): `fetch_page(after, limit)` returning a list of rows
+            first_page (list): Rows of `fetch_page(None, page_size)` if the caller already fetched them
+        """
+        self._fetch_page = fetch_page
+        self.reload(first_page)
+
+    def reload(self, first_page=None, done=None):
+        """
+        Discard every loaded row and load the first page again.
+
+        Args:
+            first_page (list): Rows of the first page if already fetched; otherwise they are fetched
+            done (callable): Called without arguments once the rows are shown (not if the load fails)
+        """
+        if self._destroyed:
+            return
+        if self._pending is not None:
+            self.tree.after_cancel(self._pending)
+            self._pending = None
+        self._generation += 1
+        self.tree.delete(*self.tree.get_children())
+        self._rows.clear()
+        self._pages = []
+        self._cursors = [None]
+        self._first_page = 0
+        self._exhausted = False
+        if first_page is not None:
+            self._apply_append(first_page, 0)
+            if done is not None:
+                done()
+        else:
+            self._request(None, self.page_size, self._apply_append, 0, done=done)
+
+    def refresh(self, done=None):
+        """
+        Re-read the loaded rows from the source and apply only the differences.
+
+        The pages currently materialized are fetched again in one query and
+        reconciled against the tree by row ID: new rows are inserted, changed
+        rows updated, missing rows removed and moved rows repositioned. Rows
+        that did not change are not touched, so the selection and scroll
+        position survive. If nothing is loaded yet, the first page is loaded.
+
+        Args:
+            done (callable): Called without arguments once the tree is up to date (not if the fetch fails)
+        """
+        if self._destroyed:
+            return
+        if not self._pages:
+            self.reload(done=done)
+            return
+        requested = len(self._pages) * self.page_size
+        self._request(self._cursors[self._first_page], requested, self._reconcile, requested, done=done)
+
+    def selection(self):
+        """Return the item IDs of the selected rows."""
+        return self.tree.selection()
+
+    def selected_rows(self):
+        """
+        Get the selected rows with the values the source returned.
+
+        Returns:
+            list: List of row tuples, in display order
+        """
+        return [self._rows[iid] for iid in self.tree.selection() if iid in self._rows]
+
+    def _request(self, after, limit, apply, *apply_args, done=None):
+        """
+        Fetch rows and pass them to `apply(rows, *apply_args)`, then call `done()` if given.
+
+        With an executor the fetch runs on its worker thread and `apply` runs on
+        the Tk thread when the rows arrive; a newer request from this grid
+        supersedes an older one still in flight.
+        """
+        self._loading = True
+        generation = self._generation
+        if self.executor is None:
+            try:
+                apply(self._fetch_page(after, limit), *apply_args)
+            finally:
+                self._loading = False
+            if done is not None:
+                done()
+            return
+
+        def deliver(rows):
+            self._loading = False
+            if self._destroyed:
+                return
+            self.loading_label.place_forget()
+            if generation == self._generation:
+                apply(rows, *apply_args)
+                if done is not None:
+                    done()
+
+        def failed(error):
+            self._loading = False
+            if not self._destroyed:
+                self.loading_label.place_forget()
+            logger.error("Failed to load a page: %s", error, exc_info=error)
+
+        self.loading_label.place(relx=0.5, rely=0.5, anchor="center")
+        self.executor.submit(self._fetch_page, after, limit, callback=deliver, error_callback=failed, key=self)
+
+    def _on_yscroll(self, first, last):
+        """Update the scrollbar and schedule loading a page when the view nears either end of the loaded rows."""
+        self.scrollbar_y.set(first, last)
+        if self._pending is not None or self._loading:
+            return
+        first, last = float(first), float(last)
+        if last >= 1 - self.PREFETCH_MARGIN and not self._exhausted:
+            self._pending = self.tree.after_idle(self._load_pending, self._append_page)
+        elif first <= self.PREFETCH_MARGIN and self._first_page > 0:
+            self._pending = self.tree.after_idle(self._load_pending, self._prepend_page)
+
+    def _load_pending(self, load):
+        self._pending = None
+        if not self._loading:
+            load()
+
+    def _top_item(self):
+        """Return the ID of the item at the top of the viewport, used to keep the view still while pages change."""
+        children = self.tree.get_children()
+        if not children:
+            return None
+        index = int(float(self.tree.yview()[0]) * len(children))
+        return children[min(index, len(children) - 1)]
+
+    def _restore_top_item(self, item):
+        """Scroll so that `item` is back at the top of the viewport."""
+        if item is None or not self.tree.exists(item):
+            return
+        children = self.tree.get_children()
+        self.tree.yview_moveto(self.tree.index(item) / len(children))
+
+    def _insert_rows(self, rows, index):
+        """Insert rows at a position, skipping rows already shown, and return the IDs inserted."""
+        inserted = []
+        for row in rows:
+            iid = str(row[0])
+            if iid in self._rows:
+                continue  # The source changed between fetches and the row is already on another page
+            self.tree.insert('', index, iid=iid, values=row)
+            self._rows[iid] = row
+            inserted.append(iid)
+            if index != 'end':
+                index += 1
+        return inserted
+
+    def _drop_page(self, position):
+        """Remove the first (position=0) or last (position=-1) materialized page from the tree."""
+        page = self._pages.pop(position)
+        self.tree.delete(*page)
+        for iid in page:
+            del self._rows[iid]
+
+    def _append_page(self):
+        """Fetch the page below the last materialized one."""
+        page_index = self._first_page + len(self._pages)
+        self._request(self._cursors[page_index], self.page_size, self._apply_append, page_index)
+
+    def _apply_append(self, rows, page_index):
+        """Add a fetched page at the bottom, dropping the top page if too many are loaded."""
+        if page_index != self._first_page + len(self._pages):
+            return  # The loaded pages changed while this one was being fetched
+        if len(rows) < self.page_size:
+            self._exhausted = True
+        if not rows:
+            return
+        if len(self._cursors) == page_index + 1:
+            self._cursors.append(rows[-1])
+
+        top = self._top_item()
+        self._pages.append(self._insert_rows(rows, 'end'))
+        if len(self._pages) > self.max_pages:
+            self._drop_page(0)
+            self._first_page += 1
+        self._restore_top_item(top)
+
+    def _prepend_page(self):
+        """Fetch the page above the first materialized one."""
+        page_index = self._first_page - 1
+        if page_index < 0:
+            return
+        self._request(self._cursors[page_index], self.page_size, self._apply_prepend, page_index)
+
+    def _apply_prepend(self, rows, page_index):
+        """Add a fetched page at the top, dropping the bottom page if too many are loaded."""
+        if page_index != self._first_page - 1:
+            return  # The loaded pages changed while this one was being fetched
+
+        top = self._top_item()
+        self._pages.insert(0, self._insert_rows(rows, 0))
+        self._first_page = page_index
+        if len(self._pages) > self.max_pages:
+            self._drop_page(-1)
+            self._exhausted = False
+        self._restore_top_item(top)
+
+    def _reconcile(self, rows, requested):
+        """Apply the re-fetched rows of the materialized range to the tree (see refresh)."""
+        top = self._top_item()
+        top_fraction = float(self.tree.yview()[0])
+
+        new_ids = [str(row[0]) for row in rows]
+        new_rows = dict(zip(new_ids, rows))
+
+        # Remove rows that are gone
+        removed = [iid for iid in self._rows if iid not in new_rows]
+        if removed:
+            self.tree.delete(*removed)
+            for iid in removed:
+                del self._rows[iid]
+
+        # Insert, update and reorder by walking the new order once
+        current = list(self.tree.get_children())
+        for position, iid in enumerate(new_ids):
+            row = new_rows[iid]
+            if iid in self._rows:
+                if self._rows[iid] != row:
+                    self.tree.item(iid, values=row)
+                    self._rows[iid] = row
+                if position < len(current) and current[position] == iid:
+                    continue
+                self.tree.move(iid, '', position)
+                current.remove(iid)
+            else:
+                self.tree.insert('', position, iid=iid, values=row)
+                self._rows[iid] = row
+            current.insert(position, iid)
+
+        # Rebuild the page bookkeeping for the refreshed rows
+        self._pages = [new_ids[i:i + self.page_size] for i in range(0, len(new_ids), self.page_size)] or [[]]
+        del self._cursors[self._first_page + 1:]
+        for page in self._pages[:-1]:
+            self._cursors.append(new_rows[page[-1]])
+        self._exhausted = len(rows) < requested
+        if not self._exhausted:
+            self._cursors.append(rows[-1])
+
+        if top is not None and self.tree.exists(top):
+            self._restore_top_item(top)
+        else:
+            self.tree.yview_moveto(top_fraction)
+
+
+class ConsultationTable(DataGrid):
+    """
+    The `ConsultationTable` class is the dashboard's virtualized list of upcoming consultations, sorted by date and time.
+    Pages are fetched with keyset pagination on (date, time, id), so every page is a short range scan over the
+    upcoming_consultations read model no matter how far the user has scrolled (see ConsultationService.upcoming).
+    """
+
+    def __init__(self, parent, **kwargs):
+        super().__init__(parent, CONSULTATIONS_COLUMNS, self.fetch_page, **kwargs)
+
+    @staticmethod
+    def fetch_page(after, limit):
+        """
+        Fetch a page of upcoming consultations.
+
+        Args:
+            after (tuple): Last row of the previous page, or None for the first page
+            limit (int): Maximum number of rows to return
+
+        Returns:
+            list: Rows of (id, doctor, specialization, patient, "date time")
+        """
+        from services import get_services
+        return get_services().consultations.upcoming(after, limit)
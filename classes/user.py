@@ -2,7 +2,9 @@ class User:
     """
     User class that manages system authentication and access control.
     Handles user credentials and login functionality.
+    Read-only and slotted, like services.auth.Session.
     """
+    __slots__ = ("__email", "__password", "__admin")
 
     def __init__(self, email, password, admin=False):
         """
@@ -10,11 +12,11 @@ class User:
 
         Args:
             email (str): User's email address used for authentication
-            password (str): User's password for system access
+            password (str): User's password for system access, in plain text
         """
         # Store user credentials as private attributes
         self.__email = email
-        self.__password = password # Encrypted password with sha256
+        self.__password = password # Plain text; stored salted and hashed (see services.passwords)
         self.__admin = admin
     
     def __str__(self):
@@ -55,21 +57,10 @@ class User:
         """
         Check if the user's credentials exist in the database.
         """
-        import sqlite3
-        from constants import PATH_TO_DB
-        email = False
-        with sqlite3.connect(PATH_TO_DB) as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM users WHERE email = ?", (self.email,))
-            result = cursor.fetchone()
-            email = result is not None
-            if not email:
-                return False
-            cursor.execute("SELECT password FROM users WHERE email = ?", (self.email,))
-            stored_password = cursor.fetchone()
-            if stored_password[0] == self.password:
-                return True
-            return False
+        from database.connection import fetchone
+        from services.passwords import verify
+        stored_password = fetchone("SELECT password FROM users WHERE email = ?", (self.email,))
+        return stored_password is not None and verify(self.password, stored_password[0])
     
     def is_admin(self):
         """
@@ -78,17 +69,10 @@ class User:
         Returns:
             bool: True if the user is an administrator, False otherwise.
         """
-        if self.exists_in_db():
-            import sqlite3
-            from constants import PATH_TO_DB
-            with sqlite3.connect(PATH_TO_DB) as conn:
-                cursor = conn.cursor()
-                cursor.execute("SELECT * FROM users WHERE email = ?", (self.email,))
-                result = cursor.fetchone()
-                if result[3] == 1:
-                    return True
-                else:
-                    return False
+        from database.connection import fetchone
+        from services.passwords import verify
+        result = fetchone("SELECT password, is_admin FROM users WHERE email = ?", (self.email,))
+        return result is not None and result[1] == 1 and verify(self.password, result[0])
     
 
     def insert_in_db(self):
@@ -98,16 +82,14 @@ class User:
         Returns:
             bool: True if insertion was successful, False otherwise
         """
-        import sqlite3
-        from constants import PATH_TO_DB
+        from database.connection import execute
+        from services.passwords import hash_password
         try:
-            with sqlite3.connect(PATH_TO_DB) as conn:
-                cursor = conn.cursor()
-                cursor.execute(
-                    "INSERT INTO users (email, password, is_admin) VALUES (?, ?, ?)", 
-                    (self.email, self.password, self.admin)
-                )
-                return True
+            execute(
+                "INSERT INTO users (email, password, is_admin) VALUES (?, ?, ?)", 
+                (self.email, hash_password(self.password), self.admin)
+            )
+            return True
         except:
             return False 
 
@@ -115,12 +97,9 @@ class User:
         """
         Deletes user from database
         """
-        import sqlite3
-        from constants import PATH_TO_DB
+        from database.connection import execute
         try:
-            with sqlite3.connect(PATH_TO_DB) as conn:
-                cursor = conn.cursor()
-                cursor.execute("DELETE FROM users WHERE email = ?", (self.email,))
-                return True
+            execute("DELETE FROM users WHERE email = ?", (self.email,))
+            return True
         except:
             return False
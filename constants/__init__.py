@@ -1,5 +1,6 @@
 import os
 PATH_TO_DB = os.path.join(os.path.dirname(os.path.dirname(__file__)), "database", "clinic.db")
+PATH_TO_DB_CONFIG = os.path.join(os.path.dirname(os.path.dirname(__file__)), "database", "clinic.ini")
 PATH_TO_IMAGES = os.path.join(os.path.dirname(os.path.dirname(__file__)), "assets", "images")
 CONSULTATIONS_COLUMNS = ("ID", "Doctor", "Specialization", "Patient", "Date and Time")
 CONSULTATIONS_COLUMNS_IN_DB = ("id", "patient", "doctor", "date", "time")
@@ -9,4 +10,16 @@ USERS_COLUMNS = ("ID", "Email", "Role")
 USERS_COLUMNS_IN_DB = ("id", "email", "password", "is_admin")
 SPECIALIZATIONS_COLUMNS = ("ID", "Name")
 SPECIALIZATIONS_COLUMNS_IN_DB = ("id", "name")
+# Quiet time after the last key press before a search-as-you-type runs
+SEARCH_DEBOUNCE_MS = 150
+# Maximum number of matches shown in the doctor/patient pickers
+MAX_PICKER_RESULTS = 50
+# Maximum number of ranked results an admin search returns
+SEARCH_RESULT_LIMIT = 500
+# Length of every consultation, used to detect double bookings
+CONSULTATION_DURATION_MINUTES = 30
+# Working hours of doctors without a schedule of their own: (weekday, start, end), Monday is 0
+DEFAULT_WORKING_HOURS = tuple(
+    (weekday, start, end) for weekday in range(5) for start, end in (("09:00", "13:00"), ("14:00", "18:00"))
+)
 TABLES_WHERE_JOIN_IS_NEEDED = ("consultations", "doctor")
\ No newline at end of file
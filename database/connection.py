@@ -0,0 +1,224 @@
+"""
+Shared SQLite connection manager.
+
+Every module talks to clinic.db through this module instead of opening its own
+connection with sqlite3.connect. Each thread gets one long-lived connection that
+keeps its compiled statements cached, so a query costs only its own execution
+time instead of a full open/parse-schema/close cycle. New connections are tuned
+with the PRAGMAs of the active profile (see database/tuning.py), and their
+statements are timed (see database/instrumentation.py).
+
+Connections run in autocommit mode: single statements are committed as soon as
+they run, and groups of statements that must succeed together are wrapped in
+``transaction()``.
+"""
+import sqlite3
+import sys
+import threading
+from contextlib import contextmanager
+
+# Number of compiled statements each connection keeps in its cache
+STATEMENT_CACHE_SIZE = 256
+
+_local = threading.local()
+_lock = threading.Lock()
+_connections = []  # Every connection opened, so they can all be closed at once
+_generation = 0  # Bumped by close_all_connections so other threads know to reconnect
+_db_path = None
+
+
+def get_database_path() -> str:
+    """
+    Get the path of the database file used by the connection manager.
+
+    Returns:
+        str: The configured path, or constants.PATH_TO_DB if none was set
+    """
+    if _db_path is not None:
+        return _db_path
+    from constants import PATH_TO_DB
+    return PATH_TO_DB
+
+
+def set_database_path(path: str):
+    """
+    Point the connection manager at another database file.
+
+    Any open connection is closed so the next query reconnects to the new file.
+
+    Args:
+        path (str): Path to the SQLite database file (or ":memory:")
+    """
+    global _db_path
+    close_all_connections()
+    _db_path = path
+    # Cached foreign keys, queries, search indexes and schedules describe the previous database
+    from database.schema import invalidate
+    invalidate()
+    from classes.search_index import reset_indexes
+    reset_indexes()
+    from classes.availability import reset_availability
+    reset_availability()
+    from classes.free_slots import reset_slot_map
+    reset_slot_map()
+    services = sys.modules.get("services")
+    if services is not None:  # Not imported yet, so nothing is cached
+        services.forget_cached()
+
+
+def get_connection() -> sqlite3.Connection:
+    """
+    Get the connection owned by the calling thread, opening it on first use.
+
+    Returns:
+        sqlite3.Connection: A persistent connection to the configured database
+    """
+    if getattr(_local, "generation", None) != _generation:
+        # Never connected, or close_all_connections closed this thread's connection
+        _local.conn = None
+        _local.depth = 0
+        _local.generation = _generation
+    conn = _local.conn
+    if conn is None:
+        from database.instrumentation import connection_factory
+        conn = sqlite3.connect(
+            get_database_path(),
+            isolation_level=None,  # Autocommit, transactions are explicit
+            cached_statements=STATEMENT_CACHE_SIZE,
+            check_same_thread=False,  # Still one thread per connection, but lets close_all_connections run anywhere
+            factory=connection_factory(),
+        )
+        from database.tuning import apply_profile
+        apply_profile(conn)
+        _local.conn = conn
+        _local.depth = 0
+        with _lock:
+            _connections.append(conn)
+    return conn
+
+
+def close_connection():
+    """Close the connection owned by the calling thread, if any."""
+    conn = getattr(_local, "conn", None)
+    if conn is None or getattr(_local, "generation", None) != _generation:
+        return
+    with _lock:
+        if conn in _connections:
+            _connections.remove(conn)
+    conn.close()
+    _local.conn = None
+    _local.depth = 0
+
+
+def close_all_connections():
+    """Close the connections of every thread (e.g. on shutdown or when switching databases)."""
+    global _generation
+    with _lock:
+        connections = list(_connections)
+        _connections.clear()
+        _generation += 1
+    for conn in connections:
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+
+@contextmanager
+def transaction(immediate: bool = False):
+    """
+    Run a group of statements atomically.
+
+    Commits when the block exits normally and rolls back if it raises. Nested
+    calls join the outermost transaction.
+
+    Args:
+        immediate (bool): Take the write lock when the transaction starts (BEGIN IMMEDIATE),
+            so what the block reads cannot be changed by another connection before it writes,
+            e.g. a slot checked free and then booked. Only the outermost call decides.
+
+    Yields:
+        sqlite3.Cursor: A cursor on the thread's connection
+
+    Example:
+        >>> with transaction() as cursor:
+        ...     cursor.execute("DELETE FROM consultations WHERE doctor = ?", (1,))
+        ...     cursor.execute("DELETE FROM doctor WHERE id = ?", (1,))
+    """
+    conn = get_connection()
+    if _local.depth == 0:
+        conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+    _local.depth += 1
+    try:
+        yield conn.cursor()
+    except BaseException:
+        _local.depth -= 1
+        if _local.depth == 0:
+            conn.rollback()
+        raise
+    else:
+        _local.depth -= 1
+        if _local.depth == 0:
+            conn.commit()
+
+
+def execute(query: str, params=()) -> sqlite3.Cursor:
+    """
+    Execute a single statement on the thread's connection.
+
+    Args:
+        query (str): SQL statement with ? placeholders
+        params (tuple): Values bound to the placeholders
+
+    Returns:
+        sqlite3.Cursor: The cursor holding the statement's results
+    """
+    return get_connection().execute(query, params)
+
+
+def executemany(query: str, seq_of_params) -> sqlite3.Cursor:
+    """
+    Execute a statement once for every parameter tuple.
+
+    Call it inside ``transaction()`` so all rows are written in one commit.
+
+    Args:
+        query (str): SQL statement with ? placeholders
+        seq_of_params (iterable): Parameter tuples, one per execution
+
+    Returns:
+        sqlite3.Cursor: The cursor used for the executions
+    """
+    return get_connection().executemany(query, seq_of_params)
+
+
+def fetchone(query: str, params=(), row_factory=None):
+    """
+    Execute a query and return its first row.
+
+    Args:
+        row_factory (callable): Builds each row from (cursor, values), e.g. classes.records.row_factory(...)
+
+    Returns:
+        tuple: The first row, or None if the query returned nothing
+    """
+    cursor = execute(query, params)
+    if row_factory is not None:
+        cursor.row_factory = row_factory
+    return cursor.fetchone()
+
+
+def fetchall(query: str, params=(), row_factory=None) -> list:
+    """
+    Execute a query and return all of its rows.
+
+    Args:
+        row_factory (callable): Builds each row from (cursor, values), e.g. classes.records.row_factory(...)
+
+    Returns:
+        list: List of row tuples (or of what row_factory builds)
+    """
+    cursor = execute(query, params)
+    if row_factory is not None:
+        cursor.row_factory = row_factory
+    return cursor.fetchall()
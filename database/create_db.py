@@ -1,145 +1,382 @@
-import sqlite3
-import hashlib
-
-# Create a connection to the database
-conn = sqlite3.connect('database/clinic.db')
-cursor = conn.cursor()
-
-# Create tables
-cursor.execute('''
-CREATE TABLE IF NOT EXISTS patient (
-    id INTEGER PRIMARY KEY, -- citizen card number
-    name TEXT NOT NULL,
-    address TEXT,
-    birth_date DATE,
-    phone TEXT,
-    email TEXT
-)
-''')
+"""
+Create clinic.db and fill it with data, without any prompt.
+
+    python -m database.create_db
+        Create the schema (migrated to the latest version) and, in tables that
+        are still empty, the small demo data set. Running it again changes
+        nothing. The admin password comes from --admin-password or the
+        CLINIC_ADMIN_PASSWORD environment variable; otherwise a random one is
+        generated and printed.
+
+    python -m database.create_db --generate --db big.db --patients 200000 --consultations 1000000
+        Build a synthetic database of any size for tests and benchmarks (see
+        generate). The same sizes and --seed always give the same data.
+"""
+import argparse
+import os
+import random
+import secrets
+import time
+from datetime import date, timedelta
+
+# Schema of every table, in dependency order
+TABLES = [
+    '''
+    CREATE TABLE IF NOT EXISTS patient (
+        id INTEGER PRIMARY KEY, -- citizen card number
+        name TEXT NOT NULL,
+        address TEXT,
+        birth_date DATE,
+        phone TEXT,
+        email TEXT
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS specialization (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS doctor (
+        id INTEGER PRIMARY KEY, -- doctor credential number
+        name TEXT NOT NULL,
+        email TEXT,
+        specialization_id INTEGER,
+        FOREIGN KEY (specialization_id) REFERENCES specialization(id)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS consultations (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        patient INTEGER,
+        doctor INTEGER,
+        date DATE,
+        time TIME,
+        FOREIGN KEY (patient) REFERENCES patient(id),
+        FOREIGN KEY (doctor) REFERENCES doctor(id)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        email TEXT NOT NULL,
+        password TEXT NOT NULL,
+        is_admin BOOLEAN DEFAULT 0
+    )
+    ''',
+]
+
+
+def create_tables(cursor):
+    """
+    Create every table of the schema that does not exist yet.
 
-cursor.execute('''
-CREATE TABLE IF NOT EXISTS specialization (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    name TEXT NOT NULL
+    Args:
+        cursor (sqlite3.Cursor): Cursor on the database to create the tables in
+    """
+    for statement in TABLES:
+        cursor.execute(statement)
+
+
+# Rows per executemany while generating
+CHUNK_SIZE = 50000
+# PBKDF2 iterations of generated users' passwords: low, so thousands of users are generated in
+# seconds; each hash is upgraded to the configured cost on the user's first login
+GENERATED_PASSWORD_ITERATIONS = 1000
+
+# Specializations with their relative share of doctors (later ones are generated as "Specialization N")
+SPECIALIZATIONS = (
+    ("General Practice", 8), ("Pediatrics", 4), ("Gynecology", 3), ("Cardiology", 3), ("Orthopedics", 3),
+    ("Psychiatry", 2), ("Psychology", 2), ("Dermatology", 2), ("Ophthalmology", 2), ("Neurology", 1),
+    ("Oncology", 1), ("Radiology", 1), ("Gastroenterology", 1), ("Endocrinology", 1), ("Urology", 1),
 )
-''')
-
-cursor.execute('''
-CREATE TABLE IF NOT EXISTS doctor (
-    id INTEGER PRIMARY KEY, -- doctor credential number
-    name TEXT NOT NULL,
-    email TEXT,
-    specialization_id INTEGER,
-    FOREIGN KEY (specialization_id) REFERENCES specialization(id)
+FIRST_NAMES = (
+    "Ana", "João", "Maria", "Pedro", "Inês", "Rui", "Sofia", "Tiago", "Beatriz", "Miguel", "Carla", "José",
+    "Marta", "Luís", "Rita", "André", "Joana", "Paulo", "Helena", "Diogo", "Catarina", "Francisco", "Mariana",
+    "Gonçalo", "Leonor", "Duarte", "Matilde", "Afonso", "Carolina", "Ricardo", "Teresa", "Álvaro",
 )
-''')
-
-cursor.execute('''
-CREATE TABLE IF NOT EXISTS consultations (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    patient INTEGER,
-    doctor INTEGER,
-    date DATE,
-    time TIME,
-    FOREIGN KEY (patient) REFERENCES patient(id),
-    FOREIGN KEY (doctor) REFERENCES doctor(id)
+LAST_NAMES = (
+    "Silva", "Santos", "Ferreira", "Pereira", "Oliveira", "Costa", "Rodrigues", "Martins", "Jesus", "Sousa",
+    "Fernandes", "Gonçalves", "Gomes", "Lopes", "Marques", "Alves", "Almeida", "Ribeiro", "Pinto", "Carvalho",
+    "Teixeira", "Moreira", "Correia", "Mendes", "Nunes", "Soares", "Vieira", "Monteiro", "Cardoso", "Rocha",
 )
-''')
-
-cursor.execute('''
-CREATE TABLE IF NOT EXISTS users (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    email TEXT NOT NULL,
-    password TEXT NOT NULL,
-    is_admin BOOLEAN DEFAULT 0
+STREETS = ("Rua", "Avenida", "Travessa", "Largo", "Praceta")
+
+# Consultation slots: every half hour of the default working hours, Monday to Friday
+SLOT_TIMES = tuple(
+    f"{minute // 60:02d}:{minute % 60:02d}"
+    for start, end in ((9 * 60, 13 * 60), (14 * 60, 18 * 60))
+    for minute in range(start, end, 30)
 )
-''')
-
-# Insert default data into the users table
-cursor.execute('''
-INSERT INTO users (email, password)
-VALUES 
-    ('alice@domain.com', ?),
-    ('bob@domain.com', ?),
-    ('charlie@domain.com', ?)
-''', (
-    hashlib.sha256('alice123'.encode()).hexdigest(),
-    hashlib.sha256('bob123'.encode()).hexdigest(),
-    hashlib.sha256('charlie123'.encode()).hexdigest()
-))
-
-# Insert admin user with encryption
-password = input("Enter the password for the admin1 user: ")
-hashed_password = hashlib.sha256(password.encode()).hexdigest()
-cursor.execute('''
-               INSERT INTO users (email, password, is_admin)
-               VALUES ('admin1', ?, 1)
-               ''', (hashed_password,)) # admin1
-password = input("Enter the password for the admin2 user: ")
-hashed_password = hashlib.sha256(password.encode()).hexdigest()
-cursor.execute('''
-               INSERT INTO users (email, password, is_admin)
-               VALUES ('admin2', ?, 1)
-               ''', (hashed_password,)) #admin2
-
-# Insert data into specialization table
-cursor.execute('''
-INSERT INTO specialization (name)
-VALUES 
-    ('General Practice'),
-    ('Pediatrics'),
-    ('Neurology'),
-    ('Oncology'),
-    ('Psychiatry'),
-    ('Radiology'),
-    ('Orthopedics'),
-    ('Cardiology'),
-    ('Gastrentrology')
-''')
-
-# Insert data into patient table
-cursor.execute('''
-INSERT INTO patient (name, address, birth_date, phone, email)
-VALUES 
-    ('João Silva', 'Rua A, 123', '1980-01-01', '912345678', 'joao@email.com'),
-    ('Maria Santos', 'Rua B, 456', '1990-05-15', '923456789', 'maria@email.com'),
-    ('Pedro Costa', 'Rua C, 789', '1975-12-30', '934567890', 'pedro@email.com'),
-    ('Marco André', 'Rua D, 148', '1993-06-06', '919293949', 'marco@email.com'),
-    ('José Fernandes', 'Rua E, 284', '1998-08-18', '929394959', 'jose@email.com'),
-    ('Ana Ferreira', 'Rua F, 391', '1987-02-22', '939495969', 'ana@email.com'),
-    ('Marta Chaves', 'Rua G, 426', '1984-05-25', '912934956', 'marta@email.com'),
-    ('Fernando Marques', 'Rua H, 590', '2009-04-12', '923945967', 'fernando@email.com')
-''')
-
-# Insert data into doctor table
-cursor.execute('''
-INSERT INTO doctor (name, email, specialization_id)
-VALUES 
-    ('Dr. Carlos Oliveira', 'carlos@clinica.com', 1),
-    ('Dra. Ana Pereira', 'ana@clinica.com', 2),
-    ('Dr. Ricardo Santos', 'ricardo@clinica.com', 3),
-    ('Dr. Alexandre Ferreira', 'alexandre@clinica.com', 4),
-    ('Dr. Diogo Vieira', 'diogo@clinica.com', 5),
-    ('Dra. Maria Nunes', 'maria@clinica.com', 6),
-    ('Dra. Inês Pereira', 'ines@clinica.com', 7),
-    ('Dr. Álvaro Camarinha', 'alvaro@clinica.com', 8),
-    ('Dr. Cuca Beludo', 'cuca@clinica.com', 9)
-''')
-
-# Insert data into consultations table
-cursor.execute('''
-INSERT INTO consultations (patient, doctor, date, time)
-VALUES 
-    (1, 1, '2024-01-15', '09:00'),
-    (2, 2, '2024-01-15', '09:30'),
-    (3, 3, '2024-01-15', '10:00'),
-    (4, 4, '2024-12-02', '09:00'),
-    (5, 5, '2024-12-02', '09:30'),
-    (6, 6, '2024-12-02', '11:30'),
-    (7, 7, '2024-12-02', '16:30'),
-    (8, 8, '2024-12-02', '13:30')
-''')
-
-# Commit the changes and close the connection
-conn.commit()
-conn.close()
+
+
+def user_credentials(number: int) -> tuple:
+    """
+    Get the login of a generated user.
+
+    Args:
+        number (int): 0-based number of the user
+
+    Returns:
+        tuple: (email, password in plain text)
+    """
+    return f"user{number}@clinica.com", f"password{number}"
+
+
+def _ascii_names() -> dict:
+    """Map every generated first and last name to its lower-case form without accents, for emails."""
+    from classes.search_index import fold
+    return {name: fold(name) for name in FIRST_NAMES + LAST_NAMES}
+
+
+def _insert_chunks(cursor, query: str, rows) -> int:
+    """Insert rows with one executemany per CHUNK_SIZE rows and return how many were inserted."""
+    rows = iter(rows)
+    count = 0
+    while True:
+        chunk = [row for _, row in zip(range(CHUNK_SIZE), rows)]
+        if not chunk:
+            return count
+        cursor.executemany(query, chunk)
+        count += len(chunk)
+
+
+def generate(patients=10000, doctors=100, specializations=12, users=50, consultations=100000,
+             years=3, future_days=90, seed=42, report=print) -> dict:
+    """
+    Fill an empty database (the one database.connection points at) with synthetic data.
+
+    The data follows the shape of a real clinic: doctors are spread over
+    specializations unevenly (many GPs, few oncologists), patients are of
+    all ages and some of them come far more often than others, and
+    consultations fall on working days, every half hour within working hours,
+    from `years` ago until `future_days` ahead, without double-booking any
+    doctor. Rows are inserted with chunked executemany calls inside one
+    transaction per table; the schema is migrated afterwards, so the search
+    tables are filled in bulk instead of by a trigger per row.
+
+    Args:
+        patients, doctors, specializations, users, consultations (int): Number of rows to create
+        years (int): How many years of past consultations
+        future_days (int): How many days of upcoming consultations
+        seed (int): Seed of the random generator
+        report (callable): Called with a progress line per table (None for silence)
+
+    Returns:
+        dict: table -> (rows inserted, seconds)
+
+    Raises:
+        ValueError: If the database already has data, or there are not enough
+            doctor slots for the consultations
+    """
+    from database.connection import execute, fetchone, transaction
+    from database.migrations import migrate
+    from services.passwords import PBKDF2Hasher
+
+    rng = random.Random(seed)
+    ascii_names = _ascii_names()
+    first_day = date.today() - timedelta(days=365 * years)
+    days = [
+        day.isoformat()
+        for day in (first_day + timedelta(days=i) for i in range((date.today() - first_day).days + future_days + 1))
+        if day.weekday() < 5
+    ]
+    total_slots = len(days) * doctors * len(SLOT_TIMES)
+    if consultations > total_slots:
+        raise ValueError(f"{doctors} doctors only have {total_slots} slots in that period")
+    if min(patients, doctors, specializations) < 1 and consultations:
+        raise ValueError("Consultations need at least one patient, doctor and specialization")
+
+    with transaction() as cursor:
+        create_tables(cursor)
+    for table in ("specialization", "doctor", "patient", "users", "consultations"):
+        if fetchone(f"SELECT EXISTS (SELECT 1 FROM {table})")[0]:
+            raise ValueError(f"The database already has data in {table}; generate into a new file")
+
+    names = [name for name, _ in SPECIALIZATIONS[:specializations]]
+    names += [f"Specialization {i}" for i in range(len(names) + 1, specializations + 1)]
+    weights = [weight for _, weight in SPECIALIZATIONS[:specializations]] + [1] * (specializations - len(SPECIALIZATIONS))
+
+    def doctor_rows():
+        for number, specialization in enumerate(rng.choices(range(1, specializations + 1), weights, k=doctors)):
+            first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            title = "Dra." if first.endswith("a") else "Dr."
+            yield f"{title} {first} {last}", f"{ascii_names[first]}.{ascii_names[last]}{number}@clinica.com", specialization
+
+    def patient_rows():
+        today = date.today()
+        for number in range(patients):
+            first, middle, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES), rng.choice(LAST_NAMES)
+            age_days = int(rng.triangular(0, 95, 40) * 365.25)
+            yield (
+                f"{first} {middle} {last}",
+                f"{rng.choice(STREETS)} {rng.choice(LAST_NAMES)}, {rng.randint(1, 400)}",
+                (today - timedelta(days=age_days)).isoformat(),
+                f"9{rng.choice('1236')}{rng.randint(0, 9999999):07d}",
+                f"{ascii_names[first]}.{ascii_names[last]}{number}@email.com",
+            )
+
+    def user_rows():
+        hasher = PBKDF2Hasher(GENERATED_PASSWORD_ITERATIONS)
+        for number in range(users):
+            email, password = user_credentials(number)
+            yield email, hasher.hash(password), int(number % 50 == 0)
+
+    def consultation_rows():
+        # Distinct (day, doctor, slot) triples, so no doctor is booked twice; sorted, so IDs follow dates
+        slots_per_day = doctors * len(SLOT_TIMES)
+        for slot in sorted(rng.sample(range(total_slots), consultations)):
+            day, rest = divmod(slot, slots_per_day)
+            doctor, time_slot = divmod(rest, len(SLOT_TIMES))
+            # Frequent visitors: low patient numbers come far more often than high ones
+            patient = 1 + int(patients * rng.random() ** 2)
+            yield patient, doctor + 1, days[day], SLOT_TIMES[time_slot]
+
+    steps = (
+        ("specialization", "INSERT INTO specialization (name) VALUES (?)", ((name,) for name in names)),
+        ("doctor", "INSERT INTO doctor (name, email, specialization_id) VALUES (?, ?, ?)", doctor_rows()),
+        ("patient", "INSERT INTO patient (name, address, birth_date, phone, email) VALUES (?, ?, ?, ?, ?)", patient_rows()),
+        ("users", "INSERT INTO users (email, password, is_admin) VALUES (?, ?, ?)", user_rows()),
+        ("consultations", "INSERT INTO consultations (patient, doctor, date, time) VALUES (?, ?, ?, ?)", consultation_rows()),
+    )
+    stats = {}
+    for table, query, rows in steps:
+        start = time.perf_counter()
+        with transaction() as cursor:
+            count = _insert_chunks(cursor, query, rows)
+        stats[table] = (count, time.perf_counter() - start)
+        if report:
+            seconds = stats[table][1]
+            report(f"{table:<15}{count:>10} rows in {seconds:6.2f}s ({count / max(seconds, 1e-9):>10,.0f} rows/s)")
+
+    start = time.perf_counter()
+    migrate()
+    execute("ANALYZE")
+    stats["migrations"] = (0, time.perf_counter() - start)
+    if report:
+        report(f"{'migrations':<15}{'':>10}      in {stats['migrations'][1]:6.2f}s (indexes and search tables)")
+    return stats
+
+
+def seed_demo_data(admin_password: str):
+    """
+    Create the schema and the demo data set, filling only the tables that are still empty.
+
+    Args:
+        admin_password (str): Password of the admin1 and admin2 accounts
+    """
+    from database.connection import fetchone, transaction
+    from database.migrations import migrate
+    from services.records import UserService
+    hash_password = UserService.hash_password
+
+    demo_rows = {
+        "users": ("INSERT INTO users (email, password, is_admin) VALUES (?, ?, ?)", [
+            ('alice@domain.com', hash_password('alice123'), 0),
+            ('bob@domain.com', hash_password('bob123'), 0),
+            ('charlie@domain.com', hash_password('charlie123'), 0),
+            ('admin1', hash_password(admin_password), 1),
+            ('admin2', hash_password(admin_password), 1),
+        ]),
+        "specialization": ("INSERT INTO specialization (name) VALUES (?)", [
+            (name,) for name in (
+                'General Practice', 'Pediatrics', 'Neurology', 'Oncology', 'Psychiatry',
+                'Radiology', 'Orthopedics', 'Cardiology', 'Gastrentrology'
+            )
+        ]),
+        "patient": ("INSERT INTO patient (name, address, birth_date, phone, email) VALUES (?, ?, ?, ?, ?)", [
+            ('João Silva', 'Rua A, 123', '1980-01-01', '912345678', 'joao@email.com'),
+            ('Maria Santos', 'Rua B, 456', '1990-05-15', '923456789', 'maria@email.com'),
+            ('Pedro Costa', 'Rua C, 789', '1975-12-30', '934567890', 'pedro@email.com'),
+            ('Marco André', 'Rua D, 148', '1993-06-06', '919293949', 'marco@email.com'),
+            ('José Fernandes', 'Rua E, 284', '1998-08-18', '929394959', 'jose@email.com'),
+            ('Ana Ferreira', 'Rua F, 391', '1987-02-22', '939495969', 'ana@email.com'),
+            ('Marta Chaves', 'Rua G, 426', '1984-05-25', '912934956', 'marta@email.com'),
+            ('Fernando Marques', 'Rua H, 590', '2009-04-12', '923945967', 'fernando@email.com'),
+        ]),
+        "doctor": ("INSERT INTO doctor (name, email, specialization_id) VALUES (?, ?, ?)", [
+            ('Dr. Carlos Oliveira', 'carlos@clinica.com', 1),
+            ('Dra. Ana Pereira', 'ana@clinica.com', 2),
+            ('Dr. Ricardo Santos', 'ricardo@clinica.com', 3),
+            ('Dr. Alexandre Ferreira', 'alexandre@clinica.com', 4),
+            ('Dr. Diogo Vieira', 'diogo@clinica.com', 5),
+            ('Dra. Maria Nunes', 'maria@clinica.com', 6),
+            ('Dra. Inês Pereira', 'ines@clinica.com', 7),
+            ('Dr. Álvaro Camarinha', 'alvaro@clinica.com', 8),
+            ('Dr. Cuca Beludo', 'cuca@clinica.com', 9),
+        ]),
+        "consultations": ("INSERT INTO consultations (patient, doctor, date, time) VALUES (?, ?, ?, ?)", [
+            (1, 1, '2024-01-15', '09:00'),
+            (2, 2, '2024-01-15', '09:30'),
+            (3, 3, '2024-01-15', '10:00'),
+            (4, 4, '2024-12-02', '09:00'),
+            (5, 5, '2024-12-02', '09:30'),
+            (6, 6, '2024-12-02', '11:30'),
+            (7, 7, '2024-12-02', '16:30'),
+            (8, 8, '2024-12-02', '13:30'),
+        ]),
+    }
+
+    with transaction() as cursor:
+        create_tables(cursor)
+    migrate()
+    with transaction() as cursor:
+        for table, (query, rows) in demo_rows.items():
+            if not fetchone(f"SELECT EXISTS (SELECT 1 FROM {table})")[0]:
+                cursor.executemany(query, rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create the clinic database and fill it with data.")
+    parser.add_argument("--db", help="database file (default: database/clinic.db)")
+    parser.add_argument("--admin-password", default=os.environ.get("CLINIC_ADMIN_PASSWORD"),
+                        help="password of admin1 and admin2 for the demo data (default: random, printed)")
+    parser.add_argument("--generate", action="store_true", help="generate synthetic data instead of the demo data")
+    parser.add_argument("--patients", type=int, default=10000)
+    parser.add_argument("--doctors", type=int, default=100)
+    parser.add_argument("--specializations", type=int, default=12)
+    parser.add_argument("--users", type=int, default=50, help="generated users log in as userN@clinica.com / passwordN")
+    parser.add_argument("--consultations", type=int, default=100000)
+    parser.add_argument("--years", type=int, default=3, help="years of past consultations")
+    parser.add_argument("--future-days", type=int, default=90, help="days of upcoming consultations")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--replace", action="store_true", help="delete the database file first")
+    args = parser.parse_args()
+
+    from database import connection
+    if args.db:
+        connection.set_database_path(args.db)
+    path = connection.get_database_path()
+    if args.replace:
+        connection.close_all_connections()
+        for suffix in ("", "-wal", "-shm", "-journal"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+    try:
+        if args.generate:
+            start = time.perf_counter()
+            stats = generate(
+                patients=args.patients, doctors=args.doctors, specializations=args.specializations,
+                users=args.users, consultations=args.consultations, years=args.years,
+                future_days=args.future_days, seed=args.seed
+            )
+            rows = sum(count for count, _ in stats.values())
+            seconds = time.perf_counter() - start
+            print(f"{'total':<15}{rows:>10} rows in {seconds:6.2f}s ({rows / seconds:>10,.0f} rows/s) -> {path}")
+        else:
+            password = args.admin_password
+            if not password:
+                password = secrets.token_urlsafe(12)
+                print(f"Password of admin1 and admin2: {password}")
+            seed_demo_data(password)
+            print(f"Database ready: {path}")
+    except ValueError as e:
+        parser.exit(1, f"Error: {e}\n")
+    finally:
+        connection.close_all_connections()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+Background executor for database work.
+
+Tk is single-threaded: a query that runs inside a Tk callback freezes the whole
+window until it returns. DatabaseExecutor runs queries on worker threads (each
+with its own connection from database.connection) and hands the results back
+to the Tk thread by polling a queue with root.after, so callbacks can update
+widgets safely.
+
+Requests can be cancelled explicitly, and requests submitted with the same
+``key`` supersede each other: only the result of the newest one is delivered.
+"""
+import logging
+import queue
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class Request:
+    """A unit of work submitted to a DatabaseExecutor."""
+
+    def __init__(self, func, args, kwargs, callback, error_callback, key):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.callback = callback
+        self.error_callback = error_callback
+        self.key = key
+        self.cancelled = False
+
+    def cancel(self):
+        """Cancel the request: it is skipped if not started yet and its result is never delivered."""
+        self.cancelled = True
+
+
+class DatabaseExecutor:
+    """
+    Runs database work off the Tk thread and delivers results through root.after polling.
+
+    Args:
+        root (tk.Misc): Any Tk widget, used to schedule the polling on the Tk thread
+        workers (int): Number of worker threads
+    """
+    # How often finished requests are checked for while work is outstanding
+    POLL_INTERVAL_MS = 15
+
+    def __init__(self, root, workers=1):
+        self.root = root
+        self._requests = queue.Queue()
+        self._results = queue.Queue()
+        self._latest = {}       # key -> newest Request submitted with that key
+        self._outstanding = 0   # Requests submitted but not delivered yet (Tk thread only)
+        self._poll_id = None
+        self._threads = []
+        for i in range(workers):
+            thread = threading.Thread(target=self._work, name=f"db-executor-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, func, *args, callback=None, error_callback=None, key=None, **kwargs) -> Request:
+        """
+        Run `func(*args, **kwargs)` on a worker thread.
+
+        Must be called from the Tk thread. `callback(result)` or
+        `error_callback(exception)` is later called on the Tk thread.
+
+        Args:
+            func (callable): The database work to run
+            callback (callable): Receives the return value of func
+            error_callback (callable): Receives the exception raised by func
+                (defaults to logging it)
+            key (hashable): Requests with the same key supersede each other;
+                submitting a new one cancels the previous one
+
+        Returns:
+            Request: Handle that can be used to cancel the request
+        """
+        request = Request(func, args, kwargs, callback, error_callback, key)
+        if key is not None:
+            previous = self._latest.get(key)
+            if previous is not None:
+                previous.cancel()
+            self._latest[key] = request
+        self._outstanding += 1
+        self._requests.put(request)
+        if self._poll_id is None:
+            self._poll_id = self.root.after(self.POLL_INTERVAL_MS, self._poll)
+        return request
+
+    def cancel(self, key):
+        """Cancel the newest pending request submitted with `key`, if any."""
+        request = self._latest.pop(key, None)
+        if request is not None:
+            request.cancel()
+
+    def shutdown(self):
+        """Stop the worker threads once the queued requests are done."""
+        for _ in self._threads:
+            self._requests.put(None)
+        if self._poll_id is not None:
+            self.root.after_cancel(self._poll_id)
+            self._poll_id = None
+
+    def _work(self):
+        """Worker loop: run requests and queue their outcome for the Tk thread."""
+        from database.connection import close_connection
+        while True:
+            request = self._requests.get()
+            if request is None:
+                close_connection()
+                return
+            if request.cancelled:
+                self._results.put((request, None, None))
+                continue
+            try:
+                result = request.func(*request.args, **request.kwargs)
+                self._results.put((request, result, None))
+            except Exception as e:
+                self._results.put((request, None, e))
+
+    def _poll(self):
+        """Deliver finished requests on the Tk thread, then keep polling while work is outstanding."""
+        self._poll_id = None
+        try:
+            while True:
+                try:
+                    request, result, error = self._results.get_nowait()
+                except queue.Empty:
+                    break
+                self._outstanding -= 1
+                if request.key is not None and self._latest.get(request.key) is request:
+                    del self._latest[request.key]
+                if request.cancelled:
+                    continue
+                # A failing callback is logged; it must not keep the other results from being delivered
+                try:
+                    if error is not None:
+                        if request.error_callback is not None:
+                            request.error_callback(error)
+                        else:
+                            logger.error("Database error: %s", error, exc_info=error)
+                    elif request.callback is not None:
+                        request.callback(result)
+                except Exception:
+                    logger.exception("Callback of %r failed", request.func)
+        finally:
+            if self._outstanding and self._poll_id is None:
+                self._poll_id = self.root.after(self.POLL_INTERVAL_MS, self._poll)
+
+
+def get_executor(root) -> DatabaseExecutor:
+    """
+    Get the executor shared by every window of a Tk application.
+
+    Args:
+        root (tk.Misc): Any widget of the application
+
+    Returns:
+        DatabaseExecutor: The application's executor, created on first use
+    """
+    tk_root = root._root()  # The Tk instance, shared by every Toplevel
+    executor = getattr(tk_root, "db_executor", None)
+    if executor is None:
+        executor = DatabaseExecutor(tk_root)
+        tk_root.db_executor = executor
+    return executor
@@ -0,0 +1,380 @@
+"""
+Timing of every SQL statement run through database.connection.
+
+Connections are opened with InstrumentedConnection, whose cursors record for
+each statement how long it took (execution plus fetching its rows), how many
+rows it returned or changed and where it was called from (the first frame
+outside the connection manager). A statement that returns rows is recorded
+once its rows have all been fetched, or when its cursor is reused, closed or
+dropped.
+
+Each record ends up in three places:
+
+- query_stats(): count, total and maximum time and rows per statement and
+  call site, for benchmarks and the admin's diagnostics
+- the "database.slow_queries" logger: statements slower than slow_query_ms,
+  with their EXPLAIN QUERY PLAN, written to a rotating log file
+- the "database.queries" logger: a sample (sample_rate) of all statements at
+  DEBUG level, so turning on debug logging does not log every row
+
+Parameter values are never logged, as they hold patient data.
+
+Settings live in the [instrumentation] section of constants.PATH_TO_DB_CONFIG
+and can be overridden with CLINIC_QUERY_<KEY> environment variables
+(e.g. CLINIC_QUERY_SLOW_QUERY_MS=50). With enabled = false connections are
+opened without instrumentation and cost nothing extra.
+"""
+import configparser
+import logging
+import os
+import random
+import sqlite3
+import sys
+import threading
+import time
+
+from database import connection
+
+DEFAULT_SETTINGS = {
+    "enabled": True,
+    "slow_query_ms": 100.0,
+    "slow_log": "slow_queries.log",  # Relative paths are relative to the config file
+    "slow_log_max_bytes": 1024 * 1024,
+    "slow_log_backups": 3,
+    "sample_rate": 0.01,
+}
+
+ENV_PREFIX = "CLINIC_QUERY_"
+
+# Distinct (statement, call site) pairs kept by query_stats; later ones are counted together
+MAX_STATEMENTS = 1000
+OTHER_STATEMENTS = ("(other statements)", None)
+
+# Statements that EXPLAIN QUERY PLAN can describe
+EXPLAINABLE = ("select", "with", "insert", "update", "delete", "replace")
+
+query_logger = logging.getLogger("database.queries")
+slow_logger = logging.getLogger("database.slow_queries")
+
+_settings = None
+_slow_log_ready = False
+_stats = {}  # (sql, call site) -> [count, total seconds, max seconds, rows]; a call site is (code, line)
+_stats_lock = threading.Lock()
+_internal_files = set()  # Frames in these files are skipped when looking for the call site
+
+
+def load_settings(config_path: str = None, environ=None) -> dict:
+    """
+    Read the instrumentation settings from the config file and the environment.
+
+    Args:
+        config_path (str): Path to the INI file (defaults to constants.PATH_TO_DB_CONFIG)
+        environ (dict): Environment to read overrides from (defaults to os.environ)
+
+    Returns:
+        dict: Every setting of DEFAULT_SETTINGS, with slow_log as an absolute path
+
+    Raises:
+        ValueError: If a setting is unknown or has an invalid value
+    """
+    if config_path is None:
+        from constants import PATH_TO_DB_CONFIG
+        config_path = PATH_TO_DB_CONFIG
+    if environ is None:
+        environ = os.environ
+
+    values = {}
+    parser = configparser.ConfigParser()
+    if parser.read(config_path) and parser.has_section("instrumentation"):
+        values.update(parser.items("instrumentation"))
+    for key in DEFAULT_SETTINGS:
+        env_value = environ.get(ENV_PREFIX + key.upper())
+        if env_value is not None:
+            values[key] = env_value
+
+    unknown = set(values) - set(DEFAULT_SETTINGS)
+    if unknown:
+        raise ValueError(f"Unknown instrumentation setting(s): {', '.join(sorted(unknown))}")
+
+    settings = dict(DEFAULT_SETTINGS)
+    for key, value in values.items():
+        if key == "enabled":
+            value = str(value).strip().lower()
+            if value not in ("true", "false", "yes", "no", "on", "off", "1", "0"):
+                raise ValueError(f"Invalid enabled: {value!r} (expected true or false)")
+            settings[key] = value in ("true", "yes", "on", "1")
+        elif key == "slow_log":
+            settings[key] = str(value).strip()
+        else:
+            settings[key] = type(DEFAULT_SETTINGS[key])(value)
+    if not 0 <= settings["sample_rate"] <= 1:
+        raise ValueError(f"Invalid sample_rate: {settings['sample_rate']} (expected 0 to 1)")
+    settings["slow_log"] = os.path.join(os.path.dirname(os.path.abspath(config_path)), settings["slow_log"])
+    return settings
+
+
+def get_settings() -> dict:
+    """Get the active settings, loading them on first use."""
+    global _settings
+    if _settings is None:
+        _settings = load_settings()
+    return _settings
+
+
+def set_settings(settings=None):
+    """
+    Replace the active settings.
+
+    Connections opened before keep their connection class; call
+    database.connection.close_all_connections() for enabled to take effect.
+
+    Args:
+        settings (dict | None): Settings to change (others keep their defaults),
+            or None to reload them from the config file and environment
+    """
+    global _settings, _slow_log_ready
+    if settings is None:
+        _settings = None
+    else:
+        _settings = dict(DEFAULT_SETTINGS)
+        _settings.update(settings)
+    _slow_log_ready = False
+
+
+def connection_factory():
+    """
+    Get the connection class for sqlite3.connect.
+
+    Returns:
+        type: InstrumentedConnection, or sqlite3.Connection if instrumentation is disabled
+    """
+    return InstrumentedConnection if get_settings()["enabled"] else sqlite3.Connection
+
+
+def query_stats() -> list:
+    """
+    Get what every statement cost since the start (or the last reset_query_stats).
+
+    Returns:
+        list: One dict per statement and call site (sql, site, count, total_ms,
+            max_ms, mean_ms, rows), most expensive in total first
+    """
+    with _stats_lock:
+        items = [(key, list(value)) for key, value in _stats.items()]
+    stats = [
+        {
+            "sql": sql, "site": _format_site(site), "count": count,
+            "total_ms": total * 1000, "max_ms": longest * 1000, "mean_ms": total * 1000 / count, "rows": rows,
+        }
+        for (sql, site), (count, total, longest, rows) in items
+    ]
+    stats.sort(key=lambda stat: stat["total_ms"], reverse=True)
+    return stats
+
+
+def reset_query_stats():
+    """Forget the statements recorded so far."""
+    with _stats_lock:
+        _stats.clear()
+
+
+def _call_site():
+    """Return (code, line) of the code that ran the statement, formatted only when needed (see _format_site)."""
+    if not _internal_files:
+        _internal_files.update((_call_site.__code__.co_filename, connection.execute.__code__.co_filename))
+    frame = sys._getframe(2)
+    while frame is not None and frame.f_code.co_filename in _internal_files:
+        frame = frame.f_back
+    return None if frame is None else (frame.f_code, frame.f_lineno)
+
+
+def _format_site(site) -> str:
+    """Format a call site as "file:line in function"."""
+    if site is None:
+        return ""
+    code, line = site
+    return f"{os.path.basename(code.co_filename)}:{line} in {code.co_name}"
+
+
+def _explain(conn, sql: str, params) -> str:
+    """Return the EXPLAIN QUERY PLAN of a statement as indented lines, or why it is not available."""
+    if not sql.lstrip().lower().startswith(EXPLAINABLE):
+        return "    (no plan for this kind of statement)"
+    if params is None:
+        return "    (no plan: parameters not kept)"
+    try:
+        rows = sqlite3.Cursor(conn).execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+    except sqlite3.Error as error:
+        return f"    (no plan: {error})"
+    depth = {0: 0}
+    lines = []
+    for id, parent, _, detail in rows:
+        depth[id] = depth.get(parent, 0) + 1
+        lines.append("    " + "  " * (depth[id] - 1) + detail)
+    return "\n".join(lines)
+
+
+def _setup_slow_log(settings: dict):
+    """Attach the rotating file handler to the slow-query logger (once per settings)."""
+    global _slow_log_ready
+    from logging.handlers import RotatingFileHandler
+    with _stats_lock:
+        if _slow_log_ready:
+            return
+        for handler in list(slow_logger.handlers):
+            if getattr(handler, "slow_query_log", False):
+                slow_logger.removeHandler(handler)
+                handler.close()
+        try:
+            handler = RotatingFileHandler(
+                settings["slow_log"], maxBytes=settings["slow_log_max_bytes"],
+                backupCount=settings["slow_log_backups"], encoding="utf-8", delay=True
+            )
+        except OSError:
+            handler = None  # Read-only install: the records still reach any other handler
+        if handler is not None:
+            handler.slow_query_log = True
+            handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+            slow_logger.addHandler(handler)
+            slow_logger.propagate = False
+        if slow_logger.level == logging.NOTSET:
+            slow_logger.setLevel(logging.WARNING)
+        _slow_log_ready = True
+
+
+def _record(conn, sql: str, params, seconds: float, rows: int, site):
+    """Account for a finished statement in the stats and the logs."""
+    rows = max(rows, 0)  # rowcount is -1 for statements that neither return nor change rows
+    key = (sql, site)
+    with _stats_lock:
+        stat = _stats.get(key)
+        if stat is None:
+            if len(_stats) >= MAX_STATEMENTS:
+                key = OTHER_STATEMENTS
+                stat = _stats.get(key)
+            if stat is None:
+                stat = _stats[key] = [0, 0.0, 0.0, 0]
+        stat[0] += 1
+        stat[1] += seconds
+        stat[2] = max(stat[2], seconds)
+        stat[3] += rows
+
+    settings = get_settings()
+    ms = seconds * 1000
+    if query_logger.isEnabledFor(logging.DEBUG) and random.random() < settings["sample_rate"]:
+        query_logger.debug("%.2f ms, %d rows, %s: %s", ms, rows, _format_site(site), " ".join(sql.split()))
+    if ms >= settings["slow_query_ms"]:
+        if not _slow_log_ready:
+            _setup_slow_log(settings)
+        if slow_logger.isEnabledFor(logging.WARNING):
+            slow_logger.warning(
+                "%.1f ms, %d rows, %s\n    %s\n%s",
+                ms, rows, _format_site(site), " ".join(sql.split()), _explain(conn, sql, params)
+            )
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """A cursor that records the duration, row count and call site of its statements."""
+
+    _pending = None  # [sql, params, seconds so far, rows so far, call site] of the statement being read
+
+    def execute(self, sql, parameters=()):
+        if self._pending is not None:
+            self._finish()
+        start = time.perf_counter()
+        super().execute(sql, parameters)
+        elapsed = time.perf_counter() - start
+        if self.description is None:
+            _record(self.connection, sql, parameters, elapsed, self.rowcount, _call_site())
+        else:
+            self._pending = [sql, parameters, elapsed, 0, _call_site()]
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        if self._pending is not None:
+            self._finish()
+        # Keep the first parameters for EXPLAIN only when they can be read without consuming an iterator
+        first = seq_of_parameters[0] if isinstance(seq_of_parameters, (list, tuple)) and seq_of_parameters else None
+        start = time.perf_counter()
+        super().executemany(sql, seq_of_parameters)
+        _record(self.connection, sql, first, time.perf_counter() - start, self.rowcount, _call_site())
+        return self
+
+    def fetchone(self):
+        if self._pending is None:
+            return super().fetchone()
+        start = time.perf_counter()
+        row = super().fetchone()
+        self._pending[2] += time.perf_counter() - start
+        if row is None:
+            self._finish()
+        else:
+            self._pending[3] += 1
+        return row
+
+    def fetchmany(self, size=None):
+        if self._pending is None:
+            return super().fetchmany(self.arraysize if size is None else size)
+        size = self.arraysize if size is None else size
+        start = time.perf_counter()
+        rows = super().fetchmany(size)
+        self._pending[2] += time.perf_counter() - start
+        self._pending[3] += len(rows)
+        if len(rows) < size:
+            self._finish()
+        return rows
+
+    def fetchall(self):
+        if self._pending is None:
+            return super().fetchall()
+        start = time.perf_counter()
+        rows = super().fetchall()
+        self._pending[2] += time.perf_counter() - start
+        self._pending[3] += len(rows)
+        self._finish()
+        return rows
+
+    def __next__(self):
+        if self._pending is None:
+            return super().__next__()
+        start = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._pending[2] += time.perf_counter() - start
+            self._finish()
+            raise
+        self._pending[2] += time.perf_counter() - start
+        self._pending[3] += 1
+        return row
+
+    def close(self):
+        if self._pending is not None:
+            self._finish()
+        super().close()
+
+    def __del__(self):
+        if self._pending is not None:
+            try:
+                self._finish()
+            except Exception:  # The connection may already be closed; never raise from a finalizer
+                pass
+
+    def _finish(self):
+        """Record the statement whose rows were being read (all of them or not)."""
+        sql, params, seconds, rows, site = self._pending
+        self._pending = None
+        _record(self.connection, sql, params, seconds, rows, site)
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """A connection whose statements all run on InstrumentedCursor."""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
@@ -0,0 +1,269 @@
+"""
+Versioned schema migrations for clinic.db.
+
+The schema version is stored in SQLite's ``PRAGMA user_version`` header field.
+On start-up ``migrate()`` applies every migration newer than that version, each
+inside its own transaction, so existing databases are upgraded in place without
+re-running create_db.py.
+
+To change the schema, append a new entry to MIGRATIONS with the next version
+number. Never edit a migration that has already shipped.
+"""
+from database.connection import fetchone, transaction
+
+# FTS5 options of the search tables: accents are ignored and 2/3 character
+# prefixes are indexed so the first letters typed match quickly
+FTS_OPTIONS = "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'"
+
+# Rows of the dashboard's read model (upcoming_consultations), from the join it caches.
+# {where} narrows it to the consultations a trigger has to refresh.
+UPCOMING_ROWS_SELECT = """
+    SELECT c.date, c.time, c.id, c.doctor, c.patient, d.name, s.name, p.name
+    FROM consultations c
+    JOIN doctor d ON d.id = c.doctor
+    JOIN specialization s ON s.id = d.specialization_id
+    JOIN patient p ON p.id = c.patient
+    WHERE c.date IS NOT NULL AND c.time IS NOT NULL AND ({where})
+"""
+UPCOMING_ROWS_INSERT = """
+    INSERT OR REPLACE INTO upcoming_consultations (date, time, id, doctor_id, patient_id, doctor, specialization, patient)
+""" + UPCOMING_ROWS_SELECT
+
+# Entries the consultation change log keeps (migration 7); a workstation whose availability
+# engine fell further behind reloads it (see classes.availability.sync_availability)
+CHANGE_LOG_SIZE = 10000
+_LOG_CHANGE = f"""
+    INSERT INTO consultation_changes (consultation_id) VALUES ({{id}});
+    DELETE FROM consultation_changes WHERE seq <= (SELECT MAX(seq) FROM consultation_changes) - {CHANGE_LOG_SIZE};
+"""
+
+# (version, description, statements) - applied in order, each in one transaction
+MIGRATIONS = [
+    (1, "Index consultations by date, doctor and patient", [
+        "CREATE INDEX IF NOT EXISTS idx_consultations_date_time ON consultations(date, time)",
+        "CREATE INDEX IF NOT EXISTS idx_consultations_doctor_date_time ON consultations(doctor, date, time)",
+        "CREATE INDEX IF NOT EXISTS idx_consultations_patient ON consultations(patient)",
+    ]),
+    (2, "Index users, patients and doctors on their lookup columns", [
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_users_email ON users(email)",
+        "CREATE INDEX IF NOT EXISTS idx_patient_email ON patient(email)",
+        "CREATE INDEX IF NOT EXISTS idx_doctor_specialization ON doctor(specialization_id)",
+    ]),
+    (3, "Full-text search tables for the admin menu, kept in sync by triggers", [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS users_fts USING fts5(email, {FTS_OPTIONS})",
+        "INSERT INTO users_fts(rowid, email) SELECT id, email FROM users",
+        """CREATE TRIGGER IF NOT EXISTS users_fts_insert AFTER INSERT ON users BEGIN
+            INSERT INTO users_fts(rowid, email) VALUES (new.id, new.email);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS users_fts_update AFTER UPDATE OF id, email ON users BEGIN
+            DELETE FROM users_fts WHERE rowid = old.id;
+            INSERT INTO users_fts(rowid, email) VALUES (new.id, new.email);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS users_fts_delete AFTER DELETE ON users BEGIN
+            DELETE FROM users_fts WHERE rowid = old.id;
+        END""",
+
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS specialization_fts USING fts5(name, {FTS_OPTIONS})",
+        "INSERT INTO specialization_fts(rowid, name) SELECT id, name FROM specialization",
+        """CREATE TRIGGER IF NOT EXISTS specialization_fts_insert AFTER INSERT ON specialization BEGIN
+            INSERT INTO specialization_fts(rowid, name) VALUES (new.id, new.name);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS specialization_fts_update AFTER UPDATE OF id, name ON specialization BEGIN
+            DELETE FROM specialization_fts WHERE rowid = old.id;
+            INSERT INTO specialization_fts(rowid, name) VALUES (new.id, new.name);
+            -- Doctors are also found by the name of their specialization
+            UPDATE doctor_fts SET specialization = new.name
+            WHERE rowid IN (SELECT id FROM doctor WHERE specialization_id = new.id);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS specialization_fts_delete AFTER DELETE ON specialization BEGIN
+            DELETE FROM specialization_fts WHERE rowid = old.id;
+        END""",
+
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS doctor_fts USING fts5(name, email, specialization, {FTS_OPTIONS})",
+        """INSERT INTO doctor_fts(rowid, name, email, specialization)
+            SELECT d.id, d.name, d.email, s.name FROM doctor d LEFT JOIN specialization s ON s.id = d.specialization_id""",
+        """CREATE TRIGGER IF NOT EXISTS doctor_fts_insert AFTER INSERT ON doctor BEGIN
+            INSERT INTO doctor_fts(rowid, name, email, specialization)
+            VALUES (new.id, new.name, new.email, (SELECT name FROM specialization WHERE id = new.specialization_id));
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS doctor_fts_update AFTER UPDATE ON doctor BEGIN
+            DELETE FROM doctor_fts WHERE rowid = old.id;
+            INSERT INTO doctor_fts(rowid, name, email, specialization)
+            VALUES (new.id, new.name, new.email, (SELECT name FROM specialization WHERE id = new.specialization_id));
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS doctor_fts_delete AFTER DELETE ON doctor BEGIN
+            DELETE FROM doctor_fts WHERE rowid = old.id;
+        END""",
+
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS patient_fts USING fts5(name, email, phone, address, {FTS_OPTIONS})",
+        "INSERT INTO patient_fts(rowid, name, email, phone, address) SELECT id, name, email, phone, address FROM patient",
+        """CREATE TRIGGER IF NOT EXISTS patient_fts_insert AFTER INSERT ON patient BEGIN
+            INSERT INTO patient_fts(rowid, name, email, phone, address)
+            VALUES (new.id, new.name, new.email, new.phone, new.address);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS patient_fts_update AFTER UPDATE ON patient BEGIN
+            DELETE FROM patient_fts WHERE rowid = old.id;
+            INSERT INTO patient_fts(rowid, name, email, phone, address)
+            VALUES (new.id, new.name, new.email, new.phone, new.address);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS patient_fts_delete AFTER DELETE ON patient BEGIN
+            DELETE FROM patient_fts WHERE rowid = old.id;
+        END""",
+    ]),
+    (4, "Recurring consultation series", [
+        """CREATE TABLE IF NOT EXISTS consultation_series (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            patient INTEGER NOT NULL,
+            doctor INTEGER NOT NULL,
+            start_date DATE NOT NULL,
+            time TIME NOT NULL,
+            interval INTEGER NOT NULL CHECK (interval > 0),
+            unit TEXT NOT NULL CHECK (unit IN ('days', 'weeks')),
+            until DATE,
+            count INTEGER CHECK (count > 0),
+            FOREIGN KEY (patient) REFERENCES patient(id),
+            FOREIGN KEY (doctor) REFERENCES doctor(id)
+        )""",
+        "ALTER TABLE consultations ADD COLUMN series_id INTEGER REFERENCES consultation_series(id)",
+        "CREATE INDEX IF NOT EXISTS idx_consultations_series_date ON consultations(series_id, date)",
+    ]),
+    (5, "Weekly working hours of doctors", [
+        """CREATE TABLE IF NOT EXISTS doctor_schedule (
+            doctor INTEGER NOT NULL,
+            weekday INTEGER NOT NULL CHECK (weekday BETWEEN 0 AND 6), -- Monday is 0
+            start_time TIME NOT NULL,
+            end_time TIME NOT NULL CHECK (end_time > start_time),
+            PRIMARY KEY (doctor, weekday, start_time),
+            FOREIGN KEY (doctor) REFERENCES doctor(id)
+        )""",
+    ]),
+    (6, "Dashboard read model of consultations, kept current by triggers", [
+        # Every consultation with the names the dashboard shows, stored in dashboard order
+        # (the primary key), so a page is one range scan from today's date
+        """CREATE TABLE IF NOT EXISTS upcoming_consultations (
+            date TEXT NOT NULL,
+            time TEXT NOT NULL,
+            id INTEGER NOT NULL,          -- consultations.id
+            doctor_id INTEGER NOT NULL,
+            patient_id INTEGER NOT NULL,
+            doctor TEXT,
+            specialization TEXT,
+            patient TEXT,
+            start TEXT GENERATED ALWAYS AS (date || ' ' || time) STORED,
+            PRIMARY KEY (date, time, id)
+        ) WITHOUT ROWID""",
+        "CREATE INDEX IF NOT EXISTS idx_upcoming_consultations_doctor ON upcoming_consultations(doctor_id)",
+        "CREATE INDEX IF NOT EXISTS idx_upcoming_consultations_patient ON upcoming_consultations(patient_id)",
+        UPCOMING_ROWS_INSERT.format(where="1"),
+
+        f"""CREATE TRIGGER IF NOT EXISTS upcoming_consultations_insert AFTER INSERT ON consultations BEGIN
+            {UPCOMING_ROWS_INSERT.format(where="c.id = new.id")};
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS upcoming_consultations_update
+        AFTER UPDATE OF id, patient, doctor, date, time ON consultations BEGIN
+            DELETE FROM upcoming_consultations WHERE date = old.date AND time = old.time AND id = old.id;
+            {UPCOMING_ROWS_INSERT.format(where="c.id = new.id")};
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS upcoming_consultations_delete AFTER DELETE ON consultations BEGIN
+            DELETE FROM upcoming_consultations WHERE date = old.date AND time = old.time AND id = old.id;
+        END""",
+
+        # A consultation only has a row while its doctor, specialization and patient exist (inner join)
+        f"""CREATE TRIGGER IF NOT EXISTS upcoming_doctor_insert AFTER INSERT ON doctor BEGIN
+            {UPCOMING_ROWS_INSERT.format(where="c.doctor = new.id")};
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS upcoming_doctor_update AFTER UPDATE OF id, name, specialization_id ON doctor BEGIN
+            DELETE FROM upcoming_consultations WHERE doctor_id = old.id;
+            {UPCOMING_ROWS_INSERT.format(where="c.doctor = new.id")};
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS upcoming_doctor_delete AFTER DELETE ON doctor BEGIN
+            DELETE FROM upcoming_consultations WHERE doctor_id = old.id;
+        END""",
+
+        f"""CREATE TRIGGER IF NOT EXISTS upcoming_patient_insert AFTER INSERT ON patient BEGIN
+            {UPCOMING_ROWS_INSERT.format(where="c.patient = new.id")};
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS upcoming_patient_update AFTER UPDATE OF id, name ON patient BEGIN
+            DELETE FROM upcoming_consultations WHERE patient_id = old.id;
+            {UPCOMING_ROWS_INSERT.format(where="c.patient = new.id")};
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS upcoming_patient_delete AFTER DELETE ON patient BEGIN
+            DELETE FROM upcoming_consultations WHERE patient_id = old.id;
+        END""",
+
+        f"""CREATE TRIGGER IF NOT EXISTS upcoming_specialization_insert AFTER INSERT ON specialization BEGIN
+            {UPCOMING_ROWS_INSERT.format(where="d.specialization_id = new.id")};
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS upcoming_specialization_update AFTER UPDATE OF id, name ON specialization BEGIN
+            DELETE FROM upcoming_consultations
+            WHERE doctor_id IN (SELECT id FROM doctor WHERE specialization_id = old.id);
+            {UPCOMING_ROWS_INSERT.format(where="d.specialization_id = new.id")};
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS upcoming_specialization_delete AFTER DELETE ON specialization BEGIN
+            DELETE FROM upcoming_consultations
+            WHERE doctor_id IN (SELECT id FROM doctor WHERE specialization_id = old.id);
+        END""",
+    ]),
+    (7, "Index consultations by patient and time, and log their changes for other workstations", [
+        # The double-booking check looks up both the doctor's and the patient's consultations around a time
+        "CREATE INDEX IF NOT EXISTS idx_consultations_patient_date_time ON consultations(patient, date, time)",
+        "DROP INDEX IF EXISTS idx_consultations_patient",  # A prefix of the new index
+        # IDs of the consultations written since each workstation loaded its availability engine,
+        # in commit order (AUTOINCREMENT: numbers are never reused, only the oldest are pruned)
+        """CREATE TABLE IF NOT EXISTS consultation_changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            consultation_id INTEGER NOT NULL
+        )""",
+        f"""CREATE TRIGGER IF NOT EXISTS consultation_changes_insert AFTER INSERT ON consultations BEGIN
+            {_LOG_CHANGE.format(id="new.id")}
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS consultation_changes_update
+        AFTER UPDATE OF id, patient, doctor, date, time ON consultations BEGIN
+            INSERT INTO consultation_changes (consultation_id) SELECT old.id WHERE old.id <> new.id;
+            {_LOG_CHANGE.format(id="new.id")}
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS consultation_changes_delete AFTER DELETE ON consultations BEGIN
+            {_LOG_CHANGE.format(id="old.id")}
+        END""",
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version() -> int:
+    """
+    Get the schema version recorded in the database.
+
+    Returns:
+        int: The version of the last migration applied (0 for a fresh database)
+    """
+    return fetchone("PRAGMA user_version")[0]
+
+
+def migrate() -> list:
+    """
+    Apply every migration newer than the database's schema version.
+
+    Each migration runs in its own transaction together with the version bump,
+    so a failing migration leaves the database at the previous version.
+
+    Returns:
+        list: Versions of the migrations that were applied (empty if up to date)
+    """
+    current = get_schema_version()
+    applied = []
+    for version, description, statements in MIGRATIONS:
+        if version <= current:
+            continue
+        with transaction() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+            # PRAGMA does not accept placeholders; version is an int from MIGRATIONS
+            cursor.execute(f"PRAGMA user_version = {int(version)}")
+        applied.append(version)
+    if applied:
+        # Generated queries may depend on the old schema
+        from database.schema import invalidate
+        invalidate()
+    return applied
@@ -0,0 +1,96 @@
+"""
+Dashboard read model: the upcoming_consultations table.
+
+Migration 6 stores every consultation joined with the names of its doctor,
+specialization and patient, with the dashboard's "date time" column already
+built, in (date, time, id) order. Triggers on consultations, doctor, patient
+and specialization keep it current, so a dashboard page (see
+SQLiteStorage.upcoming) is one range scan over the table's primary key
+instead of a four-way join. Past consultations stay in the table; they are
+simply before the range the dashboard reads.
+
+check() compares the table with the join it caches and rebuild() recreates
+it from that join, e.g. after rows were written with the triggers dropped
+or by a tool that bypassed them:
+
+    python -m database.read_model [--db clinic.db] [--repair]
+"""
+import argparse
+import sys
+
+from database.migrations import UPCOMING_ROWS_INSERT, UPCOMING_ROWS_SELECT
+
+TABLE = "upcoming_consultations"
+
+# Stored columns, in the order of UPCOMING_ROWS_SELECT
+COLUMNS = ("date", "time", "id", "doctor_id", "patient_id", "doctor", "specialization", "patient")
+
+
+def check(limit: int = 100) -> dict:
+    """
+    Compare the read model with the join it caches.
+
+    Args:
+        limit (int): Maximum number of consultation IDs listed per kind of difference
+
+    Returns:
+        dict: "consistent" (bool); "missing", the IDs of consultations whose row is
+            absent or out of date; "stale", the IDs of rows that match no
+            consultation as it is now (an out-of-date row is in both lists);
+            "missing_count" and "stale_count"
+    """
+    from database.connection import fetchall, fetchone
+    source = UPCOMING_ROWS_SELECT.format(where="1")
+    stored = f"SELECT {', '.join(COLUMNS)} FROM {TABLE}"
+    result = {}
+    for kind, difference in (("missing", f"{source} EXCEPT {stored}"), ("stale", f"{stored} EXCEPT {source}")):
+        result[kind + "_count"] = fetchone(f"SELECT COUNT(*) FROM ({difference})")[0]
+        result[kind] = [row[0] for row in fetchall(f"SELECT id FROM ({difference}) ORDER BY id LIMIT ?", (limit,))]
+    result["consistent"] = not (result["missing_count"] or result["stale_count"])
+    return result
+
+
+def rebuild() -> int:
+    """
+    Recreate the read model from the join, in one transaction.
+
+    Returns:
+        int: Number of rows in the rebuilt table
+    """
+    from database.connection import fetchone, transaction
+    with transaction() as cursor:
+        cursor.execute(f"DELETE FROM {TABLE}")
+        cursor.execute(UPCOMING_ROWS_INSERT.format(where="1"))
+    return fetchone(f"SELECT COUNT(*) FROM {TABLE}")[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the dashboard read model against the tables it caches.")
+    parser.add_argument("--db", help="database file (default: database/clinic.db)")
+    parser.add_argument("--repair", action="store_true", help="rebuild the read model if it is inconsistent")
+    args = parser.parse_args()
+
+    from database import connection
+    from database.migrations import migrate
+    if args.db:
+        connection.set_database_path(args.db)
+    try:
+        migrate()
+        result = check()
+        if result["consistent"]:
+            print(f"{TABLE} is consistent")
+            return
+        print(f"{TABLE}: {result['missing_count']} consultation(s) missing or out of date, "
+              f"{result['stale_count']} stale row(s)")
+        for kind in ("missing", "stale"):
+            if result[kind]:
+                print(f"  {kind}: {', '.join(str(id) for id in result[kind])}")
+        if not args.repair:
+            sys.exit(1)
+        print(f"Rebuilt {TABLE}: {rebuild()} rows")
+    finally:
+        connection.close_all_connections()
+
+
+if __name__ == "__main__":
+    main()
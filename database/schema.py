@@ -0,0 +1,128 @@
+"""
+Schema registry: foreign keys and generated SELECT statements, computed once.
+
+utils.build_query needs every foreign key of a table to decide which tables to
+JOIN. Instead of introspecting the database on every call, the registry reads
+the foreign keys of all tables in one pass the first time they are needed and
+memoizes each generated statement per (table, columns). Migrations and
+switching databases invalidate it, so the next call sees the new schema.
+"""
+import threading
+
+# Column shown instead of the raw ID when a foreign key points at these tables
+DISPLAY_COLUMNS = {
+    'specialization': 'name',
+    'doctor': 'name',
+    'patient': 'name'
+}
+
+
+class SchemaRegistry:
+    """Holds the foreign keys of every table and the SELECT statements generated from them."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._foreign_keys = None  # table name -> list of foreign key dicts
+        self._selects = {}         # (table, columns) -> SELECT statement
+
+    def invalidate(self):
+        """Forget everything so the schema is read again on next use."""
+        with self._lock:
+            self._foreign_keys = None
+            self._selects = {}
+
+    def _load(self) -> dict:
+        """Read the foreign keys of every table in a single query."""
+        from database.connection import fetchall
+        rows = fetchall("""
+            SELECT m.name, fk."table", fk."from", fk."to"
+            FROM sqlite_master m
+            JOIN pragma_foreign_key_list(m.name) fk
+            WHERE m.type = 'table'
+        """)
+        foreign_keys = {}
+        for table, to_table, from_col, to_col in rows:
+            foreign_keys.setdefault(table, []).append({
+                'from_col': from_col,    # Column in current table
+                'to_table': to_table,    # Referenced table
+                'to_col': to_col         # Referenced column
+            })
+        return foreign_keys
+
+    def foreign_keys(self, table_name: str) -> list:
+        """
+        Get the foreign keys of a table.
+
+        Args:
+            table_name (str): Name of the table
+
+        Returns:
+            list: Dictionaries with from_col, to_table and to_col (empty if none)
+        """
+        foreign_keys = self._foreign_keys
+        if foreign_keys is None:
+            with self._lock:
+                if self._foreign_keys is None:
+                    self._foreign_keys = self._load()
+                foreign_keys = self._foreign_keys
+        return foreign_keys.get(table_name, [])
+
+    def build_select(self, table_name: str, columns: tuple) -> str:
+        """
+        Get the SELECT statement for a table's columns, joining the tables its foreign keys point to.
+
+        See utils.build_query for the format of the generated statement.
+        """
+        key = (table_name, tuple(columns))
+        query = self._selects.get(key)
+        if query is None:
+            query = self._generate_select(table_name, columns)
+            self._selects[key] = query
+        return query
+
+    def _generate_select(self, table_name: str, columns: tuple) -> str:
+        fks = self.foreign_keys(table_name)
+
+        col_refs = []
+        referenced_tables = {}
+
+        # Build column references and track referenced tables
+        for col in columns:
+            fk = next((fk for fk in fks if fk['from_col'] == col), None)
+            if fk:
+                # Use the display column from the mapping if available
+                desired_col = DISPLAY_COLUMNS.get(fk['to_table'], fk['to_col'])
+                col_refs.append(f"{fk['to_table']}.{desired_col}")
+                if fk['to_table'] not in referenced_tables:
+                    referenced_tables[fk['to_table']] = []
+                referenced_tables[fk['to_table']].append(fk['from_col'])
+            else:
+                col_refs.append(f"{table_name}.{col}")
+
+        # If no foreign keys are referenced
+        if not referenced_tables:
+            # Strip table prefixes for columns without foreign keys
+            columns_str = ', '.join(col.replace(f"{table_name}.", "") for col in col_refs)
+            return f"SELECT {columns_str} FROM {table_name}"
+
+        query = f"SELECT {', '.join(col_refs)} FROM {table_name}"
+
+        # Add JOINs for each referenced table
+        for to_table, from_cols in referenced_tables.items():
+            fk = next(fk for fk in fks if fk['to_table'] == to_table)
+            query += f" JOIN {to_table} ON {to_table}.{fk['to_col']} = {table_name}.{from_cols[0]}"
+
+        return query
+
+
+_registry = SchemaRegistry()
+
+
+def get_registry() -> SchemaRegistry:
+    """Get the application's schema registry."""
+    return _registry
+
+
+def invalidate():
+    """Invalidate the application's schema registry (called after migrations and database switches)."""
+    _registry.invalidate()
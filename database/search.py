@@ -0,0 +1,123 @@
+"""
+Full-text search over the tables managed from the admin menu.
+
+Migration 3 creates an FTS5 table next to users, doctor, specialization and
+patient, kept in sync by triggers. search_items in the admin menu queries them
+with MATCH and ranks the results with bm25 instead of OR-ing a LIKE over every
+column. Input is never spliced into SQL: match_expression turns it into an FTS5
+query string that is bound as a parameter.
+
+check() runs that search on every indexed table and tells whether a known row
+is found, so a broken search query shows up before a user tries it:
+
+    python -m database.search [--db clinic.db]
+"""
+import argparse
+import re
+import sys
+
+# Table -> FTS5 table indexing its searchable columns (see migration 3)
+FTS_TABLES = {
+    "users": "users_fts",
+    "doctor": "doctor_fts",
+    "specialization": "specialization_fts",
+    "patient": "patient_fts",
+}
+
+# Columns check() searches each table with, like the admin menu's manage windows
+CHECKED_COLUMNS = {
+    "users": ("id", "email", "password", "is_admin"),
+    "doctor": ("id", "name", "email", "specialization_id"),
+    "specialization": ("id", "name"),
+    "patient": ("id", "name", "email", "phone"),
+}
+
+# Rows of each search's results check() looks through
+CHECKED_ROWS = 100
+
+_WORD = re.compile(r"\w+")
+
+
+def match_expression(text: str):
+    """
+    Turn what the user typed into an FTS5 MATCH expression.
+
+    Every word becomes a quoted prefix query and all words must match, so
+    "ana sil" finds "Ana Silva" and "ana@mail.com" finds that email. Quoting
+    keeps FTS5 operators and punctuation in the input from being interpreted.
+
+    Args:
+        text (str): The search text
+
+    Returns:
+        str: The MATCH expression, or None if the text has no words
+    """
+    words = _WORD.findall(text)
+    if not words:
+        return None
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def check(services=None) -> dict:
+    """
+    Run the admin search of every table with a full-text index, looking for one of its rows.
+
+    The first row of each FTS table is searched for by the words of its first
+    column, through the same page fetcher AdminMenu.search_source_for gives
+    the grid, and must come back among the results.
+
+    Args:
+        services (Services): Container to search with (defaults to get_services())
+
+    Returns:
+        dict: table -> {"term": the search, "found": bool, or None for an empty table,
+            "error": the exception message, or None}
+    """
+    import sqlite3
+    from database.connection import fetchone
+    if services is None:
+        from services import get_services
+        services = get_services()
+
+    result = {}
+    for table, fts_table in FTS_TABLES.items():
+        sample = fetchone(f"SELECT rowid, * FROM {fts_table} ORDER BY rowid LIMIT 1")
+        if sample is None:
+            result[table] = {"term": None, "found": None, "error": None}
+            continue
+        term = " ".join(_WORD.findall(sample[1] or ""))
+        try:
+            rows = services.records(table).pager(CHECKED_COLUMNS[table], term)(None, CHECKED_ROWS)
+        except sqlite3.Error as error:
+            result[table] = {"term": term, "found": False, "error": str(error)}
+            continue
+        result[table] = {"term": term, "found": any(row[0] == sample[0] for row in rows), "error": None}
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the admin search of every table with a full-text index.")
+    parser.add_argument("--db", help="database file (default: database/clinic.db)")
+    args = parser.parse_args()
+
+    from database import connection
+    from database.migrations import migrate
+    if args.db:
+        connection.set_database_path(args.db)
+    try:
+        migrate()
+        failed = False
+        for table, outcome in check().items():
+            if outcome["found"] is None:
+                print(f"{table:<16}empty")
+                continue
+            failed = failed or not outcome["found"]
+            status = "ok" if outcome["found"] else outcome["error"] or "row not found"
+            print(f"{table:<16}{outcome['term']!r}: {status}")
+    finally:
+        connection.close_all_connections()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
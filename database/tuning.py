@@ -0,0 +1,193 @@
+"""
+SQLite performance profile applied to every connection.
+
+A profile is a set of PRAGMA values (journal mode, synchronous level, page
+cache, memory-mapped I/O, busy timeout and temp storage). The active profile is
+resolved in this order, later sources overriding earlier ones:
+
+1. The preset named by ``profile`` (default: "balanced")
+2. Individual keys in the [sqlite] section of constants.PATH_TO_DB_CONFIG
+3. Environment variables: CLINIC_DB_PROFILE selects the preset and
+   CLINIC_DB_<KEY> (e.g. CLINIC_DB_BUSY_TIMEOUT=10000) overrides one key
+"""
+import configparser
+import os
+
+# Built-in presets. cache_size follows SQLite's convention: negative values are KiB.
+PRESETS = {
+    # SQLite's own defaults: rollback journal, full fsync on every commit
+    "default": {
+        "journal_mode": "delete",
+        "synchronous": "full",
+        "cache_size": -2000,
+        "mmap_size": 0,
+        "busy_timeout": 5000,
+        "temp_store": "default",
+    },
+    # WAL lets readers run while a writer commits; normal sync is still crash-safe in WAL mode
+    "balanced": {
+        "journal_mode": "wal",
+        "synchronous": "normal",
+        "cache_size": -16000,
+        "mmap_size": 64 * 1024 * 1024,
+        "busy_timeout": 5000,
+        "temp_store": "memory",
+    },
+    # Fastest, but the last commits can be lost on power failure
+    "throughput": {
+        "journal_mode": "wal",
+        "synchronous": "off",
+        "cache_size": -64000,
+        "mmap_size": 256 * 1024 * 1024,
+        "busy_timeout": 5000,
+        "temp_store": "memory",
+    },
+}
+
+DEFAULT_PRESET = "balanced"
+
+# Accepted values for the text settings
+JOURNAL_MODES = {"delete", "truncate", "persist", "memory", "wal", "off"}
+SYNCHRONOUS_LEVELS = {"off", "normal", "full", "extra"}
+TEMP_STORES = {"default", "file", "memory"}
+
+ENV_PREFIX = "CLINIC_DB_"
+
+_active_profile = None
+
+
+def _validate(profile: dict) -> dict:
+    """
+    Check and normalize every value of a profile.
+
+    Args:
+        profile (dict): Raw profile values (strings from files/env or native values)
+
+    Returns:
+        dict: The profile with lower-cased text settings and int numeric settings
+
+    Raises:
+        ValueError: If a setting is unknown or has an invalid value
+    """
+    unknown = set(profile) - set(PRESETS["default"])
+    if unknown:
+        raise ValueError(f"Unknown SQLite setting(s): {', '.join(sorted(unknown))}")
+
+    result = {}
+    for key, value in profile.items():
+        if key in ("cache_size", "mmap_size", "busy_timeout"):
+            result[key] = int(value)
+        else:
+            result[key] = str(value).strip().lower()
+
+    allowed = {
+        "journal_mode": JOURNAL_MODES,
+        "synchronous": SYNCHRONOUS_LEVELS,
+        "temp_store": TEMP_STORES,
+    }
+    for key, values in allowed.items():
+        if key in result and result[key] not in values:
+            raise ValueError(f"Invalid {key}: {result[key]!r} (expected one of {', '.join(sorted(values))})")
+    return result
+
+
+def load_profile(config_path: str = None, environ=None) -> dict:
+    """
+    Resolve the SQLite profile from the presets, the config file and the environment.
+
+    Args:
+        config_path (str): Path to the INI file (defaults to constants.PATH_TO_DB_CONFIG)
+        environ (dict): Environment to read overrides from (defaults to os.environ)
+
+    Returns:
+        dict: Complete profile with every setting of PRESETS["default"]
+
+    Raises:
+        ValueError: If the preset name or any setting is invalid
+    """
+    if config_path is None:
+        from constants import PATH_TO_DB_CONFIG
+        config_path = PATH_TO_DB_CONFIG
+    if environ is None:
+        environ = os.environ
+
+    overrides = {}
+    preset_name = DEFAULT_PRESET
+
+    # Config file (optional)
+    parser = configparser.ConfigParser()
+    if parser.read(config_path) and parser.has_section("sqlite"):
+        section = dict(parser.items("sqlite"))
+        preset_name = section.pop("profile", preset_name)
+        overrides.update(section)
+
+    # Environment variables win over the file
+    preset_name = environ.get(ENV_PREFIX + "PROFILE", preset_name)
+    for key in PRESETS["default"]:
+        env_value = environ.get(ENV_PREFIX + key.upper())
+        if env_value is not None:
+            overrides[key] = env_value
+
+    if preset_name not in PRESETS:
+        raise ValueError(f"Unknown SQLite profile: {preset_name!r} (expected one of {', '.join(PRESETS)})")
+
+    profile = dict(PRESETS[preset_name])
+    profile.update(_validate(overrides))
+    return profile
+
+
+def get_profile() -> dict:
+    """
+    Get the profile applied to new connections, loading it on first use.
+
+    Returns:
+        dict: The active profile
+    """
+    global _active_profile
+    if _active_profile is None:
+        _active_profile = load_profile()
+    return _active_profile
+
+
+def set_profile(profile):
+    """
+    Replace the profile applied to new connections.
+
+    Existing connections keep their settings; call
+    database.connection.close_all_connections() to reconnect with the new one.
+
+    Args:
+        profile (str | dict | None): A preset name, a full or partial profile
+            (missing keys come from the "default" preset), or None to reload
+            from the config file and environment
+    """
+    global _active_profile
+    if profile is None:
+        _active_profile = None
+    elif isinstance(profile, str):
+        if profile not in PRESETS:
+            raise ValueError(f"Unknown SQLite profile: {profile!r}")
+        _active_profile = dict(PRESETS[profile])
+    else:
+        _active_profile = dict(PRESETS["default"])
+        _active_profile.update(_validate(profile))
+
+
+def apply_profile(conn, profile: dict = None):
+    """
+    Apply a profile's PRAGMAs to a connection.
+
+    Args:
+        conn (sqlite3.Connection): The connection to configure
+        profile (dict): Profile to apply (defaults to the active profile)
+    """
+    if profile is None:
+        profile = get_profile()
+    # busy_timeout first so switching the journal mode waits for other writers instead of failing
+    conn.execute(f"PRAGMA busy_timeout = {int(profile['busy_timeout'])}")
+    if conn.execute("PRAGMA journal_mode").fetchone()[0] != profile["journal_mode"]:
+        conn.execute(f"PRAGMA journal_mode = {profile['journal_mode']}")
+    conn.execute(f"PRAGMA synchronous = {profile['synchronous']}")
+    conn.execute(f"PRAGMA cache_size = {int(profile['cache_size'])}")
+    conn.execute(f"PRAGMA mmap_size = {int(profile['mmap_size'])}")
+    conn.execute(f"PRAGMA temp_store = {profile['temp_store']}")
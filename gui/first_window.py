@@ -1,7 +1,6 @@
 import tkinter as tk
 from tkinter import ttk
 from constants import PATH_TO_IMAGES
-import utils
 
 class FirstWindow:
     """The `FirstWindow` class represents the main window of the Health Center application. It sets up the initial window, including the application title, size, and a main frame. The class also loads and displays the company logo, and creates a login button that opens the login window when clicked."""
@@ -1,8 +1,10 @@
 import tkinter as tk
 import tkinter.ttk as ttk
+from time import perf_counter
 from tkinter import messagebox
-from gui.first_window import FirstWindow
-from gui.menu import Menu
+from classes.metrics import get_registry
+
+LOGINS = get_registry().histogram("clinic_login_seconds", "Time to check a user's credentials", ("outcome",))
 
 
 class LoginWindow:
@@ -34,19 +36,33 @@ class LoginWindow:
         self.button_login.pack(pady=10)
         
     def check_login(self):
-        """Validates credentials and changes layout if login is successful."""
+        """Validates credentials on the executor and changes layout if login is successful."""
+        if str(self.button_login["state"]) == "disabled":
+            return  # Already checking (e.g. Enter pressed twice)
         email = self.entry_user.get()
-        
-        from hashlib import sha256
-        password = sha256(self.entry_password.get().encode()).hexdigest()
 
-        from classes.user import User
-        user = User(email, password)
-        
-        if user.exists_in_db():
-            messagebox.showinfo("Login Successful", f"Welcome {email}!")
-            self.login_frame.destroy()
-            from gui.menu import Menu
-            Menu(self.root, admin=user.is_admin())
-        else:
-            messagebox.showerror("Error", "Invalid credentials. Try again.")
\ No newline at end of file
+        # One query fetches the hash and the role; the session then answers every role check.
+        # Hashing the password is slow on purpose, so it runs off the Tk thread.
+        from database.executor import get_executor
+        from services import get_services
+        started = perf_counter()
+
+        def done(session):
+            LOGINS.labels("failure" if session is None else "success").observe(perf_counter() - started)
+            if session is not None:
+                messagebox.showinfo("Login Successful", f"Welcome {session.email}!")
+                self.login_frame.destroy()
+                from gui.menu import Menu
+                Menu(self.root, session)
+            else:
+                self.button_login.config(state="normal")
+                messagebox.showerror("Error", "Invalid credentials. Try again.")
+
+        def failed(error):
+            self.button_login.config(state="normal")
+            messagebox.showerror("Error", f"Could not check the credentials: {error}")
+
+        self.button_login.config(state="disabled")
+        get_executor(self.root).submit(
+            get_services().auth.authenticate, email, self.entry_password.get(), callback=done, error_callback=failed
+        )
\ No newline at end of file
@@ -1,15 +1,29 @@
+import logging
 import tkinter as tk
 import tkinter.ttk as ttk
+from time import perf_counter
 from tkinter import messagebox
-from classes.user import User
+from classes.metrics import get_registry
 from constants import *
 
+logger = logging.getLogger(__name__)
+
+DASHBOARD_REFRESH = get_registry().histogram(
+    "clinic_dashboard_refresh_seconds", "Time from refreshing the consultations dashboard to showing the rows"
+)
+SEARCHES = get_registry().histogram(
+    "clinic_search_seconds", "Time from running a search to showing its results", ("source",)
+)
+SAVES = get_registry().histogram("clinic_save_seconds", "Time to save a change to the database", ("action",))
+BOOKING_CONFLICTS = get_registry().counter(
+    "clinic_booking_conflicts_total", "Bookings refused because the doctor or the patient was already booked"
+)
 
 
 class Menu:
-    def __init__(self, root, admin=False):
+    def __init__(self, root, session):
         self.root = root
-        self.admin = admin
+        self.session = session  # services.Session of the logged-in user, consulted for role checks
         self.num_btns = 0
         self.root.title("Menu")
         self.root.geometry("1000x400")
@@ -19,6 +33,13 @@ class Menu:
         self.root.rowconfigure(0, weight=1)
         self.root.rowconfigure(1, weight=0)
 
+        # Queries for the tables run on a worker thread so the window never freezes
+        from database.executor import get_executor
+        self.executor = get_executor(self.root)
+        # Every read and write goes through the service layer
+        from services import get_services
+        self.services = get_services()
+
         self.show_dashboard()
 
     def show_dashboard(self):
@@ -41,13 +62,14 @@ class Menu:
         # List of buttons and their respective commands
         buttons = [
             ("Add Consultation", self.add_consultation),
+            ("Next Available", self.find_next_available),
             ("Edit", self.edit_consultation),
             ("Delete", self.delete_consultations),
             ("Add Patient", self.add_patient),
         ]
-        if self.admin:
+        if self.session.is_admin:
             from gui.menu_admin import AdminMenu
-            buttons.append(("Admin", lambda: AdminMenu(self.root)))
+            buttons.append(("Admin", lambda: AdminMenu(self.root, self.session)))
 
         # Add buttons to sub-frame and center them..
         for i, (text, command) in enumerate(buttons):
@@ -56,76 +78,80 @@ class Menu:
 
     def create_table(self):
         """Creates the consultation table."""
-        # Frame for the table
-        table_frame = ttk.Frame(self.root)
-        table_frame.grid(row=0, column=0, sticky="nsew")
+        # Virtualized table: only the pages of rows near the viewport are loaded into Tk
+        from classes.table import ConsultationTable
+        self.table = ConsultationTable(self.root, executor=self.executor)
+        self.table.grid(row=0, column=0, sticky="nsew")
+    
+        self.load_appointments()
 
-        # Configure the frame to expand
-        table_frame.columnconfigure(0, weight=1)
-        table_frame.rowconfigure(0, weight=1)
+    def load_appointments(self):
+        started = perf_counter()
+        # Upcoming consultations only, sorted by date and time in SQL (see ConsultationTable.fetch_page).
+        # After an edit only the rows that changed are touched; selection and scroll position are kept.
+        # The page is fetched on the executor; the grid logs a failed fetch.
+        self.table.refresh(done=lambda: DASHBOARD_REFRESH.observe(perf_counter() - started))
 
-        # Create the treeview and configure columns
-        self.table = ttk.Treeview(table_frame, columns=CONSULTATIONS_COLUMNS, show="headings")
-        for col in CONSULTATIONS_COLUMNS:
-            self.table.heading(col, text=col)
 
+    def bind_picker(self, entry, listbox, table, show_email=False):
+        """
+        Fill a Listbox with the doctors or patients matching what is typed in an entry.
 
-        # Scrollbars for the table
-        scrollbar_y = ttk.Scrollbar(table_frame, orient="vertical", command=self.table.yview)
-        scrollbar_x = ttk.Scrollbar(table_frame, orient="horizontal", command=self.table.xview)
-        self.table.configure(yscroll=scrollbar_y.set, xscroll=scrollbar_x.set)
+        Matches come from the in-memory search index (ranked and capped at
+        MAX_PICKER_RESULTS). Searches are debounced and run on the executor, and
+        only the result for the latest input is shown.
 
-        # Table and scrollbars layout
-        self.table.grid(row=0, column=0, sticky="nsew")
-        scrollbar_y.grid(row=0, column=1, sticky="ns")
-        scrollbar_x.grid(row=1, column=0, sticky="ew")
-    
-        self.load_appointments()
+        Args:
+            entry (ttk.Entry): Entry the user types in
+            listbox (tk.Listbox): Listbox showing the matches
+            table (str): "doctor" or "patient"
+            show_email (bool): Show matches as "name (email)" instead of just the name
 
-    def load_appointments(self):
-        try:
-            import sqlite3
-            from constants import PATH_TO_DB
-            with sqlite3.connect(PATH_TO_DB) as conn:
-                cursor = conn.cursor()
-                # This query fetches all consultations sorted by date and time
-                query = """
-                    SELECT c.id, d.name, s.name, p.name, c.date || ' ' || c.time
-                    FROM consultations c
-                    JOIN doctor d ON c.doctor = d.id
-                    JOIN specialization s ON d.specialization_id = s.id
-                    JOIN patient p ON c.patient = p.id
-                """
-                #print("Executing query:", query)
-                cursor.execute(query)
-                rows = cursor.fetchall()
-                from datetime import datetime,date
-                
-                # Get today's date
-                today = date.today()
-
-                # Filter out past consultations
-                filtered_rows = [
-                    row for row in rows
-                    if datetime.strptime(row[-1], "%Y-%m-%d %H:%M").date() >= today
-                ]
-
-                # Sort filtered rows by date and time
-                filtered_rows.sort(key=lambda row: datetime.strptime(row[-1], "%Y-%m-%d %H:%M"))
-                #print(f"Number of rows fetched: {len(rows)}")
-
-                # Clear existing items
-                for item in self.table.get_children():
-                    self.table.delete(item)
-                    
-                # Insert new data
-                for row in filtered_rows:
-                    #print(f"Inserting row: {row}")
-                    self.table.insert('', 'end', values=row)
-                    
-        except sqlite3.Error as e:
-            print("Database error:", e)
+        Returns:
+            SearchController: The controller, e.g. to fill the list right away with run_now
+        """
+        from classes.search_controller import SearchController
+        people = self.services.records(table)
+
+        def search(term):
+            return people.typeahead(term, MAX_PICKER_RESULTS)
+
+        def show(matches):
+            listbox.delete(0, tk.END)
+            if show_email:
+                listbox.insert(tk.END, *(f"{name} ({email})" for _, name, email in matches))
+            else:
+                listbox.insert(tk.END, *(name for _, name, _ in matches))
+
+        controller = SearchController(
+            listbox, search, show, executor=self.executor, latency=SEARCHES.labels("picker_" + table)
+        )
+        controller.bind(entry)
+        return controller
+
+    def check_availability(self, doctor, patient, date, time, consultation_id=None) -> bool:
+        """
+        Check that neither the doctor nor the patient is already booked at a time, telling the user if they are.
 
+        Args:
+            doctor (int): ID of the doctor
+            patient (int): ID of the patient
+            date (str): Date as YYYY-MM-DD
+            time (str): Time as HH:MM
+            consultation_id (int): ID of the consultation being edited, which does not clash with itself
+
+        Returns:
+            bool: True if the consultation can be booked
+        """
+        from services import BookingError
+        try:
+            self.services.consultations.check(doctor, patient, date, time, ignore=consultation_id)
+        except BookingError as e:
+            if e.conflicts:
+                BOOKING_CONFLICTS.inc()
+            messagebox.showerror("Unavailable" if e.conflicts else "Error", str(e))
+            return False
+        return True
 
     def edit_consultation(self):
         """
@@ -137,13 +163,12 @@ class Menu:
         consultation. The current values are pre-filled in the respective
         fields for easy editing.
         """
-        selected_items = self.table.selection()
-        if not selected_items:
+        selected_rows = self.table.selected_rows()
+        if not selected_rows:
             messagebox.showwarning("No Selection", "Please select a consultation to edit")
             return
             
-        selected_item = selected_items[0]
-        consultation_data = self.table.item(selected_item)['values']
+        consultation_data = selected_rows[0]
         consultation_id = consultation_data[0]
         
         edit_window = tk.Toplevel()
@@ -212,32 +237,9 @@ class Menu:
         date_entry.bind('<KeyRelease>', format_date)
         time_entry.bind('<KeyRelease>', format_time)
 
-        def update_doctor_list(*args):
-            search_term = doctor_search.get().lower()
-            doctor_listbox.delete(0, tk.END)
-            import sqlite3
-            from constants import PATH_TO_DB
-            with sqlite3.connect(PATH_TO_DB) as conn:
-                cursor = conn.cursor()
-                cursor.execute("SELECT name FROM doctor WHERE LOWER(name) LIKE ?", (f'%{search_term}%',))
-                doctors = cursor.fetchall()
-                for doctor in doctors:
-                    doctor_listbox.insert(tk.END, doctor[0])
-
-        def update_patient_list(*args):
-            search_term = patient_search.get().lower()
-            patient_listbox.delete(0, tk.END)
-            import sqlite3
-            from constants import PATH_TO_DB
-            with sqlite3.connect(PATH_TO_DB) as conn:
-                cursor = conn.cursor()
-                cursor.execute("SELECT name FROM patient WHERE LOWER(name) LIKE ?", (f'%{search_term}%',))
-                patients = cursor.fetchall()
-                for patient in patients:
-                    patient_listbox.insert(tk.END, patient[0])
-
-        doctor_search.bind('<KeyRelease>', update_doctor_list)
-        patient_search.bind('<KeyRelease>', update_patient_list)
+        # Search as the user types, debounced and off the Tk thread
+        doctor_picker = self.bind_picker(doctor_search, doctor_listbox, "doctor")
+        patient_picker = self.bind_picker(patient_search, patient_listbox, "patient")
 
         def on_doctor_select(event):
             if doctor_listbox.curselection():
@@ -255,71 +257,203 @@ class Menu:
         patient_listbox.bind('<<ListboxSelect>>', on_patient_select)
 
         # Initial population of lists
-        update_doctor_list()
-        update_patient_list()
+        doctor_picker.run_now(doctor_search.get())
+        patient_picker.run_now(patient_search.get())
+
+        # A consultation from a recurring series can pass its new time and doctor on to the rest of the series
+        from classes.series import get_series_id
+        series_id = get_series_id(consultation_id)
+        apply_to_series = tk.BooleanVar(value=False)
+        if series_id is not None:
+            ttk.Checkbutton(
+                edit_window,
+                text="Apply time and doctor to later occurrences",
+                variable=apply_to_series
+            ).grid(row=4, column=0, columnspan=2, padx=5, pady=5)
 
         def save_changes():
-            try:
-                import sqlite3
-                from constants import PATH_TO_DB
-                with sqlite3.connect(PATH_TO_DB) as conn:
-                    cursor = conn.cursor()
-                    cursor.execute(f"SELECT id FROM doctor WHERE name = ?", (doctor_search.get(),))
-                    doctor_id = cursor.fetchone()[0]
-                    
-                    cursor.execute(f"SELECT id FROM patient WHERE name = ?", (patient_search.get(),))
-                    patient_id = cursor.fetchone()[0]
-                    
-                    cursor.execute("""
-                        UPDATE consultations 
-                        SET doctor = ?, patient = ?, date = ?, time = ?
-                        WHERE id = ?
-                    """, (
-                        doctor_id,
-                        patient_id,
-                        date_entry.get(),
-                        time_entry.get(),
-                        consultation_id
-                    ))
-                    conn.commit()
+            import sqlite3
+            from services import BookingError
+            doctor_name, patient_name = doctor_search.get(), patient_search.get()
+            doctor_id = self.services.doctors.resolve([doctor_name], by_name=True).get(doctor_name)
+            patient_id = self.services.patients.resolve([patient_name], by_name=True).get(patient_name)
+            if doctor_id is None or patient_id is None:
+                messagebox.showerror("Error", "Please select the doctor and the patient from the lists")
+                return
+
+            date, time = date_entry.get(), time_entry.get()
+            with_series = apply_to_series.get()
+            if not with_series and not self.check_availability(doctor_id, patient_id, date, time, consultation_id):
+                return
+
+            # On the executor: moving a series rewrites all of its later occurrences
+            def store():
+                with SAVES.labels("reschedule").time():
+                    if not with_series:
+                        self.services.consultations.reschedule(
+                            consultation_id, doctor=doctor_id, patient=patient_id, date=date, time=time
+                        )
+                        return []
+                    from datetime import date as Date, timedelta
+                    from classes.series import refresh_series, update_series
+                    from database.connection import transaction
+                    next_day = Date.fromisoformat(consultation_data[4].split()[0]) + timedelta(days=1)
+                    # The later occurrences and this one move together or not at all
+                    try:
+                        with transaction(immediate=True):
+                            clashes = update_series(
+                                series_id, next_day, time=time, doctor=doctor_id,
+                                edited=(consultation_id, doctor_id, patient_id, date, time)
+                            )
+                            if not clashes:
+                                self.services.consultations.reschedule(
+                                    consultation_id, doctor=doctor_id, patient=patient_id, date=date, time=time
+                                )
+                    except Exception:
+                        refresh_series(series_id, next_day)
+                        raise
+                    return clashes
+
+            def stored(clashes):
+                if clashes:
+                    BOOKING_CONFLICTS.inc()
+                    messagebox.showerror(
+                        "Unavailable",
+                        "The series could not be changed. Already booked on: "
+                        + ", ".join(sorted({day for day, _, _ in clashes}))
+                    )
+                    return
                 messagebox.showinfo("Success", "Consultation updated successfully")
                 edit_window.destroy()
                 self.load_appointments()
-            except sqlite3.Error as e:
-                messagebox.showerror("Error", f"Failed to update consultation: {str(e)}")
 
-        ttk.Button(edit_window, text="Save Changes", command=save_changes).grid(row=4, column=0, columnspan=2, pady=20)
+            def failed(error):
+                if isinstance(error, BookingError):
+                    messagebox.showerror("Unavailable", str(error))
+                elif isinstance(error, ValueError):
+                    messagebox.showerror("Error", f"Invalid date or time: {error}")
+                elif isinstance(error, sqlite3.Error):
+                    messagebox.showerror("Error", f"Failed to update consultation: {error}")
+                else:
+                    logger.error("Failed to update consultation %s", consultation_id, exc_info=error)
+                    messagebox.showerror("Error", f"Failed to update consultation: {error}")
+
+            self.executor.submit(store, callback=stored, error_callback=failed)
+
+        ttk.Button(edit_window, text="Save Changes", command=save_changes).grid(row=5, column=0, columnspan=2, pady=20)
     
     def delete_consultations(self):
-        selected_items = self.table.selection()
-        if not selected_items:
+        selected_rows = self.table.selected_rows()
+        if not selected_rows:
             messagebox.showerror("Error", "Please select one or more consultations to delete")
             return
         confirmation = messagebox.askyesno("Confirm Deletion", "Are you sure you want to delete the selected consultations?")
 
         if confirmation:
-            import sqlite3
-            from constants import PATH_TO_DB
-            from utils import consultation_exists_by_id
-
-            for selected_item in selected_items:
-                # Get the values from selected row
-                consultation_data = self.table.item(selected_item)['values']
-                consultation_id = consultation_data[0]
-                print(f"Consultation exists before deleting: {consultation_exists_by_id(consultation_id)}")
-                with sqlite3.connect(PATH_TO_DB) as conn:
-                    cursor = conn.cursor()
-                    cursor.execute("DELETE FROM consultations WHERE id = ?", (consultation_id,))
-                
-                print(f"Consultation exists after deleting: {consultation_exists_by_id(consultation_id)}")
+            from classes.series import cancel_series, get_series_id
+
+            # Consultations that belong to a series can take the rest of the series with them
+            series = {}
+            for consultation_data in selected_rows:
+                series_id = get_series_id(consultation_data[0])
+                if series_id is not None:
+                    start = consultation_data[4].split()[0]
+                    series[series_id] = min(start, series.get(series_id, start))
+            if not (series and messagebox.askyesno(
+                    "Recurring Consultations",
+                    "Some of these consultations are part of a series. Cancel the later occurrences as well?")):
+                series = {}
+            ids = [consultation_data[0] for consultation_data in selected_rows]
+
+            # On the executor: cancelling a series deletes all of its later occurrences
+            def cancel():
+                with SAVES.labels("cancel").time():
+                    for series_id, from_date in series.items():
+                        cancel_series(series_id, from_date)
+                    return self.services.consultations.cancel(ids)
+
+            def cancelled(_):
+                messagebox.showinfo("Success", "Selected consultations deleted successfully")
+                self.load_appointments()
 
-            messagebox.showinfo("Success", "Selected consultations deleted successfully")
-            self.load_appointments()
+            def failed(error):
+                logger.error("Failed to delete consultations %s", ids, exc_info=error)
+                messagebox.showerror("Error", f"Failed to delete the consultations: {error}")
 
-    def add_consultation(self):
+            self.executor.submit(cancel, callback=cancelled, error_callback=failed)
+
+    def find_next_available(self):
+        """
+        Opens a window listing the first free slots of the doctors of a specialization.
+
+        Picking a slot and pressing "Book" opens the add consultation window
+        with the doctor, date and time filled in.
+        """
+        from datetime import datetime
+        from classes.free_slots import next_available_by_specialization
+
+        find_window = tk.Toplevel()
+        find_window.title("Next Available")
+        find_window.geometry("420x360")
+        find_window.columnconfigure(1, weight=1)
+
+        specializations = self.services.specializations.names()
+        ttk.Label(find_window, text="Specialization:").grid(row=0, column=0, padx=5, pady=5, sticky="e")
+        specialization_combobox = ttk.Combobox(find_window, values=list(specializations), state="readonly")
+        specialization_combobox.grid(row=0, column=1, padx=5, pady=5, sticky="ew")
+
+        now = datetime.now()
+        ttk.Label(find_window, text="After (YYYY-MM-DD HH:MM):").grid(row=1, column=0, padx=5, pady=5, sticky="e")
+        after_entry = ttk.Entry(find_window)
+        after_entry.insert(0, now.strftime("%Y-%m-%d %H:%M"))
+        after_entry.grid(row=1, column=1, padx=5, pady=5, sticky="ew")
+
+        results_listbox = tk.Listbox(find_window, height=10)
+        results_listbox.grid(row=3, column=0, columnspan=2, padx=5, pady=5, sticky="nsew")
+        find_window.rowconfigure(3, weight=1)
+        options = []
+
+        def search():
+            name = specialization_combobox.get()
+            if not name:
+                messagebox.showerror("Error", "Please choose a specialization", parent=find_window)
+                return
+            try:
+                after = datetime.strptime(after_entry.get().strip(), "%Y-%m-%d %H:%M")
+            except ValueError:
+                messagebox.showerror("Error", "Please enter the date and time as YYYY-MM-DD HH:MM", parent=find_window)
+                return
+            options[:] = next_available_by_specialization(specializations[name], after, limit=10)
+            results_listbox.delete(0, tk.END)
+            results_listbox.insert(tk.END, *(f"{start:%a %Y-%m-%d %H:%M} - {doctor}" for start, _, doctor in options))
+            if not options:
+                results_listbox.insert(tk.END, "No free slot in the next 90 days")
+
+        def book():
+            selection = results_listbox.curselection()
+            if not selection or selection[0] >= len(options):
+                messagebox.showwarning("No Selection", "Please select a slot to book", parent=find_window)
+                return
+            start, _, doctor = options[selection[0]]
+            find_window.destroy()
+            self.add_consultation(doctor=doctor, date=start.strftime("%Y-%m-%d"), time=start.strftime("%H:%M"))
+
+        ttk.Button(find_window, text="Search", command=search).grid(row=2, column=0, columnspan=2, pady=5)
+        ttk.Button(find_window, text="Book", command=book).grid(row=4, column=0, columnspan=2, pady=10)
+        results_listbox.bind('<Double-Button-1>', lambda e: book())
+
+    def add_consultation(self, doctor=None, date=None, time=None):
+        """
+        Opens a new window to schedule a consultation (or a recurring series).
+
+        Args:
+            doctor (str): Name of the doctor to fill in
+            date (str): Date to fill in, as YYYY-MM-DD
+            time (str): Time to fill in, as HH:MM
+        """
         add_window = tk.Toplevel()
         add_window.title("Add New Consultation")
-        add_window.geometry("360x500")
+        add_window.geometry("360x620")
     
         # Patient selection frame
         patient_frame = ttk.LabelFrame(add_window, text="Select Patient")
@@ -339,6 +473,8 @@ class Menu:
         doctor_frame.grid(row=1, column=0, columnspan=2, padx=5, pady=5, sticky="ew")
     
         doctor_search = ttk.Entry(doctor_frame)
+        if doctor:
+            doctor_search.insert(0, doctor)
         doctor_search.grid(row=0, column=0, padx=5, pady=5)
     
         doctor_listbox = tk.Listbox(doctor_frame, height=3)
@@ -347,44 +483,43 @@ class Menu:
         # Date and time entries
         ttk.Label(add_window, text="Date (YYYY-MM-DD):").grid(row=2, column=0, padx=5, pady=5)
         date_entry = ttk.Entry(add_window)
+        if date:
+            date_entry.insert(0, date)
         date_entry.grid(row=2, column=1, padx=5, pady=5)
     
         ttk.Label(add_window, text="Time (HH:MM):").grid(row=3, column=0, padx=5, pady=5)
         time_entry = ttk.Entry(add_window)
+        if time:
+            time_entry.insert(0, time)
         time_entry.grid(row=3, column=1, padx=5, pady=5)
 
+        # Optional recurrence: book a whole series of follow-ups at once
+        repeat_frame = ttk.LabelFrame(add_window, text="Repeat")
+        repeat_frame.grid(row=4, column=0, columnspan=2, padx=5, pady=5, sticky="ew")
+        repeat_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(repeat_frame, text="Every", variable=repeat_var).grid(row=0, column=0, padx=5, pady=5)
+        interval_spinbox = ttk.Spinbox(repeat_frame, from_=1, to=52, width=4)
+        interval_spinbox.set(1)
+        interval_spinbox.grid(row=0, column=1, padx=5, pady=5)
+        unit_combobox = ttk.Combobox(repeat_frame, values=("weeks", "days"), state="readonly", width=7)
+        unit_combobox.set("weeks")
+        unit_combobox.grid(row=0, column=2, padx=5, pady=5)
+        ttk.Label(repeat_frame, text="Occurrences:").grid(row=1, column=0, padx=5, pady=5)
+        count_entry = ttk.Entry(repeat_frame, width=6)
+        count_entry.grid(row=1, column=1, padx=5, pady=5)
+        ttk.Label(repeat_frame, text="or until (YYYY-MM-DD):").grid(row=2, column=0, columnspan=2, padx=5, pady=5)
+        until_entry = ttk.Entry(repeat_frame, width=12)
+        until_entry.grid(row=2, column=2, padx=5, pady=5)
+
         from utils import format_date, format_time
         # Bind the formatting functions to the entries
         date_entry.bind('<KeyRelease>', lambda e: format_date(e, date_entry))
         time_entry.bind('<KeyRelease>', lambda e: format_time(e, time_entry))
+        until_entry.bind('<KeyRelease>', lambda e: format_date(e, until_entry))
         
-        def update_patient_list(*args):
-            search_term = patient_search.get().lower()
-            patient_listbox.delete(0, tk.END)
-            # Query database for patients matching search_term
-            import sqlite3
-            from constants import PATH_TO_DB
-            with sqlite3.connect(PATH_TO_DB) as conn:
-                cursor = conn.cursor()
-                cursor.execute("SELECT name, email FROM patient WHERE LOWER(name) LIKE ?", (f'%{search_term}%',))
-                for patient in cursor.fetchall():
-                    patient_listbox.insert(tk.END, f"{patient[0]} ({patient[1]})")
-
-        def update_doctor_list(*args):
-            search_term = doctor_search.get().lower()
-            doctor_listbox.delete(0, tk.END)
-            import sqlite3
-            from constants import PATH_TO_DB
-            with sqlite3.connect(PATH_TO_DB) as conn:
-                cursor = conn.cursor()
-                cursor.execute("SELECT name FROM doctor WHERE LOWER(name) LIKE ?", (f'%{search_term}%',))
-                doctors = cursor.fetchall()
-                for doctor in doctors:
-                    doctor_listbox.insert(tk.END, doctor[0])
-
-        # Bind search entries to update functions
-        patient_search.bind('<KeyRelease>', update_patient_list)
-        doctor_search.bind('<KeyRelease>', update_doctor_list)
+        # Search as the user types, debounced and off the Tk thread
+        patient_picker = self.bind_picker(patient_search, patient_listbox, "patient", show_email=True)
+        doctor_picker = self.bind_picker(doctor_search, doctor_listbox, "doctor")
 
         def on_patient_select(event):
             if patient_listbox.curselection():  # Check if there is a selection
@@ -406,8 +541,8 @@ class Menu:
         
     
         # Initial population of lists
-        update_patient_list()
-        update_doctor_list()
+        patient_picker.run_now(patient_search.get())
+        doctor_picker.run_now(doctor_search.get())
 
         def save_consultation():
             # Get selections from search entries
@@ -427,31 +562,86 @@ class Menu:
             # selected_patient = "John Smith (john.smith@email.com)"
             # patient_email = "john.smith@email.com"
                      
-            from utils import get_id
             # Get IDs from database
-            patient = get_id(patient_email, "email", "patient")
-            doctor = get_id(selected_doctor, "name", "doctor") #should be email
-            
-            # Add to database
-            import sqlite3
-            from constants import PATH_TO_DB
-            
-            with sqlite3.connect(PATH_TO_DB) as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    INSERT INTO consultations (patient, doctor, date, time)
-                    VALUES (?, ?, ?, ?)
-                """, (patient, doctor, date, time))
+            patient = self.services.patients.resolve([patient_email]).get(patient_email)
+            doctor = self.services.doctors.resolve([selected_doctor], by_name=True).get(selected_doctor)
+            if patient is None or doctor is None:
+                messagebox.showerror("Error", "Please select the patient and the doctor from the lists")
+                return
             
-            messagebox.showinfo("Success", "Consultation added successfully!")
-            from utils import consultation_exists
-            print(f"Consultation exists? {consultation_exists(patient, doctor)}")
-            add_window.destroy()
-            self.load_appointments()            
-        
+            if repeat_var.get():
+                save_series(patient, doctor, date, time)
+                return
+
+            # Add to database on the executor (the doctor and the patient must both be free)
+            from services import BookingError
+
+            def book():
+                with SAVES.labels("book").time():
+                    return self.services.consultations.book(patient, doctor, date, time)
+
+            def booked(_):
+                messagebox.showinfo("Success", "Consultation added successfully!")
+                add_window.destroy()
+                self.load_appointments()
+
+            def failed(error):
+                if isinstance(error, BookingError):
+                    if error.conflicts:
+                        BOOKING_CONFLICTS.inc()
+                    messagebox.showerror("Unavailable" if error.conflicts else "Error", str(error))
+                else:
+                    logger.error("Failed to book a consultation", exc_info=error)
+                    messagebox.showerror("Error", f"Failed to add the consultation: {error}")
+
+            self.executor.submit(book, callback=booked, error_callback=failed)
+
+        def save_series(patient, doctor, date, time):
+            from classes.series import RecurrenceRule, create_series
+            try:
+                rule = RecurrenceRule(
+                    date,
+                    interval_spinbox.get(),
+                    unit_combobox.get(),
+                    until=until_entry.get() or None,
+                    count=count_entry.get() or None
+                )
+            except ValueError as e:
+                messagebox.showerror("Error", f"Invalid series: {e}")
+                return
+
+            # On the executor: every occurrence is checked and booked in one transaction
+            def book():
+                with SAVES.labels("book_series").time():
+                    return create_series(patient, doctor, time, rule)
+
+            def booked(result):
+                from services import ACCEPTED
+                series_id, report = result
+                skipped = [entry for entry in report if entry["status"] != ACCEPTED]
+                if series_id is None:
+                    messagebox.showerror("Unavailable", "None of the occurrences of this series are free.")
+                    return
+                message = f"{len(report) - len(skipped)} of {len(report)} consultations booked."
+                if skipped:
+                    dates = [day.isoformat() for day in rule.occurrences()]
+                    message += "\nSkipped (already booked): " + ", ".join(dates[entry["row"]] for entry in skipped)
+                messagebox.showinfo("Success", message)
+                add_window.destroy()
+                self.load_appointments()
+
+            def failed(error):
+                if isinstance(error, ValueError):
+                    messagebox.showerror("Error", f"Invalid series: {error}")
+                else:
+                    logger.error("Failed to book a series", exc_info=error)
+                    messagebox.showerror("Error", f"Failed to add the consultations: {error}")
+
+            self.executor.submit(book, callback=booked, error_callback=failed)
+
         # Add the save button at the bottom of the window
         save_btn = ttk.Button(add_window, text="Save Consultation", command=save_consultation)
-        save_btn.grid(row=4, column=0, columnspan=2, pady=20)
+        save_btn.grid(row=5, column=0, columnspan=2, pady=20)
         
         # Bind Enter key to save_consultation
         add_window.bind('<Return>', lambda e: save_consultation())
@@ -491,17 +681,19 @@ class Menu:
                 messagebox.showerror("Error", "All fields must be filled.")
                 return
             
-            from classes.patient import Patient
-            patient = Patient(name, address, birth_date, phone, email)
-            if patient.exists_in_db():
+            patients = self.services.patients
+            values = {"name": name, "address": address, "birth_date": birth_date, "phone": phone, "email": email}
+            if patients.ids_for_email(email):
                 response = messagebox.askyesno("Patient Exists", "Patient already exists in the database. Do you want to override it with new data?")                
                 if response:
-                    patient.delete_from_db()
-                    patient.add_to_database()
+                    # Updated in place, so the patient's consultations are kept
+                    with SAVES.labels("replace_patient").time():
+                        patients.replace(email, values)
                 else:
                     return
             else:
-                patient.add_to_database()
+                with SAVES.labels("add_patient").time():
+                    patients.add(values)
                 
             messagebox.showinfo("Success", "Patient added successfully!")
             # Clear entry fields
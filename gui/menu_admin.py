@@ -1,16 +1,21 @@
-from gui.menu import Menu
+from gui.menu import Menu, SAVES, SEARCHES
+import logging
 import tkinter as tk
 from tkinter import ttk
 from tkinter import messagebox
 from constants import *
 
+logger = logging.getLogger(__name__)
+
 class AdminMenu(Menu):
-    def __init__(self, root):
-        super().__init__(root)
+    def __init__(self, root, session):
+        if not session.is_admin:
+            raise PermissionError(f"{session.email} is not an administrator")
+        super().__init__(root, session)
         self.root.withdraw()
         self.admin_window = tk.Toplevel()
         self.admin_window.title("Admin Menu")
-        self.admin_window.geometry("300x200")
+        self.admin_window.geometry("300x260")
         manage_list = [
             ["Users", USERS_COLUMNS_IN_DB],
             ["Doctor", DOCTORS_COLUMNS_IN_DB],
@@ -30,6 +35,18 @@ class AdminMenu(Menu):
                 sticky="ew"
             )
         
+        ttk.Button(
+            self.admin_window,
+            text="Import Consultations",
+            command=self.import_consultations
+        ).grid(
+            row=len(manage_list),
+            column=0,
+            padx=10,
+            pady=10,
+            sticky="ew"
+        )
+
         from utils import close_window_deiconify
         ttk.Button(
             self.admin_window, 
@@ -39,7 +56,7 @@ class AdminMenu(Menu):
                 self.admin_window
                 )
             ).grid(
-                row=3, 
+                row=len(manage_list) + 1, 
                 column=0, 
                 padx=10, 
                 pady=10, 
@@ -47,49 +64,105 @@ class AdminMenu(Menu):
                 )
 
     
-    def search_items(self, table_name: str, col_list: tuple, search_entry: tk.Entry, tree: ttk.Treeview):
+    def import_consultations(self):
         """
-        Generic search method for any table.
-        
+        Book the consultations listed in a CSV file in one batch.
+
+        The file needs patient, doctor and start (or date and time) columns; see
+        classes.scheduling.read_requests. The batch runs on the executor and a
+        report of what was booked or rejected, and why, is written next to the
+        file as <name>_report.csv.
+        """
+        from tkinter import filedialog
+        path = filedialog.askopenfilename(
+            parent=self.admin_window,
+            title="Import Consultations",
+            filetypes=[("CSV files", "*.csv"), ("All files", "*.*")]
+        )
+        if not path:
+            return
+
+        from classes.scheduling import read_requests, write_report
+        from services import ACCEPTED
+        try:
+            requests = read_requests(path)
+        except (OSError, ValueError, UnicodeDecodeError) as e:
+            messagebox.showerror("Error", f"Could not read {path}: {e}")
+            return
+
+        def done(report):
+            import os
+            report_path = os.path.splitext(path)[0] + "_report.csv"
+            write_report(report_path, requests, report)
+            booked = sum(1 for entry in report if entry["status"] == ACCEPTED)
+            messagebox.showinfo(
+                "Import Consultations",
+                f"{booked} of {len(report)} consultations booked.\nReport written to {report_path}"
+            )
+            self.load_appointments()
+
+        def failed(error):
+            messagebox.showerror("Error", f"Failed to import consultations: {error}")
+
+        def book_many(requests):
+            with SAVES.labels("import_consultations").time():
+                return self.services.consultations.book_many(requests)
+
+        self.executor.submit(book_many, requests, callback=done, error_callback=failed)
+
+    def search_source_for(self, table_name: str, col_list: tuple, query: str):
+        """
+        Build the page fetcher for a search typed in a manage window.
+
+        Tables with a full-text index are searched with a ranked MATCH query;
+        any other table falls back to a parameterized LIKE over every column
+        (see services.storage). An empty search shows every row.
+
+        Args:
+            table_name (str): Name of the table to search in
+            col_list (tuple): List of columns to search through
+            query (str): What the user typed
+
+        Returns:
+            callable: `fetch_page(after, limit)` for the grid
+        """
+        if query.strip() == "Press Enter to Search...":
+            query = ""
+        return self.services.records(table_name).pager(col_list, query)
+
+    def search_items(self, table_name: str, col_list: tuple, search_entry: tk.Entry, tree):
+        """
+        Search a table as the user types in the search entry.
+
+        Searches are debounced and run on the executor together with the first
+        page of results, and only the result for the latest input reaches the
+        grid. Enter searches right away.
+
         Args:
             table_name (str): Name of the table to search in
             col_list (tuple): List of columns to search through
             search_entry (tk.Entry): Entry widget containing search query
-            tree (ttk.Treeview): Treeview to display results
+            tree (DataGrid): Grid to display results
+
+        Returns:
+            SearchController: The controller bound to the entry
         """
-        query = search_entry.get().lower().replace("'", "''")  # Escape single quotes
-        if query == "press enter to search...":
-            return
+        from classes.search_controller import SearchController
 
-        # Clear current treeview
-        for item in tree.get_children():
-            tree.delete(item)
+        def search(query):
+            fetch_page = self.search_source_for(table_name, col_list, query)
+            return fetch_page, fetch_page(None, tree.page_size)
 
-        import sqlite3
-        from constants import PATH_TO_DB
-        from utils import build_query
-        
-        with sqlite3.connect(PATH_TO_DB) as conn:
-            cursor = conn.cursor()
-            # Build base query
-            select_query = build_query(table_name, col_list)
-            
-            # Add WHERE clause for searching across all columns
-            where_clauses = []
-            for col in col_list:
-                # Prefix the column names with table name to avoid ambiguity
-                table_prefix = table_name + "."
-                if "." not in col:  # Only add prefix if not already prefixed
-                    where_clauses.append(f"{table_prefix}{col} LIKE '%{query}%'")
-                else:
-                    where_clauses.append(f"{col} LIKE '%{query}%'")
-            
-            if where_clauses:
-                select_query += " WHERE " + " OR ".join(where_clauses)
-            print(f"Executing query: {select_query}")
-            cursor.execute(select_query)
-            for row in cursor.fetchall():
-                tree.insert('', tk.END, values=row)
+        def show(result):
+            fetch_page, first_page = result
+            tree.set_source(fetch_page, first_page)
+
+        controller = SearchController(
+            tree.frame, search, show, executor=self.executor, latency=SEARCHES.labels("admin_" + table_name.lower())
+        )
+        controller.bind(search_entry)
+        search_entry.bind('<Return>', lambda event: controller.run_now(search_entry.get()))
+        return controller
 
     def manage(self, type:str, col_list:tuple):
         """
@@ -115,25 +188,25 @@ class AdminMenu(Menu):
         search_entry = ttk.Entry(self.manage_window)
         search_entry.grid(row=0, column=1, padx=5, pady=5, sticky='w')
 
-        # Create Treeview
-        self.tree = ttk.Treeview(self.manage_window, columns=col_list, show='headings')
-        for col in col_list:
-            self.tree.heading(col, text=col)
-            self.tree.column(col, width=150)
-
-        # Add scrollbar
-        scrollbar = ttk.Scrollbar(self.manage_window, orient=tk.VERTICAL, command=self.tree.yview)
-        self.tree.configure(yscrollcommand=scrollbar.set)
+        # Create the virtualized grid (rows are loaded page by page while scrolling).
+        # Several manage windows can be open at once, so everything below works on this window's own grid.
+        from classes.table import DataGrid
+        tree = DataGrid(
+            self.manage_window,
+            col_list,
+            self.services.records(type.lower()).pager(col_list),
+            column_width=150,
+            executor=self.executor
+        )
 
         # Grid layout
-        self.tree.grid(row=1, column=0, columnspan=2, sticky='nsew', padx=5, pady=5)
-        scrollbar.grid(row=1, column=2, sticky='ns')
+        tree.grid(row=1, column=0, columnspan=2, sticky='nsew', padx=5, pady=5)
 
         # Get selected items function
         def get_selected_items():
-            selected_items = self.tree.selection()
-            if selected_items:
-                return [self.tree.item(item)['values'] for item in selected_items]
+            selected_rows = tree.selected_rows()
+            if selected_rows:
+                return selected_rows
             return None
 
         # Button frame
@@ -144,19 +217,19 @@ class AdminMenu(Menu):
         ttk.Button(
             button_frame, 
             text=f"Add {type}", 
-            command=lambda: self.add_item(type, col_list)
+            command=lambda: self.add_item(type, col_list, tree)
         ).grid(row=0, column=0, padx=5)
 
         ttk.Button(
             button_frame, 
             text=f"Edit {type}", 
-            command=lambda: self.edit_item(type, col_list, get_selected_items())
+            command=lambda: self.edit_item(type, col_list, get_selected_items(), tree)
         ).grid(row=0, column=1, padx=5)
 
         ttk.Button(
             button_frame, 
             text=f"Delete {type}", 
-            command=lambda: self.delete_item(type, get_selected_items(), col_list)
+            command=lambda: self.delete_item(type, get_selected_items(), col_list, tree)
         ).grid(row=0, column=2, padx=5)
 
         # Add search functionality
@@ -175,16 +248,15 @@ class AdminMenu(Menu):
 
         search_entry.bind('<FocusIn>', on_focus_in)
         search_entry.bind('<FocusOut>', on_focus_out)
-        search_entry.bind('<Return>', 
-            lambda event: self.search_items(type.lower(), col_list, search_entry, self.tree)
-        )
+        # Search as the user types (Enter searches right away)
+        self.search_items(type.lower(), col_list, search_entry, tree)
 
         # Initial data load
-        self.load_data(type, col_list, search_entry, self.tree)
+        self.load_data(type, col_list, search_entry, tree)
 
 
-    def add_item(self, type: str, col_list: tuple):
-        """Generic method to add items to any table"""
+    def add_item(self, type: str, col_list: tuple, tree):
+        """Generic method to add items to any table; `tree` is the manage window's grid, refreshed once saved"""
         add_window = tk.Toplevel()
         add_window.title(f"Add {type}")
         add_window.geometry("400x400")
@@ -203,15 +275,8 @@ class AdminMenu(Menu):
             elif col.lower() == 'specialization_id':
                 # Create a combobox for specializations
                 entries[col] = ttk.Combobox(add_window, state='readonly')
-                # Fetch specializations from database
-                import sqlite3
-                from constants import PATH_TO_DB
-                with sqlite3.connect(PATH_TO_DB) as conn:
-                    cursor = conn.cursor()
-                    cursor.execute("SELECT id, name FROM specialization")
-                    specializations = cursor.fetchall()
-                # Store the id-name mapping for later use
-                entries[f"{col}_mapping"] = {spec[1]: spec[0] for spec in specializations}
+                # Store the name-id mapping for later use
+                entries[f"{col}_mapping"] = self.services.specializations.names()
                 # Show only the names in the dropdown
                 entries[col]['values'] = list(entries[f"{col}_mapping"].keys())
             else:
@@ -219,46 +284,39 @@ class AdminMenu(Menu):
             entries[col].grid(row=i-1, column=1, padx=5, pady=5)
         
         def save():
-            values = []
-            import hashlib
+            values = {}
             for col in col_list[1:]:
-                if col.lower() == 'password':
-                    password = entries[col].get()
-                    if password:
-                        hashed = hashlib.sha256(password.encode()).hexdigest()
-                        values.append(hashed)
-                    else:
-                        values.append('')
-                elif col.lower() == 'is_admin':
-                    values.append(1 if entries[col].get() else 0)
+                if col.lower() == 'is_admin':
+                    values[col] = 1 if entries[col].get() else 0
                 elif col.lower() == 'specialization_id':
                     selected_name = entries[col].get()
-                    values.append(entries[f"{col}_mapping"][selected_name])
+                    values[col] = entries[f"{col}_mapping"].get(selected_name, '')
                 else:
-                    values.append(entries[col].get())
+                    values[col] = entries[col].get()  # Passwords are hashed by the service
                     
-            if not all(str(v) for v in values):
+            if not all(str(v) for v in values.values()):
                 messagebox.showerror("Error", "Please fill all fields")
                 return
                 
-            import sqlite3
-            from constants import PATH_TO_DB
-            with sqlite3.connect(PATH_TO_DB) as conn:
-                cursor = conn.cursor()
-                placeholders = ','.join(['?' for _ in col_list[1:]])
-                cursor.execute(
-                    f"INSERT INTO {type.lower()} ({','.join(col_list[1:])}) VALUES ({placeholders})",
-                    values
-                )
-            
-            messagebox.showinfo("Success", f"{type} added successfully!")
-            add_window.destroy()
-            self.load_data(type, col_list, None, self.tree)
+            # On the executor: hashing a password takes a noticeable fraction of a second
+            def store(values):
+                with SAVES.labels("admin_add").time():
+                    return self.services.records(type.lower()).add(values)
+
+            def stored(_):
+                messagebox.showinfo("Success", f"{type} added successfully!")
+                add_window.destroy()
+                tree.refresh()
+
+            def failed(error):
+                messagebox.showerror("Error", f"Failed to add {type}: {error}")
+
+            self.executor.submit(store, values, callback=stored, error_callback=failed)
 
         ttk.Button(add_window, text="Save", command=save).grid(row=len(col_list), column=0, columnspan=2, pady=10)
 
-    def edit_item(self, type: str, col_list: tuple, selection):
-        """Generic method to edit items in any table"""
+    def edit_item(self, type: str, col_list: tuple, selection, tree):
+        """Generic method to edit items in any table; `tree` is the manage window's grid, refreshed once saved"""
         if not selection or len(selection) != 1:
             messagebox.showwarning("Warning", "Please select exactly one item to edit")
             return
@@ -293,16 +351,9 @@ class AdminMenu(Menu):
             elif col.lower() == 'specialization_id':
                 # Create a combobox for specializations
                 entries[col] = ttk.Combobox(edit_window, state='readonly')
-                # Fetch specializations from database
-                import sqlite3
-                from constants import PATH_TO_DB
-                with sqlite3.connect(PATH_TO_DB) as conn:
-                    cursor = conn.cursor()
-                    cursor.execute("SELECT id, name FROM specialization")
-                    specializations = cursor.fetchall()
                 # Store the id-name mapping for later use
-                entries[f"{col}_mapping"] = {spec[1]: spec[0] for spec in specializations}
-                entries[f"{col}_reverse_mapping"] = {spec[0]: spec[1] for spec in specializations}
+                entries[f"{col}_mapping"] = self.services.specializations.names()
+                entries[f"{col}_reverse_mapping"] = {id: name for name, id in entries[f"{col}_mapping"].items()}
                 # Show only the names in the dropdown
                 entries[col]['values'] = list(entries[f"{col}_mapping"].keys())
                 # Set current value
@@ -317,118 +368,84 @@ class AdminMenu(Menu):
                 row_counter += 1
         
         def save():
-            values = []
-            import hashlib
+            values = {}
             for col in col_list[1:]:
                 if col.lower() == 'password':
-                    password = entries[col].get()
                     if entries[col]['state'] == 'disabled':
-                        values.append(password)  # Keep existing password hash
-                    elif password:
-                        hashed = hashlib.sha256(password.encode()).hexdigest()
-                        values.append(hashed)
-                    else:
-                        values.append('')
+                        continue  # Keep existing password hash
+                    values[col] = entries[col].get()  # Hashed by the service
                 elif col.lower() == 'is_admin':
-                    values.append(1 if entries[col].get() else 0)
+                    values[col] = 1 if entries[col].get() else 0
                 elif col.lower() == 'specialization_id':
                     selected_name = entries[col].get()
-                    values.append(entries[f"{col}_mapping"][selected_name])
+                    values[col] = entries[f"{col}_mapping"].get(selected_name, '')
                 else:
-                    values.append(entries[col].get())
-            
-            values.append(selection[0][0])  # Add ID for WHERE clause
+                    values[col] = entries[col].get()
             
-            if not all(str(v) for v in values[:-1]):  # Check all except ID
+            if not all(str(v) for v in values.values()):
                 messagebox.showerror("Error", "Please fill all fields")
                 return
                 
-            import sqlite3
-            from constants import PATH_TO_DB
-            with sqlite3.connect(PATH_TO_DB) as conn:
-                cursor = conn.cursor()
-                set_clause = ','.join([f"{col}=?" for col in col_list[1:]])
-                cursor.execute(
-                    f"UPDATE {type.lower()} SET {set_clause} WHERE id=?",
-                    values
-                )
-            
-            messagebox.showinfo("Success", f"{type} updated successfully!")
-            edit_window.destroy()
-            self.load_data(type, col_list, None, self.tree)
+            # On the executor: hashing a new password takes a noticeable fraction of a second
+            def store(values):
+                with SAVES.labels("admin_edit").time():
+                    return self.services.records(type.lower()).update(selection[0][0], values)
+
+            def stored(_):
+                messagebox.showinfo("Success", f"{type} updated successfully!")
+                edit_window.destroy()
+                tree.refresh()
+
+            def failed(error):
+                messagebox.showerror("Error", f"Failed to update {type}: {error}")
+
+            self.executor.submit(store, values, callback=stored, error_callback=failed)
 
         ttk.Button(edit_window, text="Save", command=save).grid(row=row_counter, column=0, columnspan=2, pady=10)    
     
-    def delete_item(self, type: str, selection, col_list: tuple):
-        """Generic method to delete items from any table"""
-        try:
-            if not selection:
-                messagebox.showwarning("Warning", "Please select items to delete")
-                return
-                    
-            if not messagebox.askyesno("Confirm", f"Are you sure you want to delete {len(selection)} {type}(s)?"):
-                return
-                    
-            import sqlite3
-            from constants import PATH_TO_DB
-            with sqlite3.connect(PATH_TO_DB) as conn:
-                cursor = conn.cursor()
-                for item in selection:
-                    if type.lower() == 'specialization':
-                        # First get all doctors with this specialization
-                        cursor.execute("SELECT id FROM doctor WHERE specialization_id=?", (item[0],))
-                        doctor_ids = cursor.fetchall()
-                        # Delete consultations for these doctors
-                        for doctor_id in doctor_ids:
-                            cursor.execute("DELETE FROM consultations WHERE doctor=?", (doctor_id[0],))
-                        # Delete the doctors
-                        cursor.execute("DELETE FROM doctor WHERE specialization_id=?", (item[0],))
-                        # Finally delete the specialization
-                        cursor.execute("DELETE FROM specialization WHERE id=?", (item[0],))
-                    elif type.lower() == 'doctor':
-                        # First delete all consultations for this doctor
-                        cursor.execute("DELETE FROM consultations WHERE doctor=?", (item[0],))
-                        # Then delete the doctor
-                        cursor.execute("DELETE FROM doctor WHERE id=?", (item[0],))
-                    else:
-                        cursor.execute(f"DELETE FROM {type.lower()} WHERE id=?", (item[0],))
-            
-            messagebox.showinfo("Success", f"{len(selection)} {type}(s) deleted successfully!")
-            self.load_data(type, col_list, None, self.tree)
-        except sqlite3.IntegrityError:
-            messagebox.showerror("Error", "Cannot delete: item is referenced by other records")
-
-    def load_data(self, table_name:str, col_list:tuple, search_entry:tk.Entry, tree:ttk.Treeview):
-        print(f"Loading data for table: {table_name}")
-        print(f"Columns: {col_list}")
+    def delete_item(self, type: str, selection, col_list: tuple, tree):
+        """Generic method to delete items from any table; `tree` is the manage window's grid, refreshed afterwards"""
+        import sqlite3
+        if not selection:
+            messagebox.showwarning("Warning", "Please select items to delete")
+            return
+
+        if not messagebox.askyesno("Confirm", f"Are you sure you want to delete {len(selection)} {type}(s)?"):
+            return
+
+        ids = [item[0] for item in selection]
+
+        # On the executor: deleting a specialization also deletes its doctors, and deleting a doctor their consultations
+        def delete(ids):
+            with SAVES.labels("admin_delete").time():
+                return self.services.records(type.lower()).delete(ids)
+
+        def deleted(_):
+            messagebox.showinfo("Success", f"{len(ids)} {type}(s) deleted successfully!")
+            tree.refresh()
+
+        def failed(error):
+            if isinstance(error, sqlite3.IntegrityError):
+                messagebox.showerror("Error", "Cannot delete: item is referenced by other records")
+            else:
+                logger.error("Failed to delete %s %s", type, ids, exc_info=error)
+                messagebox.showerror("Error", f"Failed to delete {type}: {error}")
+
+        self.executor.submit(delete, ids, callback=deleted, error_callback=failed)
+
+    def load_data(self, table_name:str, col_list:tuple, search_entry:tk.Entry, tree):
         table_name = table_name.lower()
-        print(f"Loading data for table: {table_name}")
+        logger.debug("Loading %s (columns: %s)", table_name, ", ".join(col_list))
 
-        # Clear existing items first
-        for item in tree.get_children():
-            tree.delete(item)
-            
         import sqlite3
-        from constants import PATH_TO_DB
-        from utils import build_query
         
         try:
-            with sqlite3.connect(PATH_TO_DB) as conn:
-                cursor = conn.cursor()
-                select_query = build_query(table_name, col_list)
-                print(f"Executing query: {select_query}")
+            # The grid replaces its rows and fetches the first page in the background; later pages load on scroll
+            tree.set_source(self.services.records(table_name).pager(col_list))
                 
-                cursor.execute(select_query)
-                data = cursor.fetchall()
-                print(f"Fetched {len(data)} rows")
-                
-                for row in data:
-                    print(f"Inserting row: {row}")
-                    tree.insert('', tk.END, values=row)
-                    
         except sqlite3.Error as e:
-            print(f"Database error: {e}")
+            logger.exception("Failed to load %s", table_name)
             messagebox.showerror("Database Error", f"Failed to load data: {str(e)}")
         except Exception as e:
-            print(f"Unexpected error: {e}")
+            logger.exception("Failed to load %s", table_name)
             messagebox.showerror("Error", f"An unexpected error occurred: {str(e)}")
@@ -1,12 +1,59 @@
-import tkinter as tk
+import logging
+import os
 
-from gui.first_window import FirstWindow
 
-def main():                     
-    root = tk.Tk()  
-    FirstWindow(root)       
+def start():
+    """
+    Show the first window as early as possible.
+
+    Only what the first window needs is imported and run before it is
+    drawn: the Menu and AdminMenu modules are imported when they open, and
+    the metrics exporter and the data the Menu needs (see services/warmup.py)
+    start once the first frame is on screen.
+
+    Returns:
+        tk.Tk: The application's root window, ready for mainloop
+    """
+    import tkinter as tk
+    from gui.first_window import FirstWindow
+
+    # CLINIC_LOG_LEVEL=DEBUG also logs a sample of the SQL statements (see database/instrumentation.py)
+    logging.basicConfig(
+        level=os.environ.get("CLINIC_LOG_LEVEL", "WARNING").upper(),
+        format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+    )
+
+    # Bring the database schema up to date before any window touches it
+    from database.migrations import migrate
+    migrate()
+
+    root = tk.Tk()
+    FirstWindow(root)
+    root.after_idle(after_first_frame)
+    return root
+
+
+def after_first_frame():
+    """Start the background work that the first window does not need, once it is drawn."""
+    # Latency metrics of this workstation, written to a file a local collector can scrape
+    from classes.metrics import start_exporter
+    start_exporter()
+
+    # Consultations, doctors and specializations are loaded while the user logs in
+    from services.warmup import start_warmup
+    start_warmup()
+
+
+def main():
+    root = start()
     root.mainloop()
-    
+
+    from classes.metrics import stop_exporter
+    stop_exporter()
+
+    from database.connection import close_all_connections
+    close_all_connections()
+
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
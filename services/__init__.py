@@ -0,0 +1,188 @@
+"""
+Service layer: the clinic's business operations, independent of Tk.
+
+A Services container bundles one service per entity on top of a storage
+backend (see services.storage):
+
+    services.consultations  list upcoming, book, book_many, reschedule, cancel
+    services.patients       typeahead, add, update, replace, delete, pager, resolve
+    services.doctors        same as patients; deleting cancels their consultations
+    services.specializations
+    services.users          passwords are hashed on add/update
+    services.auth           authenticate -> immutable Session
+
+The GUI uses get_services(), backed by clinic.db and the application's
+shared availability engine and search indexes. create_memory_services()
+builds an independent container over MemoryStorage for tests and benchmarks,
+which needs neither a database file nor a display:
+
+    >>> services = create_memory_services()
+    >>> spec = services.specializations.add({"name": "Cardiology"})
+    >>> doctor = services.doctors.add({"name": "Ana Lima", "email": "ana@clinic.pt", "specialization_id": spec})
+    >>> patient = services.patients.add({"name": "Rui Costa", "email": "rui@mail.pt"})
+    >>> services.consultations.book(patient, doctor, "2030-01-07", "09:00")
+    1
+"""
+import abc
+import threading
+
+from services.auth import AuthService, Session
+from services.consultations import ACCEPTED, REJECTED, BookingError, ConsultationService
+from services.records import DoctorService, PatientService, RecordService, SpecializationService, UserService
+
+
+class Services(abc.ABC):
+    """
+    One service per entity over a storage backend.
+
+    Subclasses decide where the in-memory engines (availability and the
+    typeahead indexes) come from; one that leaves any of them out cannot be
+    instantiated.
+
+    Args:
+        storage: A storage backend (SQLiteStorage or MemoryStorage)
+    """
+
+    def __init__(self, storage):
+        self.storage = storage
+        self.users = UserService(self)
+        self.specializations = SpecializationService(self)
+        self.doctors = DoctorService(self)
+        self.patients = PatientService(self)
+        self.consultations = ConsultationService(self)
+        self.auth = AuthService(self)
+        self._records = {
+            service.table: service
+            for service in (self.users, self.specializations, self.doctors, self.patients)
+        }
+
+    def records(self, table: str) -> RecordService:
+        """
+        Get the service managing a table.
+
+        Args:
+            table (str): "users", "specialization", "doctor" or "patient"
+
+        Returns:
+            RecordService: The table's service
+        """
+        service = self._records.get(table)
+        if service is None:
+            raise ValueError(f"Invalid table name: {table}")
+        return service
+
+    @abc.abstractmethod
+    def availability(self):
+        """Get the availability engine checked before every booking."""
+
+    @abc.abstractmethod
+    def index(self, table: str):
+        """Get the typeahead index of "doctor" or "patient"."""
+
+    @abc.abstractmethod
+    def refresh_index(self, table: str, ids):
+        """Bring the typeahead index of a table up to date after rows changed."""
+
+
+class SQLiteServices(Services):
+    """Services over clinic.db, sharing the application's availability engine and search indexes."""
+
+    def __init__(self):
+        from services.storage import SQLiteStorage
+        super().__init__(SQLiteStorage())
+
+    def availability(self):
+        from classes.availability import get_availability
+        return get_availability()
+
+    def index(self, table: str):
+        from classes.search_index import get_index
+        return get_index(table)
+
+    def refresh_index(self, table: str, ids):
+        from classes.search_index import INDEXED_TABLES, refresh_rows
+        if table in INDEXED_TABLES:
+            refresh_rows(table, ids)
+
+
+class MemoryServices(Services):
+    """Services over their own MemoryStorage, with engines of their own loaded from it on first use."""
+
+    def __init__(self, storage=None):
+        from services.storage import MemoryStorage
+        super().__init__(storage or MemoryStorage())
+        self._lock = threading.Lock()
+        self._availability = None
+        self._indexes = {}
+
+    def availability(self):
+        if self._availability is None:
+            from classes.availability import Availability
+            with self._lock:
+                if self._availability is None:
+                    availability = Availability()
+                    availability.load(self.storage.rows("consultations", ConsultationService.ENGINE_COLUMNS))
+                    self._availability = availability
+        return self._availability
+
+    def index(self, table: str):
+        index = self._indexes.get(table)
+        if index is None:
+            from classes.search_index import SearchIndex
+            with self._lock:
+                index = self._indexes.get(table)
+                if index is None:
+                    index = SearchIndex()
+                    index.load(self.storage.rows(table, ("id", "name", "email")))
+                    self._indexes[table] = index
+        return index
+
+    def refresh_index(self, table: str, ids):
+        index = self._indexes.get(table)
+        if index is None:
+            return
+        for id in ids:
+            row = self.storage.get(table, id)
+            if row is None:
+                index.remove(id)
+            else:
+                index.add(id, row.name, row.email)
+
+
+_services = None
+_services_lock = threading.Lock()
+
+
+def get_services() -> Services:
+    """
+    Get the application's services, backed by clinic.db.
+
+    The container holds no data of its own (the engines it uses are reset
+    by database.connection.set_database_path), so it is shared by every
+    window and thread.
+
+    Returns:
+        Services: The shared SQLite-backed services
+    """
+    global _services
+    if _services is None:
+        with _services_lock:
+            if _services is None:
+                _services = SQLiteServices()
+    return _services
+
+
+def forget_cached():
+    """Drop what the shared services keep between calls (called when the database changes)."""
+    if _services is not None:
+        _services.specializations.forget()
+
+
+def create_memory_services() -> MemoryServices:
+    """
+    Create an independent, empty set of services kept entirely in memory.
+
+    Returns:
+        MemoryServices: Services over a new MemoryStorage
+    """
+    return MemoryServices()
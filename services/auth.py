@@ -0,0 +1,93 @@
+"""
+Authentication: check a user's credentials once and hand out a Session.
+
+A login costs a single query on the unique index of users.email, fetching the
+stored hash (with its salt and cost, see services.passwords) and the role
+together. A hash that is legacy SHA-256 or was made with another cost is
+replaced after the password checks out. The Session it returns is immutable
+and is what the windows consult for role checks, so nothing goes back to the
+users table while the user is logged in.
+
+Checking a password takes as long as the configured hasher (hundreds of
+milliseconds), so call authenticate on a worker thread.
+"""
+import time
+
+
+class Session:
+    """
+    A logged-in user. Read-only: a new login creates a new Session.
+
+    Args:
+        user_id (int): ID of the user in the users table
+        email (str): Email the user logged in with
+        is_admin (bool): Whether the user may open the admin menu
+    """
+    __slots__ = ("__user_id", "__email", "__is_admin", "__started_at")
+
+    def __init__(self, user_id: int, email: str, is_admin: bool):
+        self.__user_id = user_id
+        self.__email = email
+        self.__is_admin = bool(is_admin)
+        self.__started_at = time.time()
+
+    def __repr__(self):
+        return f"Session(user_id={self.__user_id}, email={self.__email!r}, is_admin={self.__is_admin})"
+
+    @property
+    def user_id(self) -> int:
+        """ID of the user in the users table."""
+        return self.__user_id
+
+    @property
+    def email(self) -> str:
+        """Email the user logged in with."""
+        return self.__email
+
+    @property
+    def is_admin(self) -> bool:
+        """Whether the user is an administrator."""
+        return self.__is_admin
+
+    @property
+    def started_at(self) -> float:
+        """When the user logged in (seconds since the epoch)."""
+        return self.__started_at
+
+
+class AuthService:
+    """
+    Checks credentials against the users table.
+
+    Args:
+        services (Services): Container the service belongs to (storage and the users service)
+    """
+    table = "users"
+
+    def __init__(self, services):
+        self.services = services
+        self.storage = services.storage
+
+    def authenticate(self, email: str, password: str):
+        """
+        Log a user in, upgrading the stored hash if it is outdated.
+
+        Args:
+            email (str): Email of the user
+            password (str): Password in plain text
+
+        Returns:
+            Session: The new session, or None if the email is unknown or the password is wrong
+        """
+        from services import passwords
+        row = self.storage.lookup(self.table, "email", email.strip(), ("id", "password", "is_admin"))
+        if row is None:
+            # Spend the same time as for a wrong password, so response times do not reveal which emails exist
+            passwords.get_hasher().hash(password)
+            return None
+        id, stored, is_admin = row
+        if not passwords.verify(password, stored):
+            return None
+        if passwords.needs_rehash(stored):
+            self.storage.update(self.table, id, {"password": passwords.hash_password(password)})
+        return Session(id, email.strip(), is_admin)
@@ -0,0 +1,294 @@
+"""
+Consultation service: list, book, reschedule and cancel consultations.
+
+Every booking goes through the availability engine of the Services
+container, so a doctor or patient is never booked twice for the same time,
+and every write keeps that engine current. Since other workstations write to
+the same database, bookings are checked again against the stored
+consultations inside an immediate (write-locked) transaction, right before
+the row is written.
+"""
+from datetime import date as Date
+
+ACCEPTED = "accepted"
+REJECTED = "rejected"
+
+
+class BookingError(ValueError):
+    """
+    Raised when a consultation cannot be booked or moved.
+
+    Attributes:
+        conflicts (list): ("doctor" or "patient", consultation ID) for every clash (empty for other errors)
+    """
+
+    def __init__(self, message, conflicts=()):
+        super().__init__(message)
+        self.conflicts = list(conflicts)
+
+
+def split_start(start):
+    """
+    Split a consultation start into its date and time strings.
+
+    Args:
+        start (str | datetime): "YYYY-MM-DD HH:MM" (a "T" separator is accepted too) or a datetime
+
+    Returns:
+        tuple: (date, time) as ("YYYY-MM-DD", "HH:MM")
+
+    Raises:
+        ValueError: If the start cannot be parsed
+    """
+    from datetime import datetime
+    if isinstance(start, datetime):
+        return start.strftime("%Y-%m-%d"), start.strftime("%H:%M")
+    parsed = datetime.strptime(str(start).strip().replace("T", " ")[:16], "%Y-%m-%d %H:%M")
+    return parsed.strftime("%Y-%m-%d"), parsed.strftime("%H:%M")
+
+
+class ConsultationService:
+    """
+    Consultations between patients and doctors.
+
+    Args:
+        services (Services): Container the service belongs to (storage and engines)
+    """
+    table = "consultations"
+    ENGINE_COLUMNS = ("id", "doctor", "patient", "date", "time")
+
+    def __init__(self, services):
+        self.services = services
+        self.storage = services.storage
+
+    def get(self, id):
+        """
+        Get a consultation by ID.
+
+        Returns:
+            ConsultationRecord: id, patient, doctor, date, time and series_id, or None if there is no such consultation
+        """
+        return self.storage.get(self.table, id)
+
+    def upcoming(self, after=None, limit: int = 100) -> list:
+        """
+        Get a page of today's and future consultations, sorted by date and time.
+
+        Args:
+            after (tuple): Last row of the previous page, or None for the first page
+            limit (int): Maximum number of rows
+
+        Returns:
+            list: UpcomingConsultation rows of (id, doctor, specialization, patient, "date time")
+        """
+        return self.storage.upcoming(Date.today().isoformat(), after, limit)
+
+    def conflicts(self, doctor, patient, date: str, time: str, ignore=None) -> list:
+        """
+        Find what keeps a consultation from being booked.
+
+        Returns:
+            list: ("doctor" or "patient", consultation ID) for every clash; empty if the slot is free
+
+        Raises:
+            ValueError: If the date or time is not valid
+        """
+        return self.services.availability().conflicts(doctor, patient, date, time, ignore=ignore)
+
+    def book(self, patient, doctor, date: str, time: str, series_id=None) -> int:
+        """
+        Book a consultation.
+
+        Args:
+            patient (int): ID of the patient
+            doctor (int): ID of the doctor
+            date (str): Date as YYYY-MM-DD
+            time (str): Time as HH:MM
+            series_id (int): Series the consultation belongs to (see classes.series)
+
+        Returns:
+            int: ID of the new consultation
+
+        Raises:
+            BookingError: If the date or time is invalid or the doctor or patient is already booked
+        """
+        with self.storage.transaction(immediate=True):
+            self.check(doctor, patient, date, time)
+            id = self.storage.insert(self.table, {
+                "patient": patient, "doctor": doctor, "date": date, "time": time, "series_id": series_id
+            })
+        self.services.availability().add(id, doctor, patient, date, time)
+        return id
+
+    def book_many(self, requests, series_id=None) -> list:
+        """
+        Book a batch of consultations in one transaction.
+
+        Every request is checked against the stored consultations, all at once
+        with one query inside the write-locked transaction, and against the
+        requests accepted before it in the same batch; conflicting requests are
+        rejected without affecting the others.
+
+        Args:
+            requests (iterable): (patient, doctor, start) tuples, where patient and
+                doctor are IDs or emails (doctors may also be given by name) and
+                start is accepted by split_start
+            series_id (int): Series the booked consultations belong to
+
+        Returns:
+            list: One dict per request, in order, with "row" (0-based position),
+                "status" (ACCEPTED or REJECTED), "reason" (None when accepted) and
+                "id" (ID of the new consultation, None when rejected)
+        """
+
+        requests = list(requests)
+        patients = self.services.patients.resolve(request[0] for request in requests)
+        doctors = self.services.doctors.resolve((request[1] for request in requests), by_name=True)
+
+        with self.storage.transaction(immediate=True):
+            report, accepted = self._check_many(requests, patients, doctors, series_id)
+            ids = self.storage.insert_many(self.table, [values for _, values in accepted])
+        existing = self.services.availability()
+        for (entry, values), id in zip(accepted, ids):
+            entry["id"] = id
+            existing.add(id, values["doctor"], values["patient"], values["date"], values["time"])
+        return report
+
+    def _check_many(self, requests, patients, doctors, series_id):
+        """
+        Check a batch of bookings (see book_many), with the write lock held.
+
+        Returns:
+            tuple: (report, accepted) where accepted holds (report entry, values of the new row)
+        """
+        from classes.availability import Availability, slot_start
+
+        report = []
+        slots = []  # (report entry, patient, doctor, date, time) of the requests that can be checked
+        for row, (patient_ref, doctor_ref, start) in enumerate(requests):
+            entry = {"row": row, "status": REJECTED, "reason": None, "id": None}
+            report.append(entry)
+            patient, doctor = patients.get(patient_ref), doctors.get(doctor_ref)
+            if patient is None:
+                entry["reason"] = f"Unknown patient: {patient_ref}"
+                continue
+            if doctor is None:
+                entry["reason"] = f"Unknown or ambiguous doctor: {doctor_ref}"
+                continue
+            try:
+                date, time = split_start(start)
+                slot_start(date, time)
+            except ValueError:
+                entry["reason"] = f"Invalid start: {start}"
+                continue
+            slots.append((entry, patient, doctor, date, time))
+
+        # Every request against the stored consultations in one query
+        duration = self.services.availability().duration
+        taken = {}  # position in slots -> first ("doctor" or "patient", consultation ID) clash
+        for position, kind, id in self.storage.conflicts(
+            ((doctor, patient, date, time) for _, patient, doctor, date, time in slots), duration=duration
+        ):
+            taken.setdefault(position, (kind, id))
+
+        batch = Availability(duration)  # Requests accepted so far, to catch clashes inside the batch
+        accepted = []  # (report entry, values of the new row)
+        for position, (entry, patient, doctor, date, time) in enumerate(slots):
+            if position in taken:
+                kind, id = taken[position]
+                entry["reason"] = f"The {kind} already has consultation {id} at that time"
+                continue
+            clashes = batch.conflicts(doctor, patient, date, time)
+            if clashes:
+                kind, other_row = clashes[0]
+                entry["reason"] = f"The {kind} is already booked by row {other_row} of this batch"
+                continue
+
+            batch.add(entry["row"], doctor, patient, date, time)
+            entry["status"] = ACCEPTED
+            accepted.append((entry, {"patient": patient, "doctor": doctor, "date": date, "time": time, "series_id": series_id}))
+        return report, accepted
+
+    def reschedule(self, id, doctor=None, patient=None, date=None, time=None):
+        """
+        Move a consultation to another doctor, patient, date and/or time.
+
+        Args:
+            id (int): ID of the consultation
+            doctor (int): New doctor ID (None keeps the current one)
+            patient (int): New patient ID (None keeps the current one)
+            date (str): New date as YYYY-MM-DD (None keeps the current one)
+            time (str): New time as HH:MM (None keeps the current one)
+
+        Raises:
+            BookingError: If there is no such consultation, the date or time is
+                invalid or the new slot is taken
+        """
+        with self.storage.transaction(immediate=True):
+            current = self.get(id)
+            if current is None:
+                raise BookingError(f"Consultation {id} does not exist")
+            values = {
+                "doctor": current.doctor if doctor is None else doctor,
+                "patient": current.patient if patient is None else patient,
+                "date": current.date if date is None else date,
+                "time": current.time if time is None else time,
+            }
+            self.check(values["doctor"], values["patient"], values["date"], values["time"], ignore=id)
+            self.storage.update(self.table, id, values)
+        self.services.availability().add(id, values["doctor"], values["patient"], values["date"], values["time"])
+
+    def cancel(self, ids) -> int:
+        """
+        Cancel (delete) consultations.
+
+        Args:
+            ids (iterable): IDs of the consultations
+
+        Returns:
+            int: Number of consultations cancelled
+        """
+        cancelled = self.storage.delete(self.table, ids)
+        availability = self.services.availability()
+        for id in cancelled:
+            availability.remove(id)
+        return len(cancelled)
+
+    def cancel_for_doctors(self, doctors) -> int:
+        """Cancel every consultation of the given doctors (before the doctors are deleted)."""
+        return self.cancel([id for id, _ in self.storage.find(self.table, "doctor", doctors)])
+
+    def check(self, doctor, patient, date: str, time: str, ignore=None):
+        """
+        Make sure the doctor and the patient are both free at a time.
+
+        The availability engine answers first; the stored consultations are then
+        checked too (an indexed lookup), which is what counts when called inside
+        an immediate transaction.
+
+        Args:
+            doctor (int): ID of the doctor
+            patient (int): ID of the patient
+            date (str): Date as YYYY-MM-DD
+            time (str): Time as HH:MM
+            ignore (int): ID of a consultation to leave out (the one being edited)
+
+        Raises:
+            BookingError: If the date or time is invalid or either of them is already booked
+        """
+        try:
+            clashes = self.conflicts(doctor, patient, date, time, ignore=ignore)
+        except ValueError:
+            raise BookingError("Please enter a valid date (YYYY-MM-DD) and time (HH:MM)")
+        if not clashes:
+            clashes = [(kind, id) for _, kind, id in self.storage.conflicts(
+                [(doctor, patient, date, time)], ignore=() if ignore is None else (ignore,),
+                duration=self.services.availability().duration
+            )]
+        if clashes:
+            busy = sorted({kind for kind, _ in clashes})
+            raise BookingError(
+                f"The {' and the '.join(busy)} already {'have' if len(busy) > 1 else 'has'} a consultation "
+                f"within {self.services.availability().duration} minutes of {date} {time}.",
+                clashes
+            )
@@ -0,0 +1,267 @@
+"""
+Password hashing: salted, tunable key derivation with transparent upgrades.
+
+Passwords are stored in the users.password column as self-describing
+strings, so the salt and the cost travel with the hash and old rows keep
+verifying after the settings change:
+
+    pbkdf2_sha256$<iterations>$<salt>$<hash>
+    scrypt$<n>$<r>$<p>$<salt>$<hash>
+    <64 hex digits>                            legacy unsalted SHA-256
+
+New hashes use the hasher built from the [passwords] section of
+constants.PATH_TO_DB_CONFIG (or CLINIC_PASSWORD_<KEY> environment variables).
+needs_rehash tells whether a stored hash is legacy or was made with another
+algorithm or cost, so it can be replaced on the next successful login (see
+services.auth).
+
+A hash costs hundreds of milliseconds by design; never verify on the Tk
+thread. benchmarks/bench_password_hashing.py picks the cost for a target
+login latency on the clinic's hardware.
+"""
+import abc
+import base64
+import configparser
+import hashlib
+import hmac
+import os
+import re
+
+DEFAULT_SETTINGS = {
+    "algorithm": "pbkdf2_sha256",
+    "iterations": 600000,   # PBKDF2-HMAC-SHA256 (OWASP 2023)
+    "scrypt_n": 2 ** 17,    # scrypt CPU/memory cost (power of 2, OWASP 2023); uses 128 * n * r bytes
+    "scrypt_r": 8,
+    "scrypt_p": 1,
+}
+
+ENV_PREFIX = "CLINIC_PASSWORD_"
+
+SALT_BYTES = 16
+
+_LEGACY_SHA256 = re.compile(r"[0-9a-f]{64}")
+
+
+def _encode(data: bytes) -> str:
+    return base64.b64encode(data).decode("ascii").rstrip("=")
+
+
+def _decode(text: str) -> bytes:
+    return base64.b64decode(text + "=" * (-len(text) % 4))
+
+
+class PasswordHasher(abc.ABC):
+    """Turns a password into a stored hash string and checks passwords against such strings."""
+    algorithm = None
+
+    @abc.abstractmethod
+    def hash(self, password: str) -> str:
+        """
+        Hash a password with a new random salt.
+
+        Returns:
+            str: The string stored in users.password
+        """
+
+    @abc.abstractmethod
+    def verify(self, password: str, encoded: str) -> bool:
+        """Check a password against a hash made by this algorithm (with whatever cost it was made with)."""
+
+    @abc.abstractmethod
+    def cost(self, encoded: str) -> tuple:
+        """Return the cost parameters a hash was made with, comparable with `self.params`."""
+
+    @property
+    @abc.abstractmethod
+    def params(self) -> tuple:
+        """Cost parameters of new hashes."""
+
+
+class PBKDF2Hasher(PasswordHasher):
+    """
+    PBKDF2-HMAC-SHA256.
+
+    Args:
+        iterations (int): Number of iterations; the time of a hash grows linearly with it
+    """
+    algorithm = "pbkdf2_sha256"
+
+    def __init__(self, iterations: int = DEFAULT_SETTINGS["iterations"]):
+        if iterations < 1:
+            raise ValueError(f"Invalid iterations: {iterations}")
+        self.iterations = iterations
+
+    @property
+    def params(self) -> tuple:
+        return (self.iterations,)
+
+    def hash(self, password: str) -> str:
+        salt = os.urandom(SALT_BYTES)
+        digest = hashlib.pbkdf2_hmac("sha256", password.encode(), salt, self.iterations)
+        return f"{self.algorithm}${self.iterations}${_encode(salt)}${_encode(digest)}"
+
+    def verify(self, password: str, encoded: str) -> bool:
+        _, iterations, salt, digest = encoded.split("$")
+        expected = _decode(digest)
+        actual = hashlib.pbkdf2_hmac("sha256", password.encode(), _decode(salt), int(iterations), len(expected))
+        return hmac.compare_digest(actual, expected)
+
+    def cost(self, encoded: str) -> tuple:
+        return (int(encoded.split("$")[1]),)
+
+
+class ScryptHasher(PasswordHasher):
+    """
+    scrypt, memory-hard: it needs 128 * n * r bytes per hash, which makes guessing on GPUs expensive.
+
+    Args:
+        n (int): CPU/memory cost, a power of 2
+        r (int): Block size
+        p (int): Parallelization
+    """
+    algorithm = "scrypt"
+
+    def __init__(self, n: int = DEFAULT_SETTINGS["scrypt_n"], r: int = DEFAULT_SETTINGS["scrypt_r"],
+                 p: int = DEFAULT_SETTINGS["scrypt_p"]):
+        if n < 2 or n & (n - 1):
+            raise ValueError(f"Invalid scrypt n: {n} (expected a power of 2)")
+        self.n, self.r, self.p = n, r, p
+
+    @property
+    def params(self) -> tuple:
+        return (self.n, self.r, self.p)
+
+    @staticmethod
+    def _derive(password: str, salt: bytes, n: int, r: int, p: int, length: int = 32) -> bytes:
+        # hashlib refuses more than 32 MiB by default; allow what these parameters need
+        return hashlib.scrypt(
+            password.encode(), salt=salt, n=n, r=r, p=p, dklen=length, maxmem=128 * r * (n + p) + 1024 * 1024
+        )
+
+    def hash(self, password: str) -> str:
+        salt = os.urandom(SALT_BYTES)
+        digest = self._derive(password, salt, self.n, self.r, self.p)
+        return f"{self.algorithm}${self.n}${self.r}${self.p}${_encode(salt)}${_encode(digest)}"
+
+    def verify(self, password: str, encoded: str) -> bool:
+        _, n, r, p, salt, digest = encoded.split("$")
+        expected = _decode(digest)
+        actual = self._derive(password, _decode(salt), int(n), int(r), int(p), len(expected))
+        return hmac.compare_digest(actual, expected)
+
+    def cost(self, encoded: str) -> tuple:
+        return tuple(int(value) for value in encoded.split("$")[1:4])
+
+
+HASHERS = {hasher.algorithm: hasher for hasher in (PBKDF2Hasher, ScryptHasher)}
+
+
+def load_settings(config_path: str = None, environ=None) -> dict:
+    """
+    Read the password hashing settings from the config file and the environment.
+
+    Args:
+        config_path (str): Path to the INI file (defaults to constants.PATH_TO_DB_CONFIG)
+        environ (dict): Environment to read overrides from (defaults to os.environ)
+
+    Returns:
+        dict: Every setting of DEFAULT_SETTINGS
+
+    Raises:
+        ValueError: If a setting is unknown or has an invalid value
+    """
+    if config_path is None:
+        from constants import PATH_TO_DB_CONFIG
+        config_path = PATH_TO_DB_CONFIG
+    if environ is None:
+        environ = os.environ
+
+    values = {}
+    parser = configparser.ConfigParser()
+    if parser.read(config_path) and parser.has_section("passwords"):
+        values.update(parser.items("passwords"))
+    for key in DEFAULT_SETTINGS:
+        env_value = environ.get(ENV_PREFIX + key.upper())
+        if env_value is not None:
+            values[key] = env_value
+
+    unknown = set(values) - set(DEFAULT_SETTINGS)
+    if unknown:
+        raise ValueError(f"Unknown password setting(s): {', '.join(sorted(unknown))}")
+
+    settings = dict(DEFAULT_SETTINGS)
+    for key, value in values.items():
+        settings[key] = str(value).strip().lower() if key == "algorithm" else int(value)
+    if settings["algorithm"] not in HASHERS:
+        raise ValueError(f"Unknown password algorithm: {settings['algorithm']!r} (expected one of {', '.join(HASHERS)})")
+    return settings
+
+
+def create_hasher(settings: dict) -> PasswordHasher:
+    """Build the hasher described by settings as returned by load_settings."""
+    if settings["algorithm"] == ScryptHasher.algorithm:
+        return ScryptHasher(settings["scrypt_n"], settings["scrypt_r"], settings["scrypt_p"])
+    return PBKDF2Hasher(settings["iterations"])
+
+
+_hasher = None
+
+
+def get_hasher() -> PasswordHasher:
+    """Get the hasher used for new hashes, building it from the settings on first use."""
+    global _hasher
+    if _hasher is None:
+        _hasher = create_hasher(load_settings())
+    return _hasher
+
+
+def set_hasher(hasher: PasswordHasher = None):
+    """
+    Replace the hasher used for new hashes.
+
+    Args:
+        hasher (PasswordHasher): The new hasher, or None to rebuild it from the settings
+    """
+    global _hasher
+    _hasher = hasher
+
+
+def hash_password(password: str) -> str:
+    """Hash a password with the configured hasher."""
+    return get_hasher().hash(password)
+
+
+def verify(password: str, encoded: str) -> bool:
+    """
+    Check a password against a stored hash of any supported format.
+
+    Returns:
+        bool: True if the password matches; False for a wrong password or an unreadable hash
+    """
+    if not encoded:
+        return False
+    if _LEGACY_SHA256.fullmatch(encoded):
+        return hmac.compare_digest(hashlib.sha256(password.encode()).hexdigest(), encoded)
+    hasher_class = HASHERS.get(encoded.split("$", 1)[0])
+    if hasher_class is None:
+        return False
+    try:
+        return hasher_class().verify(password, encoded)  # The cost is read from the hash
+    except (ValueError, TypeError):  # Truncated or corrupted hash
+        return False
+
+
+def needs_rehash(encoded: str) -> bool:
+    """
+    Tell whether a stored hash should be replaced by one made with the configured hasher.
+
+    Returns:
+        bool: True for legacy SHA-256 hashes, another algorithm or a different cost
+    """
+    hasher = get_hasher()
+    if not encoded or encoded.split("$", 1)[0] != hasher.algorithm:
+        return True
+    try:
+        return hasher.cost(encoded) != hasher.params
+    except (ValueError, IndexError):
+        return True
@@ -0,0 +1,264 @@
+"""
+Services for the records managed in the admin menu and the pickers: users,
+specializations, doctors and patients.
+
+Every service exposes the same small API over one table (get, add, update,
+delete, pager, resolve) and keeps the in-memory engines of its Services
+container up to date, so callers never have to remember to refresh them.
+Deleting a doctor or a specialization removes what depends on it.
+"""
+
+
+class RecordService:
+    """
+    List, search, add, update and delete the rows of one table.
+
+    Args:
+        services (Services): Container the service belongs to (storage and engines)
+    """
+    table = None
+
+    def __init__(self, services):
+        self.services = services
+        self.storage = services.storage
+
+    def get(self, id):
+        """
+        Get a row by ID.
+
+        Returns:
+            NamedTuple: The row's record (see classes.records), or None if there is no such row
+        """
+        return self.storage.get(self.table, id)
+
+    def add(self, values: dict) -> int:
+        """
+        Insert a row.
+
+        Args:
+            values (dict): Column -> value
+
+        Returns:
+            int: ID of the new row
+        """
+        id = self.storage.insert(self.table, self._prepare(values))
+        self._changed([id])
+        return id
+
+    def update(self, id, values: dict) -> bool:
+        """
+        Change some columns of a row.
+
+        Args:
+            id (int): ID of the row
+            values (dict): Column -> new value (other columns are kept)
+
+        Returns:
+            bool: False if there is no such row
+        """
+        updated = self.storage.update(self.table, id, self._prepare(values))
+        self._changed([id])
+        return updated
+
+    def delete(self, ids) -> list:
+        """
+        Delete rows.
+
+        Args:
+            ids (iterable): IDs of the rows
+
+        Returns:
+            list: IDs of the rows that were deleted
+        """
+        deleted = self.storage.delete(self.table, ids)
+        self._changed(deleted)
+        return deleted
+
+    def pager(self, columns, query: str = ""):
+        """
+        Build a page fetcher for a DataGrid over the table, or over the rows matching a search.
+
+        Args:
+            columns (tuple): Columns to show (foreign keys are shown by name)
+            query (str): Search text; empty lists every row by ID
+
+        Returns:
+            callable: `fetch_page(after, limit)` returning a list of rows
+        """
+        query = query.strip()
+        if not query:
+            return lambda after, limit: self.storage.page(self.table, columns, after, limit)
+        return lambda after, limit: self.storage.search(self.table, columns, query, after, limit)
+
+    def resolve(self, keys, by_name=False) -> dict:
+        """
+        Map references to rows of the table to their IDs in bulk.
+
+        A reference is either an ID (int, or a string of digits) or an email.
+        A name is also accepted when `by_name` is set; names shared by several
+        rows are left unresolved.
+
+        Args:
+            keys (iterable): The references to resolve
+            by_name (bool): Also match references against the name column
+
+        Returns:
+            dict: reference -> ID, for every reference that was found
+        """
+        keys = list(keys)
+        ids, texts = {}, set()  # ID -> references naming it (e.g. 1 and "1"), other references
+        for key in set(keys):
+            if isinstance(key, int) or (isinstance(key, str) and key.strip().isdigit()):
+                ids.setdefault(int(key), []).append(key)
+            elif isinstance(key, str) and key.strip():
+                texts.add(key.strip())
+
+        resolved = {}
+        for id, _ in self.storage.find(self.table, "id", ids):
+            for key in ids[id]:
+                resolved[key] = id
+
+        found_emails = {email: id for id, email in self.storage.find(self.table, "email", texts)}
+        names = {}
+        if by_name:
+            for id, name in self.storage.find(self.table, "name", texts - found_emails.keys()):
+                names.setdefault(name, []).append(id)
+
+        for text in texts:
+            if text in found_emails:
+                resolved[text] = found_emails[text]
+            elif len(names.get(text, ())) == 1:
+                resolved[text] = names[text][0]
+        # Map the original (unstripped) references too
+        for key in keys:
+            if isinstance(key, str) and key not in resolved and key.strip() in resolved:
+                resolved[key] = resolved[key.strip()]
+        return resolved
+
+    def _prepare(self, values: dict) -> dict:
+        """Turn the values given by a caller into the values stored (e.g. hash a password)."""
+        return dict(values)
+
+    def _changed(self, ids):
+        """Called with the IDs of rows that were inserted, updated or deleted."""
+
+
+class UserService(RecordService):
+    """Accounts that can log in. Passwords are given in plain text and stored hashed."""
+    table = "users"
+
+    @staticmethod
+    def hash_password(password: str) -> str:
+        """Hash a password the way it is stored in the users table (salted, see services.passwords)."""
+        from services.passwords import hash_password
+        return hash_password(password)
+
+    def _prepare(self, values: dict) -> dict:
+        values = dict(values)
+        if values.get("password"):
+            values["password"] = self.hash_password(values["password"])
+        if "is_admin" in values:
+            values["is_admin"] = 1 if values["is_admin"] else 0
+        return values
+
+
+class SpecializationService(RecordService):
+    """
+    Medical specializations. Deleting one deletes its doctors (and their consultations).
+
+    The names listed by the dropdowns are read once and kept, like the
+    typeahead indexes, until a specialization is added, edited or deleted
+    through the service (or forget() is called).
+    """
+    table = "specialization"
+
+    def __init__(self, services):
+        super().__init__(services)
+        self._names = None
+
+    def names(self) -> dict:
+        """
+        Get every specialization by name, for dropdowns.
+
+        Returns:
+            dict: name -> ID, sorted by name
+        """
+        names = self._names
+        if names is None:
+            names = self._names = dict(sorted(self.storage.rows(self.table, ("name", "id"))))
+        return dict(names)
+
+    def forget(self):
+        """Drop the kept names so they are read again on next use."""
+        self._names = None
+
+    def delete(self, ids) -> list:
+        ids = list(ids)
+        with self.storage.transaction():
+            doctors = [id for id, _ in self.storage.find("doctor", "specialization_id", ids)]
+            self.services.doctors.delete(doctors)
+            return super().delete(ids)
+
+    def _changed(self, ids):
+        self.forget()
+
+
+class PersonService(RecordService):
+    """Doctors or patients: rows with a name and an email, kept in a typeahead index."""
+
+    def typeahead(self, term: str, limit: int) -> list:
+        """
+        Find the people matching what was typed in a picker, best matches first.
+
+        Args:
+            term (str): What the user typed
+            limit (int): Maximum number of results
+
+        Returns:
+            list: PersonEntry (id, name, email) tuples
+        """
+        return self.services.index(self.table).search(term, limit)
+
+    def ids_for_email(self, email: str) -> list:
+        """Return the IDs of the people with the given email."""
+        return [id for id, _ in self.storage.find(self.table, "email", [email])]
+
+    def _changed(self, ids):
+        self.services.refresh_index(self.table, ids)
+
+
+class PatientService(PersonService):
+    """Patients."""
+    table = "patient"
+
+    def replace(self, email: str, values: dict) -> list:
+        """
+        Overwrite the details of the patients registered with an email.
+
+        The rows are updated in place, so their consultations stay attached.
+
+        Args:
+            email (str): Email the patients are registered with
+            values (dict): Column -> new value
+
+        Returns:
+            list: IDs of the patients that were updated
+        """
+        ids = self.ids_for_email(email)
+        with self.storage.transaction():
+            for id in ids:
+                self.storage.update(self.table, id, self._prepare(values))
+        self._changed(ids)
+        return ids
+
+
+class DoctorService(PersonService):
+    """Doctors. Deleting one cancels their consultations and removes their working hours."""
+    table = "doctor"
+
+    def delete(self, ids) -> list:
+        ids = list(ids)
+        with self.storage.transaction():
+            self.services.consultations.cancel_for_doctors(ids)
+            self.storage.delete_where("doctor_schedule", "doctor", ids)
+            return super().delete(ids)
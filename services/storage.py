@@ -0,0 +1,501 @@
+"""
+Storage backends of the service layer.
+
+The services in this package never run SQL themselves; they read and write
+rows through a storage backend with the interface below. SQLiteStorage is the
+production backend over clinic.db (through database.connection), while
+MemoryStorage keeps every table in dicts with the indexes the services need,
+so the services can be benchmarked or tested without a database or a display.
+
+Interface (both backends):
+    transaction(immediate=False)                    context manager, nests; immediate takes the write lock
+    insert(table, values) -> id
+    insert_many(table, rows) -> [id]                rows are dicts with the same keys
+    update(table, id, values) -> bool
+    delete(table, ids) -> [id]                      the IDs that existed
+    delete_where(table, column, values) -> int      rows deleted
+    get(table, id) -> record | None                 see classes.records.RECORDS
+    find(table, column, values) -> [(id, value)]    rows whose column is one of values
+    lookup(table, column, value, columns) -> tuple  first row whose column equals value, or None
+    rows(table, columns) -> [tuple]                 every row, raw column values
+    page(table, columns, after, limit) -> [tuple]   display rows ordered by id
+    search(table, columns, text, after, limit)      display rows matching text, best first
+    upcoming(today, after, limit) -> [UpcomingConsultation]   dashboard rows, see UPCOMING_COLUMNS
+    conflicts(slots, ignore) -> [(position, kind, id)]         stored consultations overlapping any of the
+                                                    (doctor, patient, date, time) slots
+
+Display rows show the name of the row a foreign key points to instead of its
+ID (see database.schema.DISPLAY_COLUMNS). `after` is the last row of the
+previous page (keyset pagination), or None for the first page. Whole rows are
+immutable records (classes.records), built by a row factory as they are
+fetched.
+"""
+import bisect
+import re
+from contextlib import contextmanager
+
+from constants import CONSULTATION_DURATION_MINUTES, SEARCH_RESULT_LIMIT
+
+# Columns that can be written, per table (the id column is always allowed)
+TABLE_COLUMNS = {
+    "users": ("email", "password", "is_admin"),
+    "specialization": ("name",),
+    "doctor": ("name", "email", "specialization_id"),
+    "patient": ("name", "address", "birth_date", "phone", "email"),
+    "consultations": ("patient", "doctor", "date", "time", "series_id"),
+    "consultation_series": ("patient", "doctor", "start_date", "time", "interval", "unit", "until", "count"),
+    "doctor_schedule": ("doctor", "weekday", "start_time", "end_time"),
+}
+
+# Foreign keys shown by name in display rows: table -> {column: referenced table}
+FOREIGN_KEYS = {
+    "doctor": {"specialization_id": "specialization"},
+    "consultations": {"patient": "patient", "doctor": "doctor"},
+}
+
+# Columns of the rows returned by upcoming()
+UPCOMING_COLUMNS = ("id", "doctor", "specialization", "patient", "date and time")
+
+# Keys looked up per query, well below SQLite's limit on bound parameters
+LOOKUP_CHUNK_SIZE = 500
+
+
+def _check_columns(table: str, columns):
+    """Raise ValueError unless every column is a known column of the table (names are put into SQL)."""
+    allowed = TABLE_COLUMNS.get(table)
+    if allowed is None:
+        raise ValueError(f"Invalid table name: {table}")
+    for column in columns:
+        if column != "id" and column not in allowed:
+            raise ValueError(f"Invalid column name: {column}")
+
+
+class SQLiteStorage:
+    """Storage backend over the application database (see database.connection)."""
+
+    # Ready-to-display rows kept by triggers (see database/read_model.py)
+    UPCOMING_QUERY = """
+        SELECT id, doctor, specialization, patient, start
+        FROM upcoming_consultations
+        WHERE {where}
+        ORDER BY date, time, id
+        LIMIT ?
+    """
+
+    def transaction(self, immediate: bool = False):
+        """Context manager running the enclosed writes in one transaction (see database.connection.transaction)."""
+        from database.connection import transaction
+        return transaction(immediate)
+
+    def insert(self, table: str, values: dict) -> int:
+        from database.connection import execute
+        _check_columns(table, values)
+        placeholders = ", ".join("?" * len(values))
+        cursor = execute(f"INSERT INTO {table} ({', '.join(values)}) VALUES ({placeholders})", list(values.values()))
+        return cursor.lastrowid
+
+    def insert_many(self, table: str, rows: list) -> list:
+        from database.connection import transaction
+        if not rows:
+            return []
+        columns = list(rows[0])
+        _check_columns(table, columns)
+        placeholders = ", ".join("?" * len(columns))
+        sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders}) RETURNING id"
+        ids = []
+        with transaction() as cursor:
+            # One statement per row: executemany does not return the rows of RETURNING
+            for row in rows:
+                cursor.execute(sql, [row[column] for column in columns])
+                ids.append(cursor.fetchone()[0])
+        return ids
+
+    def update(self, table: str, id, values: dict) -> bool:
+        from database.connection import execute
+        _check_columns(table, values)
+        if not values:
+            return self.get(table, id) is not None
+        set_clause = ", ".join(f"{column} = ?" for column in values)
+        cursor = execute(f"UPDATE {table} SET {set_clause} WHERE id = ?", [*values.values(), id])
+        return cursor.rowcount > 0
+
+    def delete(self, table: str, ids) -> list:
+        from database.connection import transaction
+        _check_columns(table, ())
+        ids = list(ids)
+        deleted = []
+        with transaction() as cursor:
+            for i in range(0, len(ids), LOOKUP_CHUNK_SIZE):
+                chunk = ids[i:i + LOOKUP_CHUNK_SIZE]
+                cursor.execute(f"DELETE FROM {table} WHERE id IN ({', '.join('?' * len(chunk))}) RETURNING id", chunk)
+                deleted.extend(row[0] for row in cursor.fetchall())
+        return deleted
+
+    def delete_where(self, table: str, column: str, values) -> int:
+        from database.connection import transaction
+        _check_columns(table, (column,))
+        values = list(values)
+        count = 0
+        with transaction() as cursor:
+            for i in range(0, len(values), LOOKUP_CHUNK_SIZE):
+                chunk = values[i:i + LOOKUP_CHUNK_SIZE]
+                cursor.execute(f"DELETE FROM {table} WHERE {column} IN ({', '.join('?' * len(chunk))})", chunk)
+                count += cursor.rowcount
+        return count
+
+    def get(self, table: str, id):
+        from classes.records import RECORDS, row_factory
+        from database.connection import fetchone
+        _check_columns(table, ())
+        record = RECORDS[table]
+        return fetchone(
+            f"SELECT {', '.join(record._fields)} FROM {table} WHERE id = ?", (id,), row_factory=row_factory(record)
+        )
+
+    def find(self, table: str, column: str, values) -> list:
+        from database.connection import fetchall
+        _check_columns(table, (column,))
+        values = list(values)
+        found = []
+        for i in range(0, len(values), LOOKUP_CHUNK_SIZE):
+            chunk = values[i:i + LOOKUP_CHUNK_SIZE]
+            found.extend(fetchall(
+                f"SELECT id, {column} FROM {table} WHERE {column} IN ({', '.join('?' * len(chunk))})", chunk
+            ))
+        return found
+
+    def lookup(self, table: str, column: str, value, columns):
+        from database.connection import fetchone
+        _check_columns(table, (column,) + tuple(columns))
+        return fetchone(f"SELECT {', '.join(columns)} FROM {table} WHERE {column} = ? LIMIT 1", (value,))
+
+    def rows(self, table: str, columns) -> list:
+        from database.connection import fetchall
+        _check_columns(table, columns)
+        return fetchall(f"SELECT {', '.join(columns)} FROM {table}")
+
+    def page(self, table: str, columns, after, limit: int, where: str = "", params: tuple = ()) -> list:
+        from database.connection import fetchall
+        from utils import build_query
+        _check_columns(table, columns)
+        conditions = [f"({where})"] if where else []
+        page_params = list(params)
+        if after is not None:
+            conditions.append(f"{table}.id > ?")
+            page_params.append(after[0])
+        query = build_query(table, columns)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += f" ORDER BY {table}.id LIMIT ?"
+        return fetchall(query, page_params + [limit])
+
+    def search(self, table: str, columns, text: str, after, limit: int) -> list:
+        """
+        Tables with a full-text index are ranked with bm25 (the best SEARCH_RESULT_LIMIT
+        matches, paged on (rank, id)); others fall back to a LIKE over every column.
+        """
+        from database.connection import fetchall
+        from database.search import FTS_TABLES, match_expression
+        from utils import build_query
+        _check_columns(table, columns)
+
+        if table not in FTS_TABLES:
+            escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            where = " OR ".join(f"{table}.{column} LIKE ? ESCAPE '\\'" for column in columns)
+            return self.page(table, columns, after, limit, where, (f"%{escaped}%",) * len(columns))
+        match = match_expression(text)
+        if match is None:
+            return self.page(table, columns, after, limit)
+
+        fts_table = FTS_TABLES[table]
+        # Read the matching rows through the ranked ids instead of scanning the table
+        # (fts_id, since build_query leaves the columns of tables without foreign keys unqualified)
+        select_query = build_query(table, columns).replace(
+            f" FROM {table}", f" FROM ranked JOIN {table} ON {table}.id = ranked.fts_id", 1
+        )
+        query = f"""
+            WITH ranked AS (
+                SELECT rowid AS fts_id, bm25({fts_table}) AS rank FROM {fts_table}
+                WHERE {fts_table} MATCH ? ORDER BY rank LIMIT ?
+            )
+            {select_query}
+        """
+        params = [match, SEARCH_RESULT_LIMIT]
+        if after is not None:
+            query += " WHERE (ranked.rank, ranked.fts_id) > (SELECT rank, fts_id FROM ranked WHERE fts_id = ?)"
+            params.append(after[0])
+        query += " ORDER BY ranked.rank, ranked.fts_id LIMIT ?"
+        return fetchall(query, params + [limit])
+
+    def upcoming(self, today: str, after, limit: int) -> list:
+        """Keyset pages on (date, time, id), each a short range scan over the primary key of upcoming_consultations."""
+        from classes.records import UpcomingConsultation, row_factory
+        from database.connection import fetchall
+        factory = row_factory(UpcomingConsultation)
+        if after is None:
+            return fetchall(self.UPCOMING_QUERY.format(where="date >= ?"), (today, limit), row_factory=factory)
+        after_date, after_time = after[4].split(" ", 1)
+        return fetchall(
+            self.UPCOMING_QUERY.format(where="(date, time, id) > (?, ?, ?)"),
+            (after_date, after_time, after[0], limit), row_factory=factory
+        )
+
+    # The slots of conflicts(), joined against consultations in one query
+    SLOTS_TABLE = """
+        CREATE TEMP TABLE IF NOT EXISTS booking_slots (
+            position INTEGER NOT NULL, doctor INTEGER, patient INTEGER,
+            date TEXT NOT NULL, after TEXT NOT NULL, before TEXT NOT NULL
+        )
+    """
+    CONFLICTS_QUERY = """
+        SELECT s.position, 'doctor', c.id FROM temp.booking_slots s
+        JOIN consultations c ON c.doctor = s.doctor AND c.date = s.date AND c.time > s.after AND c.time < s.before
+        WHERE c.id NOT IN (SELECT value FROM json_each(?1))
+        UNION ALL
+        SELECT s.position, 'patient', c.id FROM temp.booking_slots s
+        JOIN consultations c ON c.patient = s.patient AND c.date = s.date AND c.time > s.after AND c.time < s.before
+        WHERE c.id NOT IN (SELECT value FROM json_each(?1))
+        ORDER BY 1, 2, 3
+    """
+
+    def conflicts(self, slots, ignore=(), duration: int = CONSULTATION_DURATION_MINUTES) -> list:
+        """
+        The slots are loaded into a temporary table and joined against consultations on
+        (doctor, date, time) and (patient, date, time), both indexed, in a single query.
+        """
+        import json
+        from classes.availability import overlap_ranges
+        from database.connection import transaction
+        rows = [
+            (position, doctor, patient, day, after, before)
+            for position, (doctor, patient, date, time) in enumerate(slots)
+            for day, after, before in overlap_ranges(date, time, duration)
+        ]
+        if not rows:
+            return []
+        with transaction() as cursor:
+            cursor.execute(self.SLOTS_TABLE)
+            cursor.execute("DELETE FROM temp.booking_slots")
+            cursor.executemany("INSERT INTO temp.booking_slots VALUES (?, ?, ?, ?, ?, ?)", rows)
+            cursor.execute(self.CONFLICTS_QUERY, (json.dumps(list(ignore)),))
+            return cursor.fetchall()
+
+
+class MemoryStorage:
+    """
+    Storage backend keeping every table in memory, for tests and benchmarks.
+
+    Each table is a dict of id -> record (see classes.records). Consultations
+    are also kept in a sorted (date, time, id) list, so upcoming() is a binary
+    search plus a slice like the SQLite range scan. Records are immutable, so
+    a transaction can snapshot the tables with shallow copies and restore them
+    if it fails.
+    """
+
+    # Columns matched by search(), like the FTS tables of the SQLite backend
+    SEARCH_COLUMNS = {
+        "users": ("email",),
+        "specialization": ("name",),
+        "doctor": ("name", "email", "specialization_id"),
+        "patient": ("name", "email", "phone", "address"),
+    }
+
+    def __init__(self):
+        self._tables = {table: {} for table in TABLE_COLUMNS}
+        self._by_start = []  # sorted (date, time, id) of every consultation
+        self._depth = 0
+
+    @contextmanager
+    def transaction(self, immediate: bool = False):
+        """Run the enclosed writes atomically: if the block raises, every table is restored (nothing to lock)."""
+        if self._depth:
+            self._depth += 1
+            try:
+                yield self
+            finally:
+                self._depth -= 1
+            return
+        snapshot = {table: dict(rows) for table, rows in self._tables.items()}, list(self._by_start)
+        self._depth = 1
+        try:
+            yield self
+        except BaseException:
+            self._tables, self._by_start = snapshot
+            raise
+        finally:
+            self._depth = 0
+
+    def _table(self, table: str, columns=()) -> dict:
+        _check_columns(table, columns)
+        return self._tables[table]
+
+    def _index_start(self, row, add: bool):
+        """Add a consultation to, or remove it from, the (date, time, id) list."""
+        key = (row.date or "", row.time or "", row.id)
+        index = bisect.bisect_left(self._by_start, key)
+        if add:
+            self._by_start.insert(index, key)
+        elif index < len(self._by_start) and self._by_start[index] == key:
+            del self._by_start[index]
+
+    def insert(self, table: str, values: dict) -> int:
+        from classes.records import RECORDS, from_dict
+        rows = self._table(table, values)
+        id = values.get("id")
+        if id is None:
+            id = max(rows, default=0) + 1
+        elif id in rows:
+            raise ValueError(f"Duplicate id {id} in {table}")
+        row = from_dict(RECORDS[table], {**values, "id": id})
+        rows[id] = row
+        if table == "consultations":
+            self._index_start(row, add=True)
+        return id
+
+    def insert_many(self, table: str, rows: list) -> list:
+        with self.transaction():
+            return [self.insert(table, values) for values in rows]
+
+    def update(self, table: str, id, values: dict) -> bool:
+        from classes.records import from_dict
+        rows = self._table(table, values)
+        old = rows.get(id)
+        if old is None:
+            return False
+        row = from_dict(type(old), {**old._asdict(), **values, "id": id})
+        rows[id] = row
+        if table == "consultations":
+            self._index_start(old, add=False)
+            self._index_start(row, add=True)
+        return True
+
+    def delete(self, table: str, ids) -> list:
+        rows = self._table(table)
+        deleted = []
+        for id in ids:
+            row = rows.pop(id, None)
+            if row is not None:
+                deleted.append(id)
+                if table == "consultations":
+                    self._index_start(row, add=False)
+        return deleted
+
+    def delete_where(self, table: str, column: str, values) -> int:
+        rows = self._table(table, (column,))
+        values = set(values)
+        doomed = [key for key, row in rows.items() if getattr(row, column) in values]
+        if table == "consultations":
+            return len(self.delete(table, doomed))
+        for key in doomed:
+            del rows[key]
+        return len(doomed)
+
+    def get(self, table: str, id):
+        return self._table(table).get(id)
+
+    def find(self, table: str, column: str, values) -> list:
+        rows = self._table(table, (column,))
+        values = set(values)
+        if column == "id":
+            return [(id, id) for id in values if id in rows]
+        return [(id, getattr(row, column)) for id, row in rows.items() if getattr(row, column) in values]
+
+    def lookup(self, table: str, column: str, value, columns):
+        rows = self._table(table, (column,) + tuple(columns))
+        for row in rows.values():
+            if getattr(row, column) == value:
+                return tuple(getattr(row, name) for name in columns)
+        return None
+
+    def rows(self, table: str, columns) -> list:
+        rows = self._table(table, columns)
+        return [tuple(getattr(row, column) for column in columns) for row in rows.values()]
+
+    def _display(self, table: str, row, columns) -> tuple:
+        """Build a display row, showing names instead of foreign key IDs."""
+        from database.schema import DISPLAY_COLUMNS
+        foreign_keys = FOREIGN_KEYS.get(table, {})
+        values = []
+        for column in columns:
+            value = getattr(row, column)
+            target = foreign_keys.get(column)
+            if target is not None:
+                referenced = self._tables[target].get(value)
+                value = getattr(referenced, DISPLAY_COLUMNS.get(target, "id")) if referenced else None
+            values.append(value)
+        return tuple(values)
+
+    def page(self, table: str, columns, after, limit: int) -> list:
+        rows = self._table(table, columns)
+        ids = sorted(rows)
+        start = 0 if after is None else bisect.bisect_right(ids, after[0])
+        return [self._display(table, rows[id], columns) for id in ids[start:start + limit]]
+
+    def search(self, table: str, columns, text: str, after, limit: int) -> list:
+        """Every word of the text must start a word of the searched columns; matches come in id order."""
+        from classes.search_index import fold
+        rows = self._table(table, columns)
+        terms = re.findall(r"\w+", fold(text))
+        if not terms:
+            return self.page(table, columns, after, limit)
+        searched = self.SEARCH_COLUMNS.get(table, columns)
+
+        matches = []
+        for id in sorted(rows):
+            if after is not None and id <= after[0]:
+                continue
+            haystack = " ".join(str(value) for value in self._display(table, rows[id], searched) if value is not None)
+            words = re.findall(r"\w+", fold(haystack))
+            if all(any(word.startswith(term) for word in words) for term in terms):
+                matches.append(self._display(table, rows[id], columns))
+                if len(matches) >= limit:
+                    break
+        return matches
+
+    def upcoming(self, today: str, after, limit: int) -> list:
+        from classes.records import UpcomingConsultation
+        if after is None:
+            start = bisect.bisect_left(self._by_start, (today,))
+        else:
+            after_date, after_time = after[4].split(" ", 1)
+            start = bisect.bisect_right(self._by_start, (after_date, after_time, after[0]))
+
+        consultations = self._tables["consultations"]
+        doctors, patients = self._tables["doctor"], self._tables["patient"]
+        specializations = self._tables["specialization"]
+        found = []
+        for date, time, id in self._by_start[start:]:
+            consultation = consultations[id]
+            doctor = doctors.get(consultation.doctor)
+            patient = patients.get(consultation.patient)
+            specialization = doctor and specializations.get(doctor.specialization_id)
+            if not (doctor and patient and specialization):
+                continue  # Inner join semantics: rows with a dangling reference are not shown
+            found.append(UpcomingConsultation(id, doctor.name, specialization.name, patient.name, f"{date} {time}"))
+            if len(found) >= limit:
+                break
+        return found
+
+    def conflicts(self, slots, ignore=(), duration: int = CONSULTATION_DURATION_MINUTES) -> list:
+        """The consultations of the days the slots reach are checked against an engine holding the slots."""
+        from classes.availability import Availability, overlap_ranges
+        slots = list(slots)
+        wanted = Availability(duration)
+        wanted.load((position, doctor, patient, date, time) for position, (doctor, patient, date, time) in enumerate(slots))
+        days = {day for _, _, date, time in slots for day, _, _ in overlap_ranges(date, time, duration)}
+        ignore = set(ignore)
+        consultations = self._tables["consultations"]
+        found = []
+        for day in days:
+            for date, _, id in self._by_start[bisect.bisect_left(self._by_start, (day,)):]:
+                if date != day:
+                    break
+                if id in ignore:
+                    continue
+                row = consultations[id]
+                try:
+                    clashes = wanted.conflicts(row.doctor, row.patient, row.date, row.time)
+                except ValueError:
+                    continue
+                found.extend((position, kind, id) for kind, position in clashes)
+        return sorted(found)
@@ -0,0 +1,104 @@
+"""
+Background warm-up of the data the Menu needs, while the user logs in.
+
+The first window is drawn before anything is read from clinic.db. Then
+start_warmup() loads, on a daemon thread, the shared in-memory data that the
+Tk thread would otherwise load the first time a window needs it:
+
+    consultations    the availability engine (one scan of the consultations table),
+                     behind every booking check and the Next Available window
+    doctors          the typeahead index of the doctor picker
+    specializations  the names listed by the Next Available and doctor forms
+
+Each of them is loaded under its own lock, so a window that needs one while
+it is still loading waits for that load instead of starting another. The
+time of each step is kept (Warmup.timings) for benchmarks/bench_startup.py.
+"""
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Steps in the order they run, the ones the Menu needs first at the front
+STEPS = ("consultations", "doctors", "specializations")
+
+
+class Warmup:
+    """
+    Loads the shared data of a Services container on a background thread.
+
+    Args:
+        services (Services): Container to warm up (defaults to get_services(), resolved on the thread)
+        steps (tuple): Names of the steps to run, from STEPS
+    """
+
+    def __init__(self, services=None, steps=STEPS):
+        unknown = set(steps) - set(STEPS)
+        if unknown:
+            raise ValueError(f"Unknown warm-up step(s): {', '.join(sorted(unknown))}")
+        self.services = services
+        self.steps = tuple(steps)
+        self.timings = {}  # step -> seconds, filled as steps finish
+        self._done = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start the warm-up thread (once)."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run, name="warmup", daemon=True)
+            self._thread.start()
+        return self
+
+    def wait(self, timeout: float = None) -> bool:
+        """
+        Wait for every step to finish.
+
+        Returns:
+            bool: False if the timeout expired first
+        """
+        return self._done.wait(timeout)
+
+    def run(self):
+        """Run every step on the calling thread; a failed step is logged and the next one runs."""
+        from database.connection import close_connection
+        try:
+            if self.services is None:
+                from services import get_services
+                self.services = get_services()
+            for step in self.steps:
+                started = time.perf_counter()
+                try:
+                    getattr(self, "_load_" + step)()
+                except Exception:
+                    logger.exception("Warm-up of %s failed", step)
+                self.timings[step] = time.perf_counter() - started
+        finally:
+            # The engines keep their data; the thread's own connection is no longer needed
+            close_connection()
+            self._done.set()
+
+    def _load_consultations(self):
+        self.services.availability()
+
+    def _load_doctors(self):
+        self.services.index("doctor")
+
+    def _load_specializations(self):
+        self.services.specializations.names()
+
+
+_warmup = None
+
+
+def start_warmup(services=None) -> Warmup:
+    """
+    Start warming up the application's services, unless it was already started.
+
+    Returns:
+        Warmup: The running (or finished) warm-up
+    """
+    global _warmup
+    if _warmup is None:
+        _warmup = Warmup(services).start()
+    return _warmup
@@ -13,8 +13,7 @@ def get_id(value: str, type_of_value: str, table: str):
     Returns:
         tuple: A tuple containing the ID if found, None otherwise
     """
-    import sqlite3
-    from constants import PATH_TO_DB
+    from database.connection import fetchone
 
     # Define allowed tables and columns
     allowed_tables = {'users', 'consultations', 'doctor', 'patient'}  # Example table names
@@ -26,13 +25,10 @@ def get_id(value: str, type_of_value: str, table: str):
     if type_of_value not in allowed_columns:
         raise ValueError(f"Invalid column name: {type_of_value}")
 
-    with sqlite3.connect(PATH_TO_DB) as conn:
-        cursor = conn.cursor()
-        # Use string formatting for table and column names after validation
-        query = f"SELECT id FROM {table} WHERE {type_of_value} = ?"
-        cursor.execute(query, (value,))
-        result = cursor.fetchone()
-        return result[0]
+    # Use string formatting for table and column names after validation
+    query = f"SELECT id FROM {table} WHERE {type_of_value} = ?"
+    result = fetchone(query, (value,))
+    return result[0]
 
     
     
@@ -49,20 +45,17 @@ def create_user(email_entry, password_entry, is_admin_var, close_window=None, fu
         password_entry: Entry widget containing user's password
         is_admin_var: BooleanVar indicating if user should be admin
     
-    Creates User object with hashed password and saves to database.
+    Saves the user through the users service, which stores the password salted and hashed.
     """
-    import hashlib
     import tkinter.messagebox as messagebox
     # Get values from form
     email = email_entry.get()
-    # Hash the password for security
-    hashed_password = hashlib.sha256(password_entry.get().encode()).hexdigest()
     is_admin = is_admin_var.get() # True or False
-    from classes.user import User
+    from services import get_services
     try:
-        # Create user object and save to database
-        user = User(email, hashed_password, is_admin)
-        success = user.insert_in_db()
+        success = get_services().users.add(
+            {"email": email, "password": password_entry.get(), "is_admin": is_admin}
+        ) is not None
         
         if success:
             # Show success message
@@ -86,27 +79,19 @@ def consultation_exists(patient_id, doctor_id):
     """
     Checks if a consultation exists between a patient and a doctor.
     """
-    import sqlite3
-    from constants import PATH_TO_DB
-    with sqlite3.connect(PATH_TO_DB) as conn:
-        cursor = conn.cursor()
-        query = "SELECT COUNT(*) FROM consultations WHERE patient = ? AND doctor = ?"
-        cursor.execute(query, (patient_id, doctor_id))
-        result = cursor.fetchone()
-        return result[0] > 0
+    from database.connection import fetchone
+    query = "SELECT COUNT(*) FROM consultations WHERE patient = ? AND doctor = ?"
+    result = fetchone(query, (patient_id, doctor_id))
+    return result[0] > 0
 
 def consultation_exists_by_id (id):
     """
     Checks if a consultation exists by its ID.
     """
-    import sqlite3
-    from constants import PATH_TO_DB
-    with sqlite3.connect(PATH_TO_DB) as conn:
-        cursor = conn.cursor()
-        query = "SELECT COUNT(*) FROM consultations WHERE id = ?"
-        cursor.execute(query, (id,))
-        result = cursor.fetchone()
-        return result[0] > 0
+    from database.connection import fetchone
+    query = "SELECT COUNT(*) FROM consultations WHERE id = ?"
+    result = fetchone(query, (id,))
+    return result[0] > 0
 
 '''def handle_cols_for_query(columns_selection:str, table_name:str):
     """
@@ -196,6 +181,9 @@ def get_foreign_keys(table_name: str) -> list:
     """
     Checks if a table has foreign keys and returns their information.
     
+    The foreign keys of every table are read once and kept in the schema
+    registry (database/schema.py) until a migration changes the schema.
+    
     Args:
         table_name (str): Name of the table to check
         
@@ -206,35 +194,8 @@ def get_foreign_keys(table_name: str) -> list:
             - to_table: Referenced table
             - to_col: Referenced column
     """
-    import sqlite3
-    from constants import PATH_TO_DB
-    
-    with sqlite3.connect(PATH_TO_DB) as conn:
-        cursor = conn.cursor()
-        # Query to get foreign key information
-        cursor.execute(f"""
-            SELECT sql 
-            FROM sqlite_master 
-            WHERE type='table' AND name=?
-        """, (table_name,))
-        
-        create_table_sql = cursor.fetchone()[0]
-        
-        # Get foreign key constraints
-        cursor.execute(f"""
-            SELECT * 
-            FROM pragma_foreign_key_list(?)
-        """, (table_name,))
-        
-        foreign_keys = []
-        for fk in cursor.fetchall():
-            foreign_keys.append({
-                'from_col': fk[3],    # Column in current table
-                'to_table': fk[2],    # Referenced table
-                'to_col': fk[4]       # Referenced column
-            })
-            
-        return foreign_keys
+    from database.schema import get_registry
+    return [dict(fk) for fk in get_registry().foreign_keys(table_name)]
 
 '''# Example usage:
 fks = get_foreign_keys('consultations')
@@ -266,7 +227,8 @@ def build_query(table_name: str, columns: tuple) -> str:
 
     This function constructs a SELECT query that automatically joins related tables based on foreign key
     relationships. It uses a predefined mapping of desired columns for specific tables and handles
-    both simple queries and queries with foreign key relationships.
+    both simple queries and queries with foreign key relationships. The result is memoized, so
+    repeated calls for the same table and columns cost a dictionary lookup.
 
     Args:
         table_name (str): The name of the main table to query from
@@ -279,50 +241,9 @@ def build_query(table_name: str, columns: tuple) -> str:
         >>> build_query("doctor", ("id", "name", "specialization_id"))
         'SELECT doctor.id, doctor.name, specialization.name FROM doctor JOIN specialization ON specialization.id = doctor.specialization_id'
     """
-    # Define desired columns for specific tables
-    desired_columns = {
-        'specialization': 'name',
-        'doctor': 'name',
-        'patient': 'name'
-    }
-
-    # Retrieve foreign keys for the given table
-    fks = get_foreign_keys(table_name)  # list of dicts which are all fks in table
-
-    col_refs = []
-    referenced_tables = {}
-
-    # Build column references and track referenced tables
-    for col in columns:
-        fk = next((fk for fk in fks if fk['from_col'] == col), None)
-        if fk:
-            # Use the desired column from the mapping if available
-            desired_col = desired_columns.get(fk['to_table'], fk['to_col'])
-            col_refs.append(f"{fk['to_table']}.{desired_col}")
-            if fk['to_table'] not in referenced_tables:
-                referenced_tables[fk['to_table']] = []
-            referenced_tables[fk['to_table']].append(fk['from_col'])
-        else:
-            col_refs.append(f"{table_name}.{col}")
-
-    # Generate column list string
-    columns_str = ', '.join(col_refs)
-
-    # If no foreign keys are referenced
-    if not referenced_tables:
-        # Strip table prefixes for columns without foreign keys
-        columns_str = ', '.join(col.replace(f"{table_name}.", "") for col in col_refs)
-        return f"SELECT {columns_str} FROM {table_name}"
-
-    # Start building the query
-    query = f"SELECT {columns_str} FROM {table_name}"
-
-    # Add JOINs for each referenced table
-    for to_table, from_cols in referenced_tables.items():
-        fk = next(fk for fk in fks if fk['to_table'] == to_table)
-        query += f" JOIN {to_table} ON {to_table}.{fk['to_col']} = {table_name}.{from_cols[0]}"
-
-    return query
+    # Statements are generated once per (table, columns) from the schema registry
+    from database.schema import get_registry
+    return get_registry().build_select(table_name, columns)
        
 def test_build_query():
     import inspect